@@ -0,0 +1,312 @@
+"""
+Read-only JSON API over the models' `RecordSerializer`s (`sync.records`).
+
+Lists are paged by keyset rather than offset. A page holds the `limit` rows
+that follow, in the chosen `ordering`, the last row of the previous page, and
+the opaque `cursor` of the `next` link records that row. Each page is one
+range query on an index however deep it is. Rows written meanwhile never make
+others shift or repeat. `fields=` keeps only some keys of each record, and
+each view filters on indexed columns only.
+
+Pages and records carry an ETag made from the primary keys and `updated_at`
+of their rows, and records a `Last-Modified` too. A client revalidating its
+copy gets a `304 Not Modified` before anything is serialized.
+
+The change feed pages through `sync.models.ChangeLog` instead: what was
+inserted, updated or deleted after a `since` cursor, each object once per
+page with its current record. A client keeps the returned `cursor` and asks
+again for the changes after it, rather than reloading the whole list.
+"""
+import base64
+import hashlib
+import json
+
+from django.db.models import Q
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.views import APIView
+
+from sync.models import ChangeLog, ChangeLogWatermark
+from sync.records import dumps
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+class RecordJSONRenderer(JSONRenderer):
+    """JSON encoded like the Algolia records, with orjson when it is installed."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return dumps(data).encode('utf-8')
+
+
+def parse_time(value):
+    """An ISO 8601 date or time; naive values are in the current time zone."""
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'{value!r} is not an ISO 8601 date or time')
+        parsed = timezone.datetime.combine(day, timezone.datetime.min.time())
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+def parse_bool(value):
+    if value.lower() in ('1', 'true', 'yes'):
+        return True
+    if value.lower() in ('0', 'false', 'no'):
+        return False
+    raise ValueError(f'{value!r} is not true or false')
+
+
+def negated(parse):
+    return lambda value: not parse(value)
+
+
+def make_etag(*parts):
+    return '"%s"' % hashlib.sha1(json.dumps(parts, default=str).encode()).hexdigest()
+
+
+def not_modified(request, etag, last_modified=None):
+    """
+    The validator headers of a response, and the response to send instead of
+    it when the client's copy is current (304) or a precondition fails (412),
+    else None.
+    """
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    timestamp = None
+    if last_modified is not None:
+        timestamp = int(last_modified.timestamp())
+        headers['Last-Modified'] = http_date(timestamp)
+    current = HttpResponse(headers=headers)
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp, response=current)
+    return headers, None if response is current else response
+
+
+def project(serializer, rows, fields=None):
+    """The dicts of `values_list(*serializer.value_fields)` rows, with only the keys in `fields` if given."""
+    build = serializer.build_dict
+    if fields is None:
+        return [build(row) for row in rows]
+    return [{field: record[field] for field in fields} for record in map(build, rows)]
+
+
+def parse_cursor(cursor):
+    """(change id, pruned_until when it was given out) of a change feed cursor; ValueError if malformed."""
+    since, _, seen_pruned = (cursor or '0').partition('.')
+    return int(since), int(seen_pruned or 0)
+
+
+def pruned_until(model):
+    return (ChangeLogWatermark.objects.filter(model_label=model._meta.label_lower)
+            .values_list('pruned_until', flat=True).first() or 0)
+
+
+def read_changes(model, serializer, since, limit, fields=None, until=None):
+    """
+    The changes of `model` after change id `since` (up to `until` if given),
+    as `[(change id, change)]`, and whether more follow. An object changed
+    several times among them is returned once, where its last change is.
+    """
+    log = ChangeLog.objects.filter(model_label=model._meta.label_lower, id__gt=since)
+    if until is not None:
+        log = log.filter(id__lte=until)
+    log = list(log.order_by('id').values_list('id', 'object_pk', 'action')[:limit + 1])
+    more = len(log) > limit
+    last = {}
+    for change_id, object_pk, action in log[:limit]:
+        last.pop(object_pk, None)
+        last[object_pk] = (change_id, action)
+
+    to_pk = model._meta.pk.to_python
+    upserted = [to_pk(object_pk) for object_pk, (_, action) in last.items() if action == 'upsert']
+    rows = {}
+    for start in range(0, len(upserted), 500):
+        rows.update((row[0], row) for row in serializer.rows(
+            model.objects.filter(pk__in=upserted[start:start + 500]).order_by()))
+
+    changes = []
+    for object_pk, (change_id, action) in last.items():
+        pk = to_pk(object_pk)
+        if action == 'upsert' and pk in rows:
+            changes.append((change_id, {'action': 'upsert', 'id': pk, 'record': project(serializer, [rows[pk]], fields)[0]}))
+        else:
+            # Deleted, or deleted since by a change further in the log
+            changes.append((change_id, {'action': 'delete', 'id': pk}))
+    return changes, more
+
+
+class RecordView(APIView):
+    model = None
+    # A `sync.records.RecordSerializer` whose value fields include `updated_at`
+    serializer = None
+    renderer_classes = [RecordJSONRenderer]
+
+    def projection(self):
+        """The record keys asked for with `fields=`, None for all of them."""
+        fields = self.request.query_params.get('fields')
+        if not fields:
+            return None
+        fields = [field for field in fields.split(',') if field]
+        unknown = [field for field in fields if field not in self.serializer.dict_fields]
+        if unknown:
+            raise ValidationError({'fields': f"Unknown fields {', '.join(unknown)}; "
+                                             f"available: {', '.join(self.serializer.dict_fields)}"})
+        return fields
+
+    def limit(self):
+        try:
+            limit = int(self.request.query_params.get('limit', DEFAULT_LIMIT))
+        except ValueError:
+            raise ValidationError({'limit': 'Not a number'})
+        if not 1 <= limit <= MAX_LIMIT:
+            raise ValidationError({'limit': f'Must be between 1 and {MAX_LIMIT}'})
+        return limit
+
+    def records(self, rows, fields):
+        return project(self.serializer, rows, fields)
+
+    def updated_at(self, row):
+        return row[self.serializer.value_fields.index('updated_at')]
+
+
+class RecordListView(RecordView):
+    """
+    `GET ?ordering=&cursor=&limit=&fields=` plus the `filters` of the view:
+    `{"results": [...], "next": url or null}`.
+    """
+    # Orderings served, the default first; each needs an index to stay one range query
+    orderings = ('id',)
+    # Query parameter -> (lookup, parser of its value)
+    filters = {}
+
+    def get(self, request):
+        params = request.query_params
+        ordering = params.get('ordering', self.orderings[0])
+        if ordering not in self.orderings:
+            raise ValidationError({'ordering': f"Use one of: {', '.join(self.orderings)}"})
+        fields = self.projection()
+        limit = self.limit()
+
+        queryset = self.model.objects.filter(**self.filter_lookups())
+        name = ordering.lstrip('-')
+        field = 'pk' if name == 'id' else name
+        descending = ordering.startswith('-')
+        sign = '-' if descending else ''
+        # The primary key breaks ties, so that every row has one place in the order. Ascending
+        # either way: index entries with equal values are in that order, so no sort is needed
+        queryset = queryset.order_by(*dict.fromkeys((f'{sign}{field}', 'pk')))
+        if params.get('cursor'):
+            value, pk = self.decode_cursor(params['cursor'], ordering, field)
+            queryset = self.after(queryset, field, descending, value, pk)
+
+        rows = list(queryset.values_list(*self.serializer.value_fields)[:limit + 1])
+        more = len(rows) > limit
+        rows = rows[:limit]
+
+        headers, response = not_modified(
+            request, make_etag(sorted(params.lists()), [(row[0], self.updated_at(row)) for row in rows]))
+        if response is not None:
+            return response
+
+        next_url = None
+        if more:
+            last = rows[-1]
+            cursor = self.encode_cursor(ordering, last[self.serializer.value_fields.index(field)], last[0])
+            next_url = replace_query_param(request.build_absolute_uri(), 'cursor', cursor)
+        return Response({'results': self.records(rows, fields), 'next': next_url}, headers=headers)
+
+    def filter_lookups(self):
+        lookups = {}
+        for param, (lookup, parse) in self.filters.items():
+            value = self.request.query_params.get(param)
+            if value is None:
+                continue
+            try:
+                lookups[lookup] = parse(value)
+            except ValueError as e:
+                raise ValidationError({param: str(e)})
+        return lookups
+
+    @staticmethod
+    def after(queryset, field, descending, value, pk):
+        """Rows after (value, pk) in the order: a range on the ordering index, ties broken on the key."""
+        op = 'lt' if descending else 'gt'
+        if field == 'pk':
+            return queryset.filter(**{f'pk__{op}': pk})
+        return queryset.filter(Q(**{f'{field}__{op}': value}) | Q(pk__gt=pk), **{f'{field}__{op}e': value})
+
+    @staticmethod
+    def encode_cursor(ordering, value, pk):
+        value = value.isoformat() if hasattr(value, 'isoformat') else value
+        return base64.urlsafe_b64encode(json.dumps([ordering, value, pk]).encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor, ordering, field):
+        try:
+            name, value, pk = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            if name != ordering:
+                raise ValueError('cursor of another ordering')
+            if field != 'pk':
+                value = self.model._meta.get_field(field).to_python(value)
+            return value, int(pk)
+        except Exception:
+            raise ValidationError({'cursor': 'Invalid cursor, start again from the first page'})
+
+
+class RecordDetailView(RecordView):
+    """`GET <pk>/?fields=`: one record, with `ETag` and `Last-Modified`."""
+
+    def get(self, request, pk):
+        fields = self.projection()
+        row = self.model.objects.filter(pk=pk).order_by().values_list(*self.serializer.value_fields).first()
+        if row is None:
+            raise NotFound()
+        updated_at = self.updated_at(row)
+        headers, response = not_modified(request, make_etag(fields, row[0], updated_at), updated_at)
+        if response is not None:
+            return response
+        return Response(self.records([row], fields)[0], headers=headers)
+
+
+class RecordChangesView(RecordView):
+    """
+    `GET changes/?since=&limit=&fields=`: `{"changes": [...], "cursor": ..., "next": url or null}`.
+
+    A change is `{"action": "upsert", "id": ..., "record": {...}}` or
+    `{"action": "delete", "id": ...}`. Without `since`, the feed starts from
+    the beginning of the (compacted) log, which holds every current object.
+
+    A cursor is `<change id>.<ChangeLogWatermark.pruned_until>` when it was
+    given out: compaction may since have dropped deletes the client has not
+    seen, and it is then told to start over (410).
+    """
+
+    def get(self, request):
+        try:
+            since, seen_pruned = parse_cursor(request.query_params.get('since'))
+        except ValueError:
+            raise ValidationError({'since': 'Not a cursor'})
+        fields = self.projection()
+        limit = self.limit()
+
+        pruned = pruned_until(self.model)
+        if 0 < since < pruned and seen_pruned < pruned:
+            return Response({'detail': 'Deletes after this cursor were compacted away; '
+                                       'sync again from the start of the feed, without since.'},
+                            status=status.HTTP_410_GONE)
+
+        changes, more = read_changes(self.model, self.serializer, since, limit, fields)
+        cursor = f'{changes[-1][0] if changes else since}.{pruned}'
+        next_url = replace_query_param(request.build_absolute_uri(), 'since', cursor) if more else None
+        return Response({'changes': [change for _, change in changes], 'cursor': cursor, 'next': next_url},
+                        headers={'Cache-Control': 'no-cache'})
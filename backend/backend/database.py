@@ -0,0 +1,83 @@
+"""
+Database profiles for `settings.DATABASES`, picked with the DATABASE_PROFILE
+environment variable:
+
+- `sqlite` (default): the `db.sqlite3` file (or SQLITE_PATH) in WAL mode, so
+  API reads keep going while an ingestion command writes. Write transactions
+  take the write lock when they begin, and wait up to SQLITE_TIMEOUT seconds
+  for it instead of failing with "database is locked".
+- `postgresql`: a PostgreSQL server (POSTGRES_DB, POSTGRES_USER,
+  POSTGRES_PASSWORD, POSTGRES_HOST, POSTGRES_PORT). Requests borrow
+  connections from a pool of DATABASE_POOL_SIZE connections (needs
+  `psycopg[pool]`). With a pool size of 0, each thread keeps its
+  connection open for DATABASE_CONN_MAX_AGE seconds instead.
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+PROFILES = ('sqlite', 'postgresql')
+
+# Run on every new SQLite connection. WAL lets readers and one writer work at
+# the same time; with it, NORMAL only syncs at checkpoints and stays safe
+# against corruption (a power loss may drop the last commits).
+SQLITE_INIT_COMMAND = 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;'
+
+
+def sqlite_database(path, timeout=20, conn_max_age=60):
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path,
+        'CONN_MAX_AGE': conn_max_age,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': SQLITE_INIT_COMMAND,
+            # Busy timeout, in seconds
+            'timeout': timeout,
+            # A deferred transaction that reads then writes can't wait for the lock, it fails at once
+            'transaction_mode': 'IMMEDIATE',
+        },
+    }
+
+
+def postgresql_database(name, user='', password='', host='', port='', pool_size=10, conn_max_age=60):
+    database = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': name,
+        'USER': user,
+        'PASSWORD': password,
+        'HOST': host,
+        'PORT': port,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
+    }
+    if pool_size:
+        # Pooled connections are returned to the pool after each request, they can't also be persistent
+        database['CONN_MAX_AGE'] = 0
+        database['OPTIONS']['pool'] = {'min_size': 1, 'max_size': pool_size, 'timeout': 10}
+    else:
+        database['CONN_MAX_AGE'] = conn_max_age
+    return database
+
+
+def database_from_env(base_dir, environ=os.environ):
+    """The `default` database of the DATABASE_PROFILE profile, see the module docstring."""
+    profile = environ.get('DATABASE_PROFILE', 'sqlite')
+    conn_max_age = int(environ.get('DATABASE_CONN_MAX_AGE', 60))
+    if profile == 'sqlite':
+        return sqlite_database(
+            environ.get('SQLITE_PATH', base_dir / 'db.sqlite3'),
+            timeout=float(environ.get('SQLITE_TIMEOUT', 20)),
+            conn_max_age=conn_max_age,
+        )
+    if profile == 'postgresql':
+        return postgresql_database(
+            environ.get('POSTGRES_DB', 'relief_finder'),
+            user=environ.get('POSTGRES_USER', ''),
+            password=environ.get('POSTGRES_PASSWORD', ''),
+            host=environ.get('POSTGRES_HOST', ''),
+            port=environ.get('POSTGRES_PORT', ''),
+            pool_size=int(environ.get('DATABASE_POOL_SIZE', 10)),
+            conn_max_age=conn_max_age,
+        )
+    raise ImproperlyConfigured(f"Unknown DATABASE_PROFILE {profile!r}, use one of: {', '.join(PROFILES)}")
@@ -0,0 +1,245 @@
+"""
+Push of model changes to connected clients, as server-sent events.
+
+Each ASGI worker process runs one `ChangeHub` per streamed model, an
+in-process pub/sub. While streams are subscribed, it reads the model's new
+changes from the change log (`sync.models.ChangeLog`) every POLL_INTERVAL
+seconds and publishes them to the subscriptions whose filter they match.
+
+The change log stands in for a message broker between processes: the fetch
+commands and every other writer append to it already
+(`PendingIndexChange.objects.queue`), from whatever process they run in,
+and any number of workers read it. An event's id is its change feed cursor,
+so a client that reconnects (EventSource sends `Last-Event-ID`) first gets
+the changes it missed.
+"""
+import asyncio
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Max
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
+
+from sync.models import ChangeLog
+from sync.records import dumps
+
+from .api import parse_cursor, pruned_until, read_changes
+
+logger = logging.getLogger(__name__)
+
+# Changes read from the log per query, when replaying or catching up
+PAGE_SIZE = 500
+
+
+def push_setting(name, default):
+    return getattr(settings, 'PUSH', {}).get(name, default)
+
+
+def latest_change_id(model):
+    return ChangeLog.objects.filter(model_label=model._meta.label_lower).aggregate(last=Max('id'))['last'] or 0
+
+
+class Subscription:
+    def __init__(self, matches=None):
+        self.matches = matches
+        self.queue = asyncio.Queue(maxsize=push_setting('QUEUE_SIZE', 1000))
+        # Change id up to which the stream replays from the log; later changes come from the queue
+        self.start = None
+        self.started = asyncio.Event()
+        # Set when its stream must end: the client fell behind, or the hub stopped reading the log
+        self.closed = False
+
+    def begin(self, position):
+        self.start = position
+        self.started.set()
+
+    def close(self):
+        """End the stream once the queued events are sent; the client catches up from the log when it reconnects."""
+        self.closed = True
+        self.started.set()
+        try:
+            # Wakes up a stream waiting on an empty queue
+            self.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            pass
+
+
+class ChangeHub:
+    def __init__(self, model, serializer):
+        self.model = model
+        self.serializer = serializer
+        self.subscriptions = set()
+        self.position = None
+        self.pruned = 0
+        self.task = None
+
+    def subscribe(self, matches=None):
+        subscription = Subscription(matches)
+        self.subscriptions.add(subscription)
+        if self.position is not None:
+            subscription.begin(self.position)
+        if self.task is None:
+            self.task = asyncio.get_running_loop().create_task(self.run())
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.subscriptions.discard(subscription)
+
+    def publish(self, change_id, change):
+        for subscription in list(self.subscriptions):
+            if subscription.matches and not subscription.matches(change):
+                continue
+            try:
+                subscription.queue.put_nowait((change_id, self.pruned, change))
+            except asyncio.QueueFull:
+                # Too slow to keep up
+                subscription.closed = True
+                self.unsubscribe(subscription)
+
+    def close(self):
+        for subscription in list(self.subscriptions):
+            subscription.close()
+        self.subscriptions.clear()
+
+    async def run(self):
+        """
+        Read the log while streams are subscribed. A failed read (database
+        down, connection dropped) is retried from the same position, waiting
+        twice as long each time; after MAX_FAILURES in a row every stream is
+        ended, and its client reconnects and catches up from the log.
+        """
+        interval = push_setting('POLL_INTERVAL', 1)
+        delay = 0
+        failures = 0
+        try:
+            while self.subscriptions:
+                if delay:
+                    await asyncio.sleep(delay)
+                try:
+                    if self.position is None:
+                        self.position = await sync_to_async(latest_change_id)(self.model)
+                        for subscription in self.subscriptions:
+                            subscription.begin(self.position)
+                        changes, more = [], False
+                    else:
+                        changes, more, self.pruned = await sync_to_async(self.poll)(self.position)
+                except Exception:
+                    failures += 1
+                    if failures > push_setting('MAX_FAILURES', 5):
+                        logger.exception("PUSH OF %s STOPPED AFTER %d FAILED READS", self.model._meta.label, failures)
+                        self.close()
+                        return
+                    logger.warning("PUSH OF %s: READ FAILED, RETRYING", self.model._meta.label, exc_info=True)
+                    # A connection left broken by the error is opened again on the next read
+                    await sync_to_async(close_old_connections)()
+                    delay = interval * 2 ** failures
+                    continue
+                failures = 0
+                for change_id, change in changes:
+                    self.publish(change_id, change)
+                if changes:
+                    self.position = changes[-1][0]
+                delay = 0 if more else interval
+        finally:
+            # Started again, from the end of the log, by the next subscription
+            self.position = None
+            self.task = None
+
+    def poll(self, position):
+        changes, more = read_changes(self.model, self.serializer, position, PAGE_SIZE)
+        return changes, more, pruned_until(self.model)
+
+
+_hubs = {}
+
+
+def get_hub(model, serializer):
+    """The hub of `model` in this process, for the running event loop."""
+    key = (model._meta.label_lower, asyncio.get_running_loop())
+    if key not in _hubs:
+        _hubs[key] = ChangeHub(model, serializer)
+    return _hubs[key]
+
+
+def format_event(change_id, pruned, change, fields=None):
+    if fields is not None and 'record' in change:
+        change = dict(change, record={field: change['record'][field] for field in fields})
+    return f"id: {change_id}.{pruned}\nevent: {change['action']}\ndata: {dumps(change)}\n\n"
+
+
+class RecordStreamView(View):
+    """
+    `GET stream/?fields=` plus the filters of `subscription()`: an
+    `text/event-stream` of `upsert` and `delete` events, each with the data
+    of a change feed change. `Last-Event-ID` (or `since`) replays the
+    changes after that cursor first.
+
+    Needs an ASGI server; under WSGI each open stream holds a worker thread.
+    """
+    model = None
+    serializer = None
+
+    def subscription(self, params):
+        """A predicate on changes from the query parameters, None for all changes; raises ValueError."""
+        return None
+
+    async def get(self, request):
+        params = request.GET
+        fields = [field for field in params.get('fields', '').split(',') if field] or None
+        unknown = [field for field in fields or () if field not in self.serializer.dict_fields]
+        if unknown:
+            return JsonResponse({'fields': f"Unknown fields {', '.join(unknown)}"}, status=400)
+        try:
+            matches = self.subscription(params)
+            cursor = request.headers.get('Last-Event-ID') or params.get('since')
+            since = parse_cursor(cursor) if cursor else None
+        except ValueError as e:
+            return JsonResponse({'detail': str(e)}, status=400)
+
+        response = StreamingHttpResponse(self.events(since, matches, fields), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Don't let a proxy buffer the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def events(self, since, matches, fields):
+        hub = get_hub(self.model, self.serializer)
+        subscription = hub.subscribe(matches)
+        try:
+            await subscription.started.wait()
+            if subscription.closed:
+                return
+            # Reconnect after 3 s when the connection drops
+            yield 'retry: 3000\n\n'
+            if since is not None:
+                position, seen_pruned = since
+                pruned = await sync_to_async(pruned_until)(self.model)
+                if 0 < position < pruned and seen_pruned < pruned:
+                    yield 'event: resync\ndata: {}\n\n'
+                    return
+                more = True
+                while more:
+                    changes, more = await sync_to_async(read_changes)(
+                        self.model, self.serializer, position, PAGE_SIZE, until=subscription.start)
+                    for change_id, change in changes:
+                        if not matches or matches(change):
+                            yield format_event(change_id, pruned, change, fields)
+                    if changes:
+                        position = changes[-1][0]
+
+            heartbeat = push_setting('HEARTBEAT', 15)
+            while not (subscription.closed and subscription.queue.empty()):
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), heartbeat)
+                except TimeoutError:
+                    # Keeps proxies from closing an idle connection
+                    yield ': keep-alive\n\n'
+                    continue
+                if event is None:
+                    break
+                yield format_event(*event, fields)
+        finally:
+            hub.unsubscribe(subscription)
@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 import os
 from dotenv import load_dotenv
+from .database import database_from_env
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -46,13 +47,69 @@ INSTALLED_APPS = [
     'relief_shelter',
     'chat_assistant',
     'algoliasearch_django',
+    'sync',
+    'scheduler',
     'rest_framework',
     'corsheaders',
 ]
 ALGOLIA = {
     'APPLICATION_ID': os.getenv('ALGOLIA_APPLICATION_ID'),
     'API_KEY': os.getenv('ALGOLIA_API_KEY'),
-    'AUTO_INDEXING': True,
+    # Saves are queued by the sync app and pushed by `manage.py sync_algolia`
+    'AUTO_INDEXING': False,
+    'SYNC_BATCH_SIZE': 1000,
+}
+
+# Change feed of the indexed models (sync.models.ChangeLog), read at /api/<model>/changes/
+CHANGE_LOG = {
+    # Compaction drops deletes older than this; clients last synced before must reload everything
+    'KEEP_DELETES_DAYS': 30,
+}
+
+# Server-sent events of new and updated alerts (backend.push), served by an ASGI server
+PUSH = {
+    # Seconds between reads of the change log by each worker
+    'POLL_INTERVAL': 1,
+    # Seconds of silence before a keep-alive comment
+    'HEARTBEAT': 15,
+    # Events buffered per client; a client further behind is disconnected and catches up on reconnect
+    'QUEUE_SIZE': 1000,
+    # Failed reads of the log in a row, retried with a doubling wait, before every stream is ended
+    'MAX_FAILURES': 5,
+}
+
+# HTTP layer shared by the fetch commands (ingestion.http)
+INGESTION = {
+    # Gzipped copies of fetched feeds, revalidated with ETag / Last-Modified
+    'HTTP_CACHE_DIR': BASE_DIR / '.cache' / 'http',
+    # Seconds during which a cached response is used without asking upstream
+    'HTTP_CACHE_TTL': 5 * 60,
+    'HTTP_POOL_SIZE': 10,
+    # Content-addressed archive of the raw responses of every fetch, for `--replay`;
+    # None turns archiving off
+    'ARCHIVE_DIR': BASE_DIR / 'archive',
+    'ARCHIVE_KEEP_DAYS': 30,
+}
+
+# Jobs run by `manage.py run_scheduler` (scheduler.jobs); intervals in seconds
+SCHEDULER = {
+    # Each scheduled run is moved by up to +/-10% of its interval
+    'JITTER': 0.1,
+    # Longest wait before retrying a job whose runs keep failing
+    'MAX_BACKOFF': 6 * 60 * 60,
+    # A running job refreshes its lock every quarter of this; a lock older than this
+    # was left by a scheduler that died and is taken over
+    'LOCK_TIMEOUT': 60 * 60,
+    'KEEP_RUNS_DAYS': 30,
+    'JOBS': {
+        'fetch_disaster': {'command': 'fetch_disaster', 'interval': 15 * 60, 'then': ['enrich_disasters']},
+        'fetch_relief': {'command': 'fetch_relief', 'interval': 60 * 60, 'then': ['sync_algolia']},
+        # No interval: run after each disaster fetch
+        'enrich_disasters': {'command': 'enhance_disaster_data', 'then': ['dedupe_disasters']},
+        'dedupe_disasters': {'command': 'dedupe_disasters', 'then': ['sync_algolia']},
+        'sync_algolia': {'command': 'sync_algolia', 'interval': 5 * 60},
+        'compact_changelog': {'command': 'compact_changelog', 'interval': 24 * 60 * 60},
+    },
 }
 
 
@@ -68,6 +125,8 @@ MIDDLEWARE = [
 ]
 
 CORS_ALLOW_ALL_ORIGINS = True 
+# Validators of the API responses, for conditional requests from the frontend
+CORS_EXPOSE_HEADERS = ['ETag', 'Last-Modified']
 
 ROOT_URLCONF = 'backend.urls'
 
@@ -92,11 +151,9 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite in WAL mode by default, or a pooled PostgreSQL server (see backend/database.py)
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_from_env(BASE_DIR),
 }
 
 
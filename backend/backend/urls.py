@@ -20,5 +20,7 @@ from django.urls import path, include
 urlpatterns = [
     path('admin/', admin.site.urls),
     path("api/", include("chat_assistant.urls")),
+    path("api/", include("disasters.urls")),
+    path("api/", include("relief_shelter.urls")),
 
 ]
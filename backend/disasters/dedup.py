@@ -0,0 +1,288 @@
+"""
+Entity resolution of disaster alerts reported more than once, by one feed
+over several runs or by several feeds.
+
+Comparing every pair of alerts is quadratic, so candidate pairs come from
+blocking instead. An alert is compared only with alerts sharing a block,
+in the same or an adjacent time bucket:
+
+- one block per LSH band of the MinHash signature of its title, so titles
+  with many words in common share a block with high probability;
+- its (geohash cell, disaster type) block, when both are known, so that
+  alerts about the same place and kind of event are always compared.
+
+Each alert falls in a fixed number of blocks, which keeps the number of
+comparisons close to linear in the number of alerts. A candidate pair is a
+duplicate when the events are compatible (close in time, no contradicting
+type or coordinates) and the word sets of the titles are similar enough.
+Duplicates are grouped transitively, then each group is checked against its
+oldest alert: a chain of duplicates can link two alerts that are not the same
+event, and those start a group of their own. Each group is merged into its
+oldest alert, and the `(title, location)` of the others are kept as
+`AlertAlias`es so that feeds reporting them again update the merged alert.
+"""
+import hashlib
+import math
+import random
+import re
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from sync.models import PendingIndexChange
+
+from ingestion.upsert import chunked
+
+from .extraction import UNKNOWN_TYPES
+from .models import AlertAlias, disaster_alerts
+
+# What resolution reads of each alert, primary key first
+DEDUP_FIELDS = (
+    'pk', 'title', 'location', 'description', 'disaster_type', 'disaster_time', 'created_at',
+    'latitude', 'longitude', 'population_affected',
+)
+
+# Types that say nothing about the kind of event
+GENERIC_TYPES = (*UNKNOWN_TYPES, 'ReliefWeb Alert')
+
+# MinHash signature length, split into BANDS bands of ROWS values
+BANDS, ROWS = 8, 4
+# Geohash length of the location blocks; 3 characters is a cell of about 156 x 156 km
+GEOHASH_PRECISION = 3
+# Alerts with coordinates farther apart than this are different events
+MAX_DISTANCE_KM = 250
+# Largest block compared in full; only its most recent alerts are compared beyond that
+MAX_BLOCK = 200
+
+# Words left out of title comparisons, alert levels included: an event keeps its identity when GDACS raises its level
+IGNORED_WORDS = frozenset({'a', 'an', 'and', 'at', 'for', 'in', 'of', 'on', 'the', 'to', 'alert', 'green', 'orange', 'red'})
+TOKEN_RE = re.compile(r'\w+(?:[.:/]\w+)*')
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+# Fixed seed: the same titles give the same signatures in every run
+_MASKS = [random.Random(BANDS * ROWS + i).getrandbits(64) for i in range(BANDS * ROWS)]
+
+
+def geohash(lat, lon, precision=GEOHASH_PRECISION):
+    """Geohash cell of a point, e.g. 'tts' for Lahore at precision 3."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    cell, bits, char, even = [], 0, 0, True
+    while len(cell) < precision:
+        bounds, value = (lon_range, lon) if even else (lat_range, lat)
+        middle = (bounds[0] + bounds[1]) / 2
+        if value >= middle:
+            char, bounds[0] = char * 2 + 1, middle
+        else:
+            char, bounds[1] = char * 2, middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            cell.append(_BASE32[char])
+            bits = char = 0
+    return ''.join(cell)
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 6371 * 2 * math.asin(min(1.0, math.sqrt(a)))
+
+
+def title_tokens(title):
+    """Words of a title, lowercased, numbers and codes ("4.5m", "17/07/2025") kept whole."""
+    return frozenset(token for token in TOKEN_RE.findall((title or '').lower()) if token not in IGNORED_WORDS)
+
+
+def minhash(tokens):
+    """
+    MinHash signature of a token set: for each slot, the smallest token hash
+    once XORed with that slot's mask. Two sets agree on a slot with a
+    probability close to their Jaccard similarity.
+    """
+    hashes = [int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), 'big') for token in tokens]
+    if not hashes:
+        return None
+    return [min([value ^ mask for value in hashes]) for mask in _MASKS]
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class Alert:
+    """What resolution needs of a stored alert, computed once."""
+    __slots__ = ('pk', 'row', 'tokens', 'time', 'bucket', 'type', 'point', 'cell')
+
+    def __init__(self, row, window):
+        self.pk = row[0]
+        self.row = dict(zip(DEDUP_FIELDS, row))
+        self.tokens = title_tokens(self.row['title'])
+        self.time = self.row['disaster_time'] or self.row['created_at']
+        self.bucket = int(self.time.timestamp() // window.total_seconds()) if self.time else None
+        disaster_type = self.row['disaster_type']
+        self.type = None if disaster_type in GENERIC_TYPES else disaster_type
+        lat, lon = self.row['latitude'], self.row['longitude']
+        self.point = (lat, lon) if lat is not None and lon is not None else None
+        self.cell = geohash(lat, lon) if self.point else None
+
+    def blocks(self):
+        """Keys of the blocks this alert falls in, without the time bucket."""
+        keys = []
+        signature = minhash(self.tokens)
+        if signature:
+            keys += [('title', band, tuple(signature[band * ROWS:(band + 1) * ROWS])) for band in range(BANDS)]
+        if self.cell and self.type:
+            keys.append(('place', self.cell, self.type))
+        return keys
+
+    def compatible(self, other, window):
+        """Whether the two alerts can be the same event, judging by time, type and place only."""
+        if self.time and other.time and abs(self.time - other.time) > window:
+            return False
+        if self.type and other.type and self.type != other.type:
+            return False
+        if self.point and other.point and distance_km(*self.point, *other.point) > MAX_DISTANCE_KM:
+            return False
+        return True
+
+
+class DuplicateFinder:
+    """
+    Groups duplicate alerts, see the module docstring. `stats` counts the
+    alerts read, the candidate pairs compared and the pairs found duplicate.
+    """
+
+    def __init__(self, threshold=0.8, window=timedelta(days=2)):
+        self.threshold = threshold
+        self.window = window
+        self.stats = {'alerts': 0, 'compared': 0, 'duplicates': 0}
+
+    def groups(self, rows):
+        """Lists of `Alert`s found to be one event, oldest (lowest pk) first; rows are `DEDUP_FIELDS` tuples."""
+        alerts = []
+        blocks = defaultdict(list)
+        # Union-find over the indexes of alerts found duplicate of another
+        parent = {}
+
+        def root(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        def union(i, j):
+            parent.setdefault(i, i)
+            parent.setdefault(j, j)
+            parent[root(i)] = root(j)
+
+        for row in rows:
+            alert = Alert(row, self.window)
+            index = len(alerts)
+            alerts.append(alert)
+            if alert.bucket is None:
+                continue
+            keys = alert.blocks()
+            seen = set()
+            for key in keys:
+                for bucket in (alert.bucket - 1, alert.bucket, alert.bucket + 1):
+                    for other in blocks.get((bucket, key), ())[-MAX_BLOCK:]:
+                        if other in seen:
+                            continue
+                        seen.add(other)
+                        if self.duplicate(alert, alerts[other]):
+                            self.stats['duplicates'] += 1
+                            union(index, other)
+            self.stats['compared'] += len(seen)
+            for key in keys:
+                blocks[(alert.bucket, key)].append(index)
+        self.stats['alerts'] = len(alerts)
+
+        components = defaultdict(list)
+        for index in parent:
+            components[root(index)].append(alerts[index])
+        groups = []
+        for component in components.values():
+            groups += self.split(sorted(component, key=lambda alert: alert.pk))
+        return groups
+
+    def split(self, alerts):
+        """
+        Groups of `alerts` (sorted by pk) in which every alert is a duplicate
+        of the first, the one the others are merged into. Alerts linked to it
+        only through others are grouped again among themselves.
+        """
+        groups = []
+        while len(alerts) > 1:
+            survivor, *others = alerts
+            group = [survivor] + [alert for alert in others if self.duplicate(survivor, alert)]
+            if len(group) > 1:
+                groups.append(group)
+            alerts = [alert for alert in others if alert not in group]
+        return groups
+
+    def duplicate(self, alert, other):
+        return alert.compatible(other, self.window) and jaccard(alert.tokens, other.tokens) >= self.threshold
+
+
+def merge_values(survivor, duplicates):
+    """Values the survivor of a group takes from its duplicates: only what it is missing."""
+    values = {}
+    current = dict(survivor.row)
+    for duplicate in duplicates:
+        row = duplicate.row
+        if current['disaster_time'] is None and row['disaster_time'] is not None:
+            values['disaster_time'] = current['disaster_time'] = row['disaster_time']
+        if current['latitude'] is None and row['latitude'] is not None and row['longitude'] is not None:
+            values['latitude'] = current['latitude'] = row['latitude']
+            values['longitude'] = current['longitude'] = row['longitude']
+        if row['population_affected'] > current['population_affected']:
+            values['population_affected'] = current['population_affected'] = row['population_affected']
+        if current['disaster_type'] in GENERIC_TYPES and row['disaster_type'] not in GENERIC_TYPES:
+            values['disaster_type'] = current['disaster_type'] = row['disaster_type']
+        if not current['description'] and row['description']:
+            values['description'] = current['description'] = row['description']
+    return values
+
+
+def merge_groups(groups):
+    """
+    Merge each group into its first alert: fill in its missing fields, turn
+    the others' keys into aliases of it, and delete the others. Returns the
+    number of alerts deleted.
+    """
+    merged = 0
+    now = timezone.now()
+    with transaction.atomic():
+        updates = defaultdict(list)
+        aliases = []
+        removed = []
+        for survivor, *duplicates in groups:
+            values = merge_values(survivor, duplicates)
+            if values:
+                updates[frozenset(values)].append(disaster_alerts(pk=survivor.pk, updated_at=now, **values))
+            aliases += [
+                AlertAlias(title=duplicate.row['title'], location=duplicate.row['location'], alert_id=survivor.pk)
+                for duplicate in duplicates
+            ]
+            removed += [duplicate.pk for duplicate in duplicates]
+            # Aliases of the removed alerts follow them into the survivor
+            AlertAlias.objects.filter(alert_id__in=[duplicate.pk for duplicate in duplicates]).update(
+                alert_id=survivor.pk)
+
+        for fields, alerts in updates.items():
+            disaster_alerts.objects.bulk_update(alerts, sorted(fields | {'updated_at'}), batch_size=50)
+            PendingIndexChange.objects.queue(disaster_alerts, [alert.pk for alert in alerts], fields=fields)
+
+        AlertAlias.objects.bulk_create(
+            aliases, batch_size=500, update_conflicts=True,
+            unique_fields=['title', 'location'], update_fields=['alert'],
+        )
+        for batch in chunked(removed, 500):
+            # A queryset delete still sends post_delete, which queues the Algolia deletes
+            merged += disaster_alerts.objects.filter(pk__in=batch).delete()[1].get(disaster_alerts._meta.label, 0)
+    return merged
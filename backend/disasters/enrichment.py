@@ -0,0 +1,181 @@
+"""
+Batch enrichment of stored alerts with the fields `disasters.extraction` finds
+in their text.
+
+Alerts are read in primary-key order, one keyset page at a time, as value
+tuples; the regex work for a page runs in a worker process, and what it finds
+is written back with one `bulk_update` per combination of changed fields.
+
+Runs are incremental: alerts enriched with every field are stamped with the
+`EXTRACTION_VERSION` used and the time they were enriched at, and a complete
+run records when it started in an `EnrichmentWatermark`. The next run only
+reads alerts that are new, were updated since by something other than the
+enrichment itself, or were extracted by an older version.
+"""
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from sync.models import PendingIndexChange
+
+from ingestion.upsert import chunked
+
+from .extraction import ALL_FIELDS, EXTRACTION_VERSION, UNKNOWN_TYPES, enrich
+from .models import EnrichmentWatermark, disaster_alerts
+
+# What `enrich()` reads, primary key first
+VALUE_FIELDS = (
+    'pk', 'title', 'description', 'location', 'latitude', 'longitude',
+    'disaster_time', 'population_affected', 'disaster_type',
+)
+
+
+def keyset_chunks(queryset, chunk_size=1000):
+    """
+    `VALUE_FIELDS` rows of the queryset in primary-key order, a list per chunk.
+
+    Each chunk is its own `pk > last` query, so memory stays flat and rows
+    updated between chunks are neither skipped nor seen twice.
+    """
+    queryset = queryset.order_by('pk')
+    last = None
+    while True:
+        page = queryset if last is None else queryset.filter(pk__gt=last)
+        rows = list(page.values_list(*VALUE_FIELDS)[:chunk_size])
+        if not rows:
+            return
+        yield rows
+        last = rows[-1][0]
+
+
+def enrich_chunk(rows, fields=ALL_FIELDS):
+    """
+    Primary keys of the rows, and (pk, title, values) for those whose text
+    provides missing fields; runs in the worker processes.
+    """
+    pks, found = [], []
+    for pk, title, description, location, *current in rows:
+        pks.append(pk)
+        values = enrich(title, description, location, *current, fields=fields)
+        if values:
+            found.append((pk, title, values))
+    return pks, found
+
+
+def map_chunks(chunks, fields, workers):
+    """`enrich_chunk` over the chunks in order, spread over `workers` processes when more than one."""
+    if workers <= 1:
+        for rows in chunks:
+            yield enrich_chunk(rows, fields)
+        return
+
+    # Workers only run the extraction, but it reads settings (time zone) when spawned
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as executor:
+        pending = deque()
+        for rows in chunks:
+            pending.append(executor.submit(enrich_chunk, rows, fields))
+            # A couple of chunks queued per worker keeps them busy without reading the table ahead
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def save_values(found, complete=False):
+    """
+    Write enrichment results back, one `bulk_update` per set of changed fields.
+
+    The alerts are not loaded: only the fields that changed (and `updated_at`)
+    are written, and they are queued for a partial Algolia update since bulk
+    writes skip the model signals. Results of a `complete` run also stamp the
+    extraction version, and `enriched_at` as the same time as `updated_at`, so
+    this write does not make the alerts pending again.
+    """
+    groups = defaultdict(list)
+    now = timezone.now()
+    stamp = {'extraction_version': EXTRACTION_VERSION, 'enriched_at': now} if complete else {}
+    for pk, _, values in found:
+        groups[frozenset(values)].append(disaster_alerts(pk=pk, updated_at=now, **values, **stamp))
+
+    with transaction.atomic():
+        for fields, alerts in groups.items():
+            # bulk_update builds a CASE per field over every object of a batch, small batches keep that cheap
+            disaster_alerts.objects.bulk_update(alerts, sorted(fields | {'updated_at'} | stamp.keys()), batch_size=50)
+            PendingIndexChange.objects.queue(disaster_alerts, [alert.pk for alert in alerts], fields=fields)
+
+
+def stamp_version(pks, enriched_at):
+    """
+    Mark alerts as enriched by the current extraction at `enriched_at`, the
+    start of the run: a later update means they changed since. Not a content
+    change, `updated_at` is kept.
+    """
+    for batch in chunked(pks, 500):
+        disaster_alerts.objects.filter(pk__in=batch).update(
+            extraction_version=EXTRACTION_VERSION, enriched_at=enriched_at)
+
+
+def watermark():
+    return EnrichmentWatermark.objects.filter(model_label=disaster_alerts._meta.label_lower).first()
+
+
+def pending_alerts(queryset=None):
+    """Alerts of the queryset that changed since the last complete run or were extracted by an older version."""
+    if queryset is None:
+        queryset = disaster_alerts.objects.all()
+    pending = Q(extraction_version__lt=EXTRACTION_VERSION)
+    mark = watermark()
+    if mark and mark.enriched_until:
+        # The range uses the updated_at index; the enrichment's own writes are left out after it
+        pending |= Q(updated_at__gt=mark.enriched_until) & (
+            Q(enriched_at__isnull=True) | Q(updated_at__gt=F('enriched_at')))
+    return queryset.filter(pending)
+
+
+def enrich_alerts(queryset=None, fields=ALL_FIELDS, workers=1, chunk_size=1000, incremental=True):
+    """
+    Fill in the missing `fields` of the alerts in the queryset (all by default),
+    only the `pending_alerts()` of it when `incremental`.
+
+    Yields the (pk, title, values) found for each chunk once it is saved. Only
+    a run over every field stamps the extraction version, and only one over
+    the whole table, consumed to the end, moves the watermark.
+    """
+    started = timezone.now()
+    complete = fields == ALL_FIELDS
+    whole_table = queryset is None
+    if queryset is None:
+        queryset = disaster_alerts.objects.all()
+    if incremental:
+        queryset = pending_alerts(queryset)
+
+    for pks, found in map_chunks(keyset_chunks(queryset, chunk_size), fields, workers):
+        if found:
+            save_values(found, complete)
+        if complete:
+            saved = {pk for pk, _, _ in found}
+            stamp_version([pk for pk in pks if pk not in saved], started)
+        yield found
+
+    if complete and whole_table:
+        EnrichmentWatermark.objects.update_or_create(
+            model_label=disaster_alerts._meta.label_lower, defaults={'enriched_until': started}
+        )
+
+
+def data_quality(queryset=None):
+    """Number of alerts in total and with each enrichable field present, in one aggregate query."""
+    if queryset is None:
+        queryset = disaster_alerts.objects.all()
+    return queryset.aggregate(
+        total=Count('pk'),
+        coordinates=Count('pk', filter=Q(latitude__isnull=False, longitude__isnull=False)),
+        disaster_time=Count('pk', filter=Q(disaster_time__isnull=False)),
+        population=Count('pk', filter=Q(population_affected__gt=0)),
+        disaster_type=Count('pk', filter=Q(disaster_type__isnull=False) & ~Q(
+            disaster_type__in=[value for value in UNKNOWN_TYPES if value is not None])),
+    )
@@ -0,0 +1,280 @@
+"""
+Extraction of missing disaster fields (coordinates, time, population, type)
+from the free text of an alert.
+
+All patterns are compiled once at import. Keywords for type detection and
+the cue words that gate the population patterns are found together by one
+`KeywordAutomaton` scan of the text, so a record is read once whatever the
+number of keywords, and patterns whose cue word is absent are never run.
+Coordinates that are not written out are looked up by the place names in
+the text, in the offline gazetteer (`ingestion.gazetteer`).
+"""
+import re
+from datetime import datetime
+
+from django.utils import timezone
+
+from ingestion.gazetteer import geocode
+
+# Stored on each alert enriched with every field; bump it when the patterns or
+# keywords change so that incremental runs extract all alerts again
+EXTRACTION_VERSION = 2
+
+# Fields `enrich()` can fill in
+COORDINATES = 'coordinates'
+DISASTER_TIME = 'disaster_time'
+POPULATION = 'population'
+DISASTER_TYPE = 'disaster_type'
+ALL_FIELDS = frozenset({COORDINATES, DISASTER_TIME, POPULATION, DISASTER_TYPE})
+
+UNKNOWN_TYPES = ('Unknown', '', None)
+
+# Tried in order; the first pair within bounds wins
+COORDINATE_PATTERNS = [
+    # (-6.08, 142.66)
+    re.compile(r'\((-?\d+\.?\d*),\s*(-?\d+\.?\d*)\)'),
+    # Papua New Guinea -6.08, 142.66
+    re.compile(r'(-?\d+\.?\d+),\s*(-?\d+\.?\d+)'),
+]
+LATITUDE_RE = re.compile(r'lat(?:itude)?[:\s]*(-?\d+\.?\d*)', re.IGNORECASE)
+LONGITUDE_RE = re.compile(r'lon(?:gitude)?[:\s]*(-?\d+\.?\d*)', re.IGNORECASE)
+
+# (required literal, pattern, format), tried in order; the first match that parses wins
+DATE_PATTERNS = [
+    # 17/07/2025 09:04 UTC
+    ('UTC', re.compile(r'(\d{1,2}/\d{1,2}/\d{4})\s+(\d{1,2}:\d{2})\s+UTC'), '%d/%m/%Y %H:%M'),
+    # 7/17/2025 9:04:23 AM (also covers "On 7/17/2025 9:04:23 AM")
+    ('/', re.compile(r'(\d{1,2}/\d{1,2}/\d{4})\s+(\d{1,2}:\d{2}:\d{2})\s+(AM|PM)'), '%m/%d/%Y %I:%M:%S %p'),
+    # On 14/07/2025
+    ('On', re.compile(r'On\s+(\d{1,2}/\d{1,2}/\d{4})'), '%d/%m/%Y'),
+    # From 17/07/2025
+    ('From', re.compile(r'From\s+(\d{1,2}/\d{1,2}/\d{4})'), '%d/%m/%Y'),
+    # 2025-07-17T16:25:52
+    ('-', re.compile(r'(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})'), '%Y-%m-%dT%H:%M:%S'),
+    # 2025-07-17
+    ('-', re.compile(r'(\d{4}-\d{2}-\d{2})'), '%Y-%m-%d'),
+]
+
+# (cue word, pattern, multiplier) on lowercased text; the largest figure wins
+POPULATION_PATTERNS = [
+    # 40.119 million, affecting 580 thousand
+    ('million', re.compile(r'(\d+(?:\.\d+)?)\s+million'), 1000000),
+    ('thousand', re.compile(r'(\d+(?:,\d+)*)\s+thousand'), 1000),
+    ('displaced', re.compile(r'(\d+(?:,\d+)*)\s+displaced'), 1),
+    ('deaths', re.compile(r'(\d+(?:,\d+)*)\s+deaths'), 1),
+    ('mmi', re.compile(r'(\d+(?:,\d+)*)\s+in\s+mmi'), 1),
+    ('population', re.compile(r'population\s+affected.*?(\d+(?:,\d+)*)'), 1),
+]
+
+# Scored by the number of distinct keywords found; ties go to the first type listed
+DISASTER_TYPE_KEYWORDS = {
+    'EQ': ['earthquake', 'magnitude', 'seismic', 'tremor', 'quake'],
+    'FL': ['flood', 'flooding', 'inundation', 'overflow'],
+    'WF': ['forest fire', 'wildfire', 'fire alert', 'bushfire', 'fire'],
+    'TC': ['cyclone', 'hurricane', 'typhoon', 'tropical storm', 'tropical depression', 'tropical'],
+    'VO': ['volcanic', 'eruption', 'volcano', 'ash cloud', 'lava'],
+    'DR': ['drought', 'dry spell', 'water shortage'],
+    'LS': ['landslide', 'mudslide', 'slope failure'],
+    'TS': ['tsunami', 'tidal wave', 'seismic wave'],
+}
+
+
+def trie_pattern(words):
+    """Regex source matching the longest of `words` at a position, with shared prefixes factored out."""
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        return f'(?:{body})?' if '' in node else body
+
+    return build(trie)
+
+
+class KeywordAutomaton:
+    """
+    Finds every keyword occurring anywhere in a text, like `keyword in text`
+    for each keyword, but in one left-to-right scan.
+
+    The keywords are compiled into a single trie-shaped pattern that the regex
+    engine runs as an automaton, matching the longest keyword at each start.
+    Shorter keywords at the same start are its prefixes and are looked up in a
+    table built once; keywords starting inside a match are found by resuming
+    the scan one character after the match start.
+    """
+
+    def __init__(self, keywords):
+        self.keywords = keywords = frozenset(keywords)
+        self._search = re.compile(trie_pattern(keywords)).search
+        self._prefixes = {
+            keyword: frozenset(other for other in keywords if keyword.startswith(other))
+            for keyword in keywords
+        }
+
+    def find(self, text):
+        found = set()
+        search, prefixes = self._search, self._prefixes
+        pos = 0
+        while match := search(text, pos):
+            found |= prefixes[match.group()]
+            pos = match.start() + 1
+        return found
+
+
+TYPE_OF_KEYWORD = {word: disaster_type for disaster_type, words in DISASTER_TYPE_KEYWORDS.items() for word in words}
+TYPE_ORDER = {disaster_type: i for i, disaster_type in enumerate(DISASTER_TYPE_KEYWORDS)}
+
+KEYWORDS = KeywordAutomaton(
+    [word for words in DISASTER_TYPE_KEYWORDS.values() for word in words]
+    + [cue for cue, _, _ in POPULATION_PATTERNS]
+)
+
+
+def valid_coordinates(lat, lon):
+    return -90 <= lat <= 90 and -180 <= lon <= 180
+
+
+def extract_coordinates(*texts):
+    """Latitude and longitude written in the given texts, or (None, None); see `locate()` for place names."""
+    text = ' '.join(t for t in texts if t)
+    if not text:
+        return None, None
+
+    for pattern in COORDINATE_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            try:
+                lat, lon = float(match.group(1)), float(match.group(2))
+            except ValueError:
+                continue
+            if valid_coordinates(lat, lon):
+                return lat, lon
+
+    lat_match = LATITUDE_RE.search(text)
+    lon_match = lat_match and LONGITUDE_RE.search(text)
+    if lat_match and lon_match:
+        try:
+            lat, lon = float(lat_match.group(1)), float(lon_match.group(1))
+        except ValueError:
+            return None, None
+        if valid_coordinates(lat, lon):
+            return lat, lon
+
+    return None, None
+
+
+def locate(*texts):
+    """Coordinates of the place named in the first of the texts naming one (offline gazetteer), or (None, None)."""
+    for text in texts:
+        place = geocode(text)
+        if place:
+            return place.latitude, place.longitude
+    return None, None
+
+
+def extract_disaster_time(text):
+    """First date (and time) written in the text, as an aware datetime."""
+    if not text:
+        return None
+
+    for literal, pattern, date_format in DATE_PATTERNS:
+        if literal not in text:
+            continue
+        for match in pattern.finditer(text):
+            try:
+                dt = datetime.strptime(' '.join(match.groups()), date_format)
+            except ValueError:
+                continue
+            return timezone.make_aware(dt) if timezone.is_naive(dt) else dt
+    return None
+
+
+def extract_population(lower_text, keywords):
+    """Largest population figure in the lowercased text; `keywords` as found by `KEYWORDS`."""
+    population = 0
+    for cue, pattern, multiplier in POPULATION_PATTERNS:
+        if cue not in keywords:
+            continue
+        for number in pattern.findall(lower_text):
+            try:
+                population = max(population, int(float(number.replace(',', '')) * multiplier))
+            except ValueError:
+                continue
+    return population
+
+
+def determine_disaster_type(keywords):
+    """Disaster type code with most keywords among `keywords`, or 'Unknown'."""
+    scores = {}
+    for word in keywords:
+        disaster_type = TYPE_OF_KEYWORD.get(word)
+        if disaster_type:
+            scores[disaster_type] = scores.get(disaster_type, 0) + 1
+    if not scores:
+        return 'Unknown'
+    return max(scores, key=lambda disaster_type: (scores[disaster_type], -TYPE_ORDER[disaster_type]))
+
+
+def missing_fields(latitude, longitude, disaster_time, population_affected, disaster_type):
+    """The `enrich()` fields an alert with these values still lacks."""
+    missing = set()
+    if latitude is None or longitude is None:
+        missing.add(COORDINATES)
+    if disaster_time is None:
+        missing.add(DISASTER_TIME)
+    if population_affected == 0:
+        missing.add(POPULATION)
+    if disaster_type in UNKNOWN_TYPES:
+        missing.add(DISASTER_TYPE)
+    return missing
+
+
+def extract(title, description, location, fields=ALL_FIELDS):
+    """
+    Extract the requested `fields` from an alert's text in one pass.
+
+    Returns a dict of model field name -> value with only what was found.
+    """
+    title = title or ''
+    description = description or ''
+    values = {}
+
+    if COORDINATES in fields:
+        lat, lon = extract_coordinates(location, title)
+        if lat is None:
+            lat, lon = locate(location, title)
+        if lat is not None:
+            values['latitude'], values['longitude'] = lat, lon
+
+    if DISASTER_TIME in fields:
+        disaster_time = extract_disaster_time(f'{description} {title}')
+        if disaster_time:
+            values['disaster_time'] = disaster_time
+
+    if POPULATION in fields or DISASTER_TYPE in fields:
+        lower_text = f'{title} {description}'.lower()
+        keywords = KEYWORDS.find(lower_text)
+        if POPULATION in fields:
+            population = extract_population(lower_text, keywords)
+            if population > 0:
+                values['population_affected'] = population
+        if DISASTER_TYPE in fields:
+            disaster_type = determine_disaster_type(keywords)
+            if disaster_type != 'Unknown':
+                values['disaster_type'] = disaster_type
+
+    return values
+
+
+def enrich(title, description, location, latitude, longitude, disaster_time,
+           population_affected, disaster_type, fields=ALL_FIELDS):
+    """Values for the `fields` an alert is missing that its text provides."""
+    wanted = missing_fields(latitude, longitude, disaster_time, population_affected, disaster_type) & fields
+    return extract(title, description, location, wanted) if wanted else {}
@@ -0,0 +1,54 @@
+from ingestion.upsert import bulk_upsert, chunked
+
+from .models import AlertAlias, disaster_alerts
+
+# Feed items are matched to existing alerts on these fields
+KEY_FIELDS = ('title', 'location')
+
+
+def merge_gdacs(alert, row):
+    """Fill in what an existing alert is missing from a GDACS item; returns the changed fields."""
+    changed = set()
+    if not alert.disaster_time:
+        alert.disaster_time = row['disaster_time']; changed.add('disaster_time')
+    if alert.population_affected == 0 and row['population_affected'] > 0:
+        alert.population_affected = row['population_affected']; changed.add('population_affected')
+    if alert.latitude is None and row['latitude']:
+        alert.latitude = row['latitude']; changed.add('latitude')
+    if alert.longitude is None and row['longitude']:
+        alert.longitude = row['longitude']; changed.add('longitude')
+    if changed:
+        if row['disaster_type'] and row['disaster_type'] != alert.disaster_type:
+            alert.disaster_type = row['disaster_type']; changed.add('disaster_type')
+        if row['description'] and row['description'] != alert.description:
+            alert.description = row['description']; changed.add('description')
+    return changed
+
+
+def merge_reliefweb(alert, row):
+    """ReliefWeb items only ever set a missing disaster time."""
+    if not alert.disaster_time:
+        alert.disaster_time = row['disaster_time']
+        return {'disaster_time'}
+    return set()
+
+
+def resolve_aliases(rows):
+    """Rows keyed like an alert merged away by `disasters.dedup`, re-keyed to the alert it was merged into."""
+    aliases = {}
+    for titles in chunked({row['title'] for row in rows}, 500):
+        for title, location, *key in AlertAlias.objects.filter(title__in=titles).values_list(
+                'title', 'location', 'alert__title', 'alert__location'):
+            aliases[(title, location)] = key
+    if not aliases:
+        return rows
+    resolved = []
+    for row in rows:
+        key = aliases.get((row['title'], row['location']))
+        resolved.append(dict(row, title=key[0], location=key[1]) if key else row)
+    return resolved
+
+
+def upsert_alerts(rows, merge, batch_size=500):
+    """Insert new alerts and merge known ones (or their duplicates'), see `ingestion.upsert.bulk_upsert`."""
+    return bulk_upsert(disaster_alerts, resolve_aliases(rows), KEY_FIELDS, merge, batch_size=batch_size)
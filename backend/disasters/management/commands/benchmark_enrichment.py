@@ -0,0 +1,77 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from disasters.enrichment import enrich_alerts
+from disasters.extraction import enrich
+from disasters.management.commands.benchmark_extraction import sample_texts
+from disasters.models import disaster_alerts
+
+
+def enrich_per_record():
+    """The previous loop: every alert loaded at once, then one full save per enriched record."""
+    for record in disaster_alerts.objects.all():
+        values = enrich(
+            record.title, record.description, record.location, record.latitude, record.longitude,
+            record.disaster_time, record.population_affected, record.disaster_type,
+        )
+        if values:
+            for field, value in values.items():
+                setattr(record, field, value)
+            record.save()
+
+
+class Command(BaseCommand):
+    help = 'Measure enhance_disaster_data: per-record saves versus chunked workers, and incremental re-runs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=20000, help='Alerts to enrich (default: 20000)')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Records per chunk (default: 1000)')
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        cpus = os.cpu_count() or 1
+        worker_counts = sorted({1, 2, 4, cpus} & set(range(1, cpus + 1)))
+
+        methods = [('per-record save', enrich_per_record)]
+        for workers in worker_counts:
+            methods.append((f'chunked, {workers} worker(s)', lambda workers=workers: [
+                None for _ in enrich_alerts(workers=workers, chunk_size=options['chunk_size'], incremental=False)
+            ]))
+
+        # Everything runs in a transaction that is rolled back at the end
+        with transaction.atomic():
+            self.create_alerts(rows)
+            self.stdout.write(self.style.SUCCESS(f'Full run over {rows} records'))
+            for name, run in methods:
+                savepoint = transaction.savepoint()
+                self.measure(name, rows, run)
+                transaction.savepoint_rollback(savepoint)
+
+            # Once enriched, and re-read once for the backfill's own writes, ingest 1% new records and run again
+            new_rows = max(rows // 100, 1)
+            for _ in range(2):
+                list(enrich_alerts(chunk_size=options['chunk_size']))
+            self.create_alerts(new_rows, seed=2)
+            self.stdout.write(self.style.SUCCESS(f'Re-run after {new_rows} new records'))
+            for name, incremental in [('full', False), ('incremental', True)]:
+                savepoint = transaction.savepoint()
+                self.measure(name, rows + new_rows, lambda: [
+                    None for _ in enrich_alerts(chunk_size=options['chunk_size'], incremental=incremental)
+                ])
+                transaction.savepoint_rollback(savepoint)
+            transaction.set_rollback(True)
+
+    def create_alerts(self, count, seed=1):
+        disaster_alerts.objects.bulk_create(
+            disaster_alerts(title=title[:255], description=description, location=location[:255])
+            for title, description, location in sample_texts(count, seed=seed)
+        )
+
+    def measure(self, name, rows, run):
+        started = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'  {name:<24} {rows / elapsed:>12,.0f} records/s ({elapsed:.2f}s)')
@@ -0,0 +1,82 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from disasters import extraction
+from disasters.models import disaster_alerts
+
+PHRASES = [
+    'earthquake', 'magnitude 5.1M', 'flood', 'flooding', 'wildfire', 'forest fire alert', 'cyclone',
+    'tropical storm', 'volcano eruption', 'drought', 'landslide', 'tsunami', 'seismic wave',
+]
+DESCRIPTIONS = [
+    'On {d}/07/2025 09:04 UTC, an earthquake affected {n} thousand people in MMI VI and 1.5 million in MMI IV.',
+    'From {d}/07/2025, {n} displaced and {d} deaths reported after heavy rain.',
+    'Event started 2025-07-{d}T16:25:52, population affected: {n}.',
+    'Latitude: {lat} Longitude: {lon}. No further details.',
+    'Situation report for the affected region.',
+]
+
+
+def sample_texts(count, seed=1):
+    """(title, description, location) triples shaped like GDACS and ReliefWeb items."""
+    rnd = random.Random(seed)
+    texts = []
+    for i in range(count):
+        title = f"Alert {i}: {' '.join(rnd.sample(PHRASES, rnd.randint(0, 3)))} in Papua New Guinea"
+        lat, lon = round(rnd.uniform(-60, 60), 2), round(rnd.uniform(-170, 170), 2)
+        description = rnd.choice(DESCRIPTIONS).format(d=rnd.randint(10, 28), n=rnd.randint(1, 900), lat=lat, lon=lon)
+        location = rnd.choice([f'{title} ({lat}, {lon})', title, 'Unknown'])
+        texts.append((title, description, location))
+    return texts
+
+
+class Command(BaseCommand):
+    help = 'Measure records per second of the disaster field extraction'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=50000, help='Synthetic records (default: 50000)')
+        parser.add_argument('--from-db', action='store_true', help='Use the text of the stored alerts instead')
+
+    def handle(self, *args, **options):
+        if options['from_db']:
+            texts = list(disaster_alerts.objects.values_list('title', 'description', 'location'))
+        else:
+            texts = sample_texts(options['rows'])
+        if not texts:
+            self.stdout.write('No records to measure.')
+            return
+
+        self.stdout.write(self.style.SUCCESS(f'{len(texts)} records'))
+        for name, fields in [
+            ('coordinates', {extraction.COORDINATES}),
+            ('disaster time', {extraction.DISASTER_TIME}),
+            ('population', {extraction.POPULATION}),
+            ('disaster type', {extraction.DISASTER_TYPE}),
+            ('all fields (one pass)', extraction.ALL_FIELDS),
+        ]:
+            self.measure(name, texts, lambda title, description, location: extraction.extract(
+                title, description, location, fields))
+
+        # Keyword detection alone: one automaton scan versus a substring test per keyword
+        keywords = list(extraction.KEYWORDS.keywords)
+        lowered = [f'{title} {description}'.lower() for title, description, _ in texts]
+        self.measure_keywords('keywords, automaton', lowered, extraction.KEYWORDS.find)
+        self.measure_keywords('keywords, substring per keyword', lowered,
+                              lambda text: {word for word in keywords if word in text})
+
+    def measure(self, name, texts, extract):
+        started = time.perf_counter()
+        for title, description, location in texts:
+            extract(title, description, location)
+        self.report(name, len(texts), time.perf_counter() - started)
+
+    def measure_keywords(self, name, texts, find):
+        started = time.perf_counter()
+        for text in texts:
+            find(text)
+        self.report(name, len(texts), time.perf_counter() - started)
+
+    def report(self, name, count, elapsed):
+        self.stdout.write(f'  {name:<34} {count / elapsed:>12,.0f} records/s')
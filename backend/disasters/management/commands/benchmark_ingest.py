@@ -0,0 +1,77 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from disasters.ingest import merge_gdacs, upsert_alerts
+from disasters.models import disaster_alerts
+
+
+def sample_rows(count, changed_every=0):
+    """GDACS-like feed rows; with `changed_every`, every n-th row reports a population."""
+    now = timezone.now()
+    rows = []
+    for i in range(count):
+        title = f'Green earthquake alert (Magnitude 4.{i % 10}M) in Papua New Guinea #{i}'
+        lat, lon = -6.08 + i % 7, 142.66
+        rows.append({
+            'title': title,
+            'description': f'On 17/07/2025 09:04 UTC an earthquake affected {i} thousand people.',
+            'location': f'{title} ({lat}, {lon})',
+            'disaster_type': 'EQ',
+            'population_affected': i + 1 if changed_every and i % changed_every == 0 else 0,
+            'disaster_time': now - timedelta(minutes=i),
+            'latitude': lat,
+            'longitude': lon,
+            'created_at': now - timedelta(minutes=i),
+        })
+    return rows
+
+
+def upsert_per_item(rows):
+    """The previous ingestion loop: one lookup and one save or create per item."""
+    for row in rows:
+        obj = disaster_alerts.objects.filter(title=row['title'], location=row['location']).first()
+        if obj:
+            if merge_gdacs(obj, row):
+                obj.save()
+        else:
+            disaster_alerts.objects.create(**row)
+
+
+class Command(BaseCommand):
+    help = 'Measure rows per second of disaster ingestion, per-item queries versus set-based bulk upsert'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Feed items per run (default: 10000)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows per bulk upsert batch (default: 500)')
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        batch_size = options['batch_size']
+        new_rows = sample_rows(rows)
+        changed_rows = sample_rows(rows, changed_every=10)
+
+        methods = [
+            ('per-item queries', upsert_per_item),
+            ('bulk upsert', lambda feed: upsert_alerts(feed, merge_gdacs, batch_size=batch_size)),
+        ]
+
+        # Everything runs in a transaction that is rolled back at the end
+        with transaction.atomic():
+            for name, upsert in methods:
+                self.stdout.write(self.style.SUCCESS(name))
+                savepoint = transaction.savepoint()
+                # First run inserts every item, the second finds them all and updates every tenth
+                self.measure('insert', upsert, new_rows)
+                self.measure('re-run (10% changed)', upsert, changed_rows)
+                transaction.savepoint_rollback(savepoint)
+            transaction.set_rollback(True)
+
+    def measure(self, name, upsert, rows):
+        started = time.perf_counter()
+        upsert(rows)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'  {name:<24} {len(rows) / elapsed:>12,.0f} rows/s ({elapsed:.2f}s)')
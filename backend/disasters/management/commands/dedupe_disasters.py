@@ -0,0 +1,60 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from disasters.dedup import DEDUP_FIELDS, DuplicateFinder, merge_groups
+from disasters.models import disaster_alerts
+
+
+class Command(BaseCommand):
+    help = 'Merge disaster alerts that report the same event, within a feed or across feeds'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.8,
+            help='Share of title words two alerts must have in common, 0-1 (default: 0.8)'
+        )
+        parser.add_argument(
+            '--window-days',
+            type=float,
+            default=2,
+            help='Largest time between two reports of one event (default: 2)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='List the duplicate groups without merging them'
+        )
+
+    def handle(self, *args, **options):
+        if not 0 < options['threshold'] <= 1:
+            raise CommandError('--threshold must be between 0 and 1')
+
+        started = time.monotonic()
+        finder = DuplicateFinder(options['threshold'], timedelta(days=options['window_days']))
+        rows = disaster_alerts.objects.order_by('pk').values_list(*DEDUP_FIELDS).iterator(chunk_size=2000)
+        groups = finder.groups(rows)
+
+        for survivor, *duplicates in groups:
+            self.stdout.write(f'ID {survivor.pk}: {survivor.row["title"][:60]}')
+            for duplicate in duplicates:
+                self.stdout.write(f'  duplicate ID {duplicate.pk}: {duplicate.row["title"][:60]}')
+
+        stats = finder.stats
+        pairs = stats['alerts'] * (stats['alerts'] - 1) // 2
+        self.stdout.write(
+            f"Compared {stats['compared']:,} candidate pairs of {stats['alerts']:,} alerts "
+            f"({stats['compared'] / pairs * 100 if pairs else 0:.3f}% of all pairs)"
+        )
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(
+                f'{len(groups)} duplicate groups, {sum(len(group) - 1 for group in groups)} alerts would be merged'
+            ))
+            return
+
+        merged = merge_groups(groups) if groups else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Merged {merged} duplicate alerts into {len(groups)} alerts in {time.monotonic() - started:.1f}s'
+        ))
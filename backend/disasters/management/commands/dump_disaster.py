@@ -1,12 +1,13 @@
 from django.core.management.base import BaseCommand
 from disasters.models import disaster_alerts
-import json
+from disasters.records import disaster_serializer
+from sync.records import dumps
 
 class Command(BaseCommand):
-    help = 'Print all disaster_alerts records as JSON using the to_dict() helper'
+    help = 'Print all disaster_alerts records as JSON using the to_dict() serializer'
 
     def handle(self, *args, **options):
         qs = disaster_alerts.objects.order_by('-created_at')
-        for d in qs:
-            # use ensure_ascii=False for readable non-ASCII characters
-            self.stdout.write(json.dumps(d.to_dict(), ensure_ascii=False))
+        # rows are read as value tuples, no model instances are built
+        for d in disaster_serializer.dicts(qs):
+            self.stdout.write(dumps(d))
@@ -1,165 +1,276 @@
+import json
+import time
 import requests
-import xml.etree.ElementTree as ET
 from datetime import datetime, timedelta
-from django.core.management.base import BaseCommand
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
 from django.utils import timezone
-from disasters.models import disaster_alerts
-from algoliasearch_django.decorators import disable_auto_indexing
+from disasters.extraction import locate
+from disasters.ingest import merge_gdacs, merge_reliefweb, upsert_alerts
+from ingestion import http
+from ingestion.concurrency import Counters, Deadline, DeadlineExceeded, run_concurrently
+from ingestion.http import HTTPStatusError, with_retries
+from ingestion.rss import iter_items
 
 
-def get_child_text(item, name):
-    for child in item:
-        if child.tag.split('}')[-1] == name:
-            return (child.text or '').strip()
-    return None
+def parse_pub_date(pub):
+    """Parse an RSS pubDate (RFC 822, or ISO 8601 as a fallback); None if it can't be read."""
+    try:
+        return datetime.strptime(pub, '%a, %d %b %Y %H:%M:%S %Z')
+    except (TypeError, ValueError):
+        try:
+            return datetime.fromisoformat(pub.replace('Z', '+00:00'))
+        except (AttributeError, ValueError):
+            return None
 
 
 class Command(BaseCommand):
     help = 'Fetch disaster alerts from GDACS and ReliefWeb RSS feeds (last 30 days).'
 
+    # Seconds allowed for downloading one feed
+    FEED_TIMEOUT = 120
+    # Consecutive items older than the cutoff after which a feed is not read further
+    STALE_ITEMS = 20
+    DETAIL_URL = 'https://www.gdacs.org/gdacsapi/api/events/geteventdata?eventtype={eventtype}&eventid={eventid}&format=json'
+    # Event details are cached per (eventtype, eventid) across runs of a long-lived process
+    DETAIL_CACHE_TTL = 60 * 60
+
     def add_arguments(self, parser):
         parser.add_argument('--limit', type=int, default=1000, help='Max number of events to process (default: 1000)')
+        parser.add_argument('--refresh', action='store_true', help='Ignore cached feeds and re-process every item')
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent GDACS event-detail requests (default: 8)')
+        parser.add_argument('--retries', type=int, default=2, help='Retries per event detail on transient errors (default: 2)')
+        parser.add_argument('--timeout', type=float, default=20, help='Seconds allowed per event detail, retries included (default: 20)')
+        parser.add_argument('--replay', nargs='?', const='latest', metavar='RUN',
+                            help='Read the responses of an archived run (default: the latest) instead of the network')
+        parser.add_argument('--no-archive', action='store_true', help='Do not archive the downloaded responses')
 
     def handle(self, *args, **options):
-        with disable_auto_indexing():
-            limit = options['limit']
-            cutoff_date = (datetime.utcnow() - timedelta(days=30)).date()
-            new_count = updated_count = 0
-
-            # ---------------- GDACS RSS ----------------
-            gdacs_url = 'https://www.gdacs.org/Xml/rssarchive.xml'
-            self.stdout.write(self.style.SUCCESS('Fetching GDACS RSS...'))
-            try:
-                resp = requests.get(gdacs_url, timeout=30)
-                resp.raise_for_status()
-                root = ET.fromstring(resp.content)
-                items = root.findall('.//item')[:limit]
-                self.stdout.write(f'Found {len(items)} GDACS items.')
-            except Exception as e:
-                self.stderr.write(f'Error fetching GDACS RSS: {e}')
-                items = []
-
-            for item in items:
-                pub = get_child_text(item, 'pubDate')
-                try:
-                    dt = datetime.strptime(pub, '%a, %d %b %Y %H:%M:%S %Z')
-                except:
-                    try:
-                        dt = datetime.fromisoformat(pub.replace('Z', '+00:00'))
-                    except:
-                        continue
-                if dt.date() < cutoff_date:
-                    continue
-                aware_dt = timezone.make_aware(dt) if timezone.is_naive(dt) else dt
-
-                title = get_child_text(item, 'title') or ''
-                description = get_child_text(item, 'description') or ''
-                eventid = get_child_text(item, 'eventid') or get_child_text(item, 'link')
-                eventtype = get_child_text(item, 'eventtype') or ''
-                population = 0
-                lat = lon = None
-
-                if eventid and eventtype:
-                    try:
-                        detail_url = f'https://www.gdacs.org/gdacsapi/api/events/geteventdata?eventtype={eventtype}&eventid={eventid}&format=json'
-                        dresp = requests.get(detail_url, timeout=20)
-                        dresp.raise_for_status()
-                        data = dresp.json().get('event', {})
-                        population = int(data.get('populationExposure') or 0)
-                        lat = float(data.get('latitude') or 0)
-                        lon = float(data.get('longitude') or 0)
-                        description = data.get('description') or description
-                    except:
-                        pass
-
-                loc_str = f"{title} ({lat}, {lon})" if lat and lon else title
-                obj = disaster_alerts.objects.filter(title=title, location=loc_str).first()
-                if obj:
-                    changed = False
-                    if not obj.disaster_time:
-                        obj.disaster_time = aware_dt; changed = True
-                    if obj.population_affected == 0 and population > 0:
-                        obj.population_affected = population; changed = True
-                    if obj.latitude is None and lat:
-                        obj.latitude = lat; changed = True
-                    if obj.longitude is None and lon:
-                        obj.longitude = lon; changed = True
-                    if changed:
-                        obj.disaster_type = eventtype or obj.disaster_type
-                        obj.description = description or obj.description
-                        obj.save()
-                        updated_count += 1
-                        self.stdout.write(f'Updated (GDACS): {title}')
-                else:
-                    disaster_alerts.objects.create(
-                        title=title,
-                        description=description,
-                        location=loc_str,
-                        disaster_type=eventtype,
-                        population_affected=population,
-                        disaster_time=aware_dt,
-                        latitude=lat,
-                        longitude=lon,
-                        created_at=aware_dt
-                    )
-                    new_count += 1
-                    self.stdout.write(f'Added (GDACS): {title}')
-
-            # ---------------- ReliefWeb RSS ----------------
-            relief_url = 'https://reliefweb.int/disasters/rss.xml'
-            self.stdout.write(self.style.SUCCESS('Fetching ReliefWeb RSS...'))
-
-            try:
-                rresp = requests.get(relief_url, timeout=30)
-                rresp.raise_for_status()
-                rroot = ET.fromstring(rresp.content)
-                ritems = rroot.findall('.//item')[:limit]
-                self.stdout.write(f'Found {len(ritems)} ReliefWeb items.')
-            except Exception as e:
-                self.stderr.write(f'Error fetching ReliefWeb RSS: {e}')
-                ritems = []
-
-            for item in ritems:
-                pub = get_child_text(item, 'pubDate')
-                try:
-                    dt = datetime.strptime(pub, '%a, %d %b %Y %H:%M:%S %Z')
-                except:
-                    try:
-                        dt = datetime.fromisoformat(pub.replace('Z', '+00:00'))
-                    except:
-                        continue
-                if dt.date() < cutoff_date:
-                    continue
-                aware_dt = timezone.make_aware(dt) if timezone.is_naive(dt) else dt
-
-                title = get_child_text(item, 'title') or ''
-                description = get_child_text(item, 'description') or ''
-                link = get_child_text(item, 'link') or ''
-                loc_str = title
-                eventtype = 'ReliefWeb Alert'
-
-                obj = disaster_alerts.objects.filter(title=title, location=loc_str).first()
-                if obj:
-                    if not obj.disaster_time:
-                        obj.disaster_time = aware_dt
-                        obj.save()
-                        updated_count += 1
-                        self.stdout.write(f'Updated (ReliefWeb): {title}')
-                else:
-                    disaster_alerts.objects.create(
-                        title=title,
-                        description=description,
-                        location=loc_str,
-                        disaster_type=eventtype,
-                        population_affected=0,
-                        disaster_time=aware_dt,
-                        latitude=None,
-                        longitude=None,
-                        created_at=aware_dt
-                    )
-                    new_count += 1
-                    self.stdout.write(f'Added (ReliefWeb): {title}')
-
-            self.stdout.write(self.style.SUCCESS(
-                f'Done. New: {new_count}, Updated: {updated_count} (since {cutoff_date})'
-            ))
+        try:
+            session = http.fetch_session('fetch_disaster', options['replay'], not options['no_archive'])
+        except LookupError as e:
+            raise CommandError(str(e))
+        with session as replay:
+            self.replay = replay
+            self.fetch(options)
+
+    def fetch(self, options):
+        limit = options['limit']
+        refresh = options['refresh']
+        # A replay keeps the window the archived run saw
+        now = self.replay.fetched_at.replace(tzinfo=None) if self.replay and self.replay.fetched_at else datetime.utcnow()
+        cutoff_date = (now - timedelta(days=30)).date()
+        new_count = updated_count = 0
+
+        # ---------------- GDACS RSS ----------------
+        gdacs_url = 'https://www.gdacs.org/Xml/rssarchive.xml'
+        entries = self.read_feed(
+            'GDACS', gdacs_url, ('title', 'description', 'eventid', 'eventtype', 'link'),
+            limit, cutoff_date, refresh,
+        )
+        for entry in entries:
+            entry['title'] = entry['title'] or ''
+            entry['description'] = entry['description'] or ''
+            entry['eventid'] = entry['eventid'] or entry['link']
+            entry['eventtype'] = entry['eventtype'] or ''
+
+        details = self.fetch_event_details(entries, options)
+
+        rows = []
+        for entry in entries:
+            aware_dt = entry['aware_dt']
+            title = entry['title']
+            description = entry['description']
+            eventtype = entry['eventtype']
+            population = 0
+            lat = lon = None
+
+            detail = details.get((eventtype, entry['eventid']))
+            if detail:
+                population = detail['population']
+                lat = detail['latitude']
+                lon = detail['longitude']
+                description = detail['description'] or description
+
+            loc_str = f"{title} ({lat}, {lon})" if lat and lon else title
+            if not (lat and lon):
+                # Without event details, the country or place named in the title (the key stays the title)
+                lat, lon = locate(title)
+            rows.append({
+                'title': title,
+                'description': description,
+                'location': loc_str,
+                'disaster_type': eventtype,
+                'population_affected': population,
+                'disaster_time': aware_dt,
+                'latitude': lat,
+                'longitude': lon,
+                'created_at': aware_dt,
+            })
+
+        result = upsert_alerts(rows, merge_gdacs)
+        for alert in result.updated:
+            self.stdout.write(f'Updated (GDACS): {alert.title}')
+        for alert in result.created:
+            self.stdout.write(f'Added (GDACS): {alert.title}')
+        new_count += len(result.created)
+        updated_count += len(result.updated)
+
+        # ---------------- ReliefWeb RSS ----------------
+        relief_url = 'https://reliefweb.int/disasters/rss.xml'
+        rentries = self.read_feed('ReliefWeb', relief_url, ('title', 'description', 'link'), limit, cutoff_date, refresh)
+
+        rows = []
+        for entry in rentries:
+            title = entry['title'] or ''
+            latitude, longitude = locate(title)
+            rows.append({
+                'title': title,
+                'description': entry['description'] or '',
+                'location': title,
+                'disaster_type': 'ReliefWeb Alert',
+                'population_affected': 0,
+                'disaster_time': entry['aware_dt'],
+                'latitude': latitude,
+                'longitude': longitude,
+                'created_at': entry['aware_dt'],
+            })
+
+        result = upsert_alerts(rows, merge_reliefweb)
+        for alert in result.updated:
+            self.stdout.write(f'Updated (ReliefWeb): {alert.title}')
+        for alert in result.created:
+            self.stdout.write(f'Added (ReliefWeb): {alert.title}')
+        new_count += len(result.created)
+        updated_count += len(result.updated)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Done. New: {new_count}, Updated: {updated_count} (since {cutoff_date})'
+        ))
+
+    def read_feed(self, name, url, fields, limit, cutoff_date, refresh=False):
+        """
+        Stream an RSS feed and return its items since `cutoff_date`.
+
+        Items are parsed while the feed downloads, each into a dict of `fields`
+        plus the parsed `aware_dt`. Reading stops after `limit` items, or once
+        the feed has moved past the cutoff date, so the rest of the archive is
+        never downloaded.
+        """
+        self.stdout.write(self.style.SUCCESS(f'Fetching {name} RSS...'))
+        entries = []
+        read = stale = 0
+        try:
+            with http.stream(url, Deadline(self.FEED_TIMEOUT), use_cache=not refresh, source=name) as resp:
+                if resp.not_modified:
+                    # Same feed as on the last run: skip parsing, detail lookups and saving
+                    self.stdout.write(f'{name} RSS unchanged since last fetch.')
+                    return entries
+                if resp.status != 200:
+                    raise HTTPStatusError(url, resp.status)
+
+                for item in iter_items(resp.chunks, ('pubDate', *fields)):
+                    read += 1
+                    dt = parse_pub_date(item['pubDate'])
+                    if dt is not None and dt.date() < cutoff_date:
+                        # Feeds list newest first; a run of old items means the rest is older still
+                        stale += 1
+                        if stale >= self.STALE_ITEMS:
+                            break
+                    elif dt is not None:
+                        stale = 0
+                        item['aware_dt'] = timezone.make_aware(dt) if timezone.is_naive(dt) else dt
+                        entries.append(item)
+                    if read >= limit:
+                        break
+        except Exception as e:
+            self.stderr.write(f'Error fetching {name} RSS: {e}')
+
+        self.stdout.write(f'Found {len(entries)} {name} items since {cutoff_date} ({read} read).')
+        return entries
+
+    def fetch_event_details(self, entries, options):
+        """
+        Fetch GDACS event details for all entries as a bounded concurrent fan-out.
+
+        Each (eventtype, eventid) is looked up once, from the cache when a
+        recent copy exists; transient failures are retried with backoff and
+        every failure is counted instead of silently dropped.
+        """
+        counters = Counters()
+        details = {}
+        jobs = {}
+        for entry in entries:
+            key = (entry['eventtype'], entry['eventid'])
+            if not all(key) or key in details or key in jobs:
+                continue
+            # A replay reads the archived details, not the ones cached by live runs
+            cached = None if self.replay else cache.get(self.detail_cache_key(*key))
+            if cached is not None:
+                details[key] = cached
+                counters.incr('cached')
+            else:
+                jobs[key] = self.DETAIL_URL.format(eventtype=key[0], eventid=key[1])
+
+        if not jobs and not details:
+            return details
+
+        started = time.monotonic()
+        fetch = with_retries(
+            self.fetch_event_detail,
+            attempts=options['retries'] + 1,
+            on_retry=lambda url, error: counters.incr('retries'),
+        )
+        # GDACS is a single host, so the per-host cap is the fan-out width
+        results = run_concurrently(
+            jobs, fetch, workers=options['workers'], per_host=options['workers'], timeout=options['timeout'],
+        )
+        for key, detail, error in results:
+            if error is not None:
+                counters.incr('failed')
+                counters.incr(f'failed ({self.failure_reason(error)})')
+                continue
+            details[key] = detail
+            if not self.replay:
+                cache.set(self.detail_cache_key(*key), detail, self.DETAIL_CACHE_TTL)
+            counters.incr('fetched')
+
+        self.stdout.write(
+            f"Event details: {counters['fetched']} fetched, {counters['cached']} cached, "
+            f"{counters['retries']} retries, {counters['failed']} failed "
+            f"in {time.monotonic() - started:.1f}s"
+        )
+        for name, count in counters.items():
+            if name.startswith('failed ('):
+                self.stdout.write(f'  {name}: {count}')
+        return details
+
+    def fetch_event_detail(self, url, deadline):
+        """Download and parse one event detail; runs on a worker thread"""
+        # Details are cached per event in Django's cache, not in the response cache
+        resp = http.get(url, deadline, headers={'Accept': 'application/json'}, use_cache=False, source='GDACS event')
+        if resp.status != 200:
+            raise HTTPStatusError(url, resp.status)
+        data = json.loads(resp.body).get('event') or {}
+        return {
+            'population': int(data.get('populationExposure') or 0),
+            'latitude': float(data.get('latitude') or 0),
+            'longitude': float(data.get('longitude') or 0),
+            'description': data.get('description'),
+        }
+
+    @staticmethod
+    def detail_cache_key(eventtype, eventid):
+        return f'gdacs:event:{eventtype}:{eventid}'
+
+    @staticmethod
+    def failure_reason(error):
+        if isinstance(error, HTTPStatusError):
+            return f'HTTP {error.status}'
+        if isinstance(error, (DeadlineExceeded, requests.exceptions.Timeout)):
+            return 'timeout'
+        if isinstance(error, requests.exceptions.RequestException):
+            return 'connection error'
+        if isinstance(error, (ValueError, TypeError, AttributeError)):
+            return 'invalid response'
+        return type(error).__name__
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.4 on 2026-10-19 03:42
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='disaster_alerts',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=255)),
+                ('description', models.TextField(blank=True, null=True)),
+                ('location', models.CharField(default='Unknown', max_length=255)),
+                ('disaster_type', models.CharField(default='Unknown', max_length=100)),
+                ('population_affected', models.IntegerField(default=0)),
+                ('disaster_time', models.DateTimeField(blank=True, null=True)),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('extraction_version', models.PositiveSmallIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'disaster_alerts',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='EnrichmentWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_label', models.CharField(max_length=100, unique=True)),
+                ('enriched_until', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AlertAlias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=255)),
+                ('location', models.CharField(max_length=255)),
+                ('alert', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='disasters.disaster_alerts')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('title', 'location'), name='unique_alert_alias')],
+            },
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.4 on 2026-10-19 03:42
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.utils import timezone
+
+
+def merge_duplicate_keys(apps, schema_editor):
+    """
+    Keep one alert per (title, location) before the key becomes unique: the
+    newest, which is the one fetches have been updating. Aliases of the others
+    move to it, and their Algolia records are queued for deletion since
+    historical models send no signals to the sync receivers.
+    """
+    alerts = apps.get_model('disasters', 'disaster_alerts')
+    aliases = apps.get_model('disasters', 'AlertAlias')
+    changes = apps.get_model('sync', 'PendingIndexChange')
+    using = schema_editor.connection.alias
+    keys = (alerts.objects.using(using).order_by().values_list('title', 'location')
+            .annotate(count=Count('pk')).filter(count__gt=1))
+    removed = []
+    for title, location, _ in list(keys):
+        keep, *others = (alerts.objects.using(using).filter(title=title, location=location)
+                         .order_by('-created_at', '-pk').values_list('pk', flat=True))
+        aliases.objects.using(using).filter(alert_id__in=others).update(alert_id=keep)
+        removed += others
+    now = timezone.now()
+    for start in range(0, len(removed), 500):
+        batch = removed[start:start + 500]
+        alerts.objects.using(using).filter(pk__in=batch).delete()
+        changes.objects.using(using).bulk_create(
+            [changes(model_label='disasters.disaster_alerts', object_pk=str(pk), action='delete', queued_at=now)
+             for pk in batch],
+            update_conflicts=True, unique_fields=['model_label', 'object_pk'],
+            update_fields=['action', 'fields', 'queued_at'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('disasters', '0001_initial'),
+        ('sync', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='disaster_alerts',
+            index=models.Index(fields=['-created_at'], name='disaster_alert_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='disaster_alerts',
+            index=models.Index(fields=['updated_at'], name='disaster_alert_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='disaster_alerts',
+            index=models.Index(fields=['extraction_version'], name='disaster_alert_version_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='disaster_alerts',
+            index=models.Index(condition=models.Q(('latitude__isnull', True)), fields=['id'], name='disaster_alert_no_coords_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='disaster_alerts',
+            index=models.Index(condition=models.Q(('disaster_time__isnull', True)), fields=['id'], name='disaster_alert_no_time_idx'),
+        ),
+        migrations.RunPython(merge_duplicate_keys, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='disaster_alerts',
+            constraint=models.UniqueConstraint(fields=('title', 'location'), name='unique_disaster_alert'),
+        ),
+    ]
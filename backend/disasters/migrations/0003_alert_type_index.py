@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-19 03:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('disasters', '0002_alert_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='disaster_alerts',
+            index=models.Index(fields=['disaster_type', '-created_at'], name='disaster_alert_type_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-19 04:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('disasters', '0003_alert_type_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='disaster_alerts',
+            name='enriched_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
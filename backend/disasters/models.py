@@ -1,6 +1,8 @@
 from django.db import models
 from django.utils import timezone
 
+from .records import disaster_serializer
+
 class disaster_alerts(models.Model):  
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True, null=True)
@@ -12,10 +14,29 @@ class disaster_alerts(models.Model):
     longitude = models.FloatField(null=True, blank=True)  
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
+    # `disasters.extraction.EXTRACTION_VERSION` this alert was last enriched with, 0 if never
+    extraction_version = models.PositiveSmallIntegerField(default=0)
+    # When a complete enrichment run last read or wrote this alert; an `updated_at` after it is a change since
+    enriched_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         db_table = 'disaster_alerts'
         ordering = ['-created_at']
+        constraints = [
+            # The key feeds are matched on (`disasters.ingest.KEY_FIELDS`)
+            models.UniqueConstraint(fields=['title', 'location'], name='unique_disaster_alert'),
+        ]
+        indexes = [
+            models.Index(fields=['-created_at'], name='disaster_alert_created_idx'),
+            # Changed since the last Algolia sync or enrichment run
+            models.Index(fields=['updated_at'], name='disaster_alert_updated_idx'),
+            models.Index(fields=['extraction_version'], name='disaster_alert_version_idx'),
+            # The API's `type` filter, newest first
+            models.Index(fields=['disaster_type', '-created_at'], name='disaster_alert_type_idx'),
+            # Alerts still missing what enrichment looks for; a small share of the table once enriched
+            models.Index(fields=['id'], condition=models.Q(latitude__isnull=True), name='disaster_alert_no_coords_idx'),
+            models.Index(fields=['id'], condition=models.Q(disaster_time__isnull=True), name='disaster_alert_no_time_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.location}"
@@ -26,21 +47,33 @@ class disaster_alerts(models.Model):
 
     def to_dict(self):
         """Custom serialization method for Algolia or API use"""
-        return {
-            'objectID': self.pk,
-            'id': self.pk,
-            'title': self.title,
-            'description': self.description,
-            'location': self.location,
-            'disaster_type': self.disaster_type,
-            'population_affected': self.population_affected,
-            'disaster_time': self.disaster_time.isoformat() if self.disaster_time else None,
-            'latitude': self.latitude,
-            'longitude': self.longitude,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat(),
-        }
+        return disaster_serializer.to_dict(self)
 
     def algolia_index_data(self):
         """Data to be indexed in Algolia"""
         return self.to_dict()
+
+
+class EnrichmentWatermark(models.Model):
+    """Start of the last complete enrichment run: alerts updated since then are enriched again."""
+    model_label = models.CharField(max_length=100, unique=True)
+    enriched_until = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.model_label} @ {self.enriched_until}"
+
+
+class AlertAlias(models.Model):
+    """Feed key `(title, location)` of an alert merged into another as a duplicate."""
+    title = models.CharField(max_length=255)
+    location = models.CharField(max_length=255)
+    alert = models.ForeignKey(disaster_alerts, on_delete=models.CASCADE, related_name='aliases')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['title', 'location'], name='unique_alert_alias'),
+        ]
+
+    def __str__(self):
+        return f"{self.title} - {self.location} -> {self.alert_id}"
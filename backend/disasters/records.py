@@ -0,0 +1,61 @@
+from sync.records import RecordSerializer
+
+from .extraction import extract_coordinates
+
+
+class DisasterAlertSerializer(RecordSerializer):
+    value_fields = (
+        'pk', 'title', 'description', 'location', 'disaster_type', 'population_affected',
+        'latitude', 'longitude', 'disaster_time', 'created_at', 'updated_at',
+    )
+    dict_fields = (
+        'objectID', 'id', 'title', 'description', 'location', 'disaster_type', 'population_affected',
+        'disaster_time', 'latitude', 'longitude', 'created_at', 'updated_at',
+    )
+
+    def build_index_record(self, row):
+        (pk, title, description, location, disaster_type, population_affected,
+         latitude, longitude, disaster_time, _created_at, _updated_at) = row
+
+        # Fall back to coordinates written in the location string
+        if (not latitude or not longitude) and location:
+            lat, lon = extract_coordinates(location)
+            if lat is not None:
+                latitude, longitude = lat, lon
+
+        return {
+            'title': title,
+            'description': description,
+            'location': location,
+            'disaster_type': disaster_type,
+            'population_affected': population_affected,
+            'latitude': latitude,
+            'longitude': longitude,
+            # disaster_time is sent as ISO string, plus a readable form for search and a timestamp for sorting
+            'disaster_time': disaster_time.isoformat() if disaster_time else None,
+            'disaster_time_str': disaster_time.strftime('%Y-%m-%d %H:%M:%S') if disaster_time else 'Unknown',
+            'disaster_time_timestamp': int(disaster_time.timestamp()) if disaster_time else 0,
+            'objectID': pk,
+            'id': pk,
+        }
+
+    def build_dict(self, row):
+        (pk, title, description, location, disaster_type, population_affected,
+         latitude, longitude, disaster_time, created_at, updated_at) = row
+        return {
+            'objectID': pk,
+            'id': pk,
+            'title': title,
+            'description': description,
+            'location': location,
+            'disaster_type': disaster_type,
+            'population_affected': population_affected,
+            'disaster_time': disaster_time.isoformat() if disaster_time else None,
+            'latitude': latitude,
+            'longitude': longitude,
+            'created_at': created_at.isoformat(),
+            'updated_at': updated_at.isoformat(),
+        }
+
+
+disaster_serializer = DisasterAlertSerializer()
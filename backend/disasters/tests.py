@@ -1,3 +1,203 @@
-from django.test import TestCase
+import io
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+
+from sync.models import PendingIndexChange
+
+from .dedup import DEDUP_FIELDS, DuplicateFinder, geohash, jaccard, merge_values, minhash, title_tokens
+from .enrichment import enrich_alerts, pending_alerts, watermark
+from .extraction import COORDINATES, EXTRACTION_VERSION
+from .models import AlertAlias, disaster_alerts
+
+NOW = datetime(2025, 7, 17, 12, tzinfo=dt_timezone.utc)
+
+
+def row(pk, title, disaster_type='FL', time=NOW, lat=None, lon=None, **fields):
+    values = {
+        'pk': pk, 'title': title, 'location': title, 'description': None, 'disaster_type': disaster_type,
+        'disaster_time': time, 'created_at': time, 'latitude': lat, 'longitude': lon, 'population_affected': 0,
+        **fields,
+    }
+    return tuple(values[field] for field in DEDUP_FIELDS)
+
+
+def pks(groups):
+    return [[alert.pk for alert in group] for group in groups]
+
+
+class DedupTests(SimpleTestCase):
+    def test_title_tokens_ignore_alert_levels_and_keep_codes(self):
+        self.assertEqual(title_tokens('Red alert for Flood in Sindh, 17/07/2025 4.5m'),
+                         {'flood', 'sindh', '17/07/2025', '4.5m'})
+        self.assertEqual(title_tokens('Orange flood alert in Sindh'), title_tokens('Red flood alert in Sindh'))
+
+    def test_minhash_agrees_with_jaccard(self):
+        a = title_tokens('Flood in Sindh province Pakistan July 2025')
+        b = title_tokens('Flood in Sindh province Pakistan August 2025')
+        self.assertEqual(minhash(a), minhash(set(a)))
+        self.assertIsNone(minhash(frozenset()))
+        self.assertAlmostEqual(jaccard(a, b), 5 / 7)
+        self.assertEqual(jaccard(a, frozenset()), 0.0)
+        agreeing = sum(x == y for x, y in zip(minhash(a), minhash(b))) / len(minhash(a))
+        self.assertAlmostEqual(agreeing, jaccard(a, b), delta=0.3)
+
+    def test_geohash(self):
+        self.assertEqual(geohash(57.64911, 10.40744, 11), 'u4pruydqqvj')
+        self.assertEqual(geohash(31.5497, 74.3436), 'tts')
+
+    def test_duplicates_are_grouped_into_the_oldest(self):
+        finder = DuplicateFinder()
+        groups = finder.groups([
+            row(1, 'Flood in Sindh Pakistan'),
+            row(2, 'Earthquake in Nepal', 'EQ'),
+            row(3, 'Red alert: Flood in Sindh, Pakistan', time=NOW + timedelta(hours=6)),
+            row(4, 'Flood in Sindh Pakistan', time=NOW + timedelta(days=5)),
+        ])
+
+        self.assertEqual(pks(groups), [[1, 3]])
+        self.assertEqual(finder.stats['alerts'], 4)
+
+    def test_alerts_are_compared_within_their_blocks_only(self):
+        rows = [row(i, f'Cyclone {i} over the bay', 'TC', time=NOW + timedelta(days=5 * i)) for i in range(50)]
+        finder = DuplicateFinder()
+        self.assertEqual(finder.groups(rows), [])
+        # Each falls in its own time bucket, so none is compared
+        self.assertEqual(finder.stats['compared'], 0)
+
+    def test_same_place_and_type_are_compared_whatever_the_title(self):
+        finder = DuplicateFinder()
+        finder.groups([row(1, 'Flooding', lat=31.5, lon=74.3), row(2, 'Monsoon rains', lat=31.6, lon=74.4)])
+        self.assertEqual(finder.stats['compared'], 1)
+
+    def test_chain_through_a_generic_type_is_split(self):
+        groups = DuplicateFinder().groups([
+            row(1, 'Disaster in Sindh Pakistan', 'FL'),
+            row(2, 'Disaster in Sindh Pakistan', 'ReliefWeb Alert'),
+            row(3, 'Disaster in Sindh Pakistan', 'EQ'),
+            row(4, 'Disaster in Sindh Pakistan', 'EQ'),
+        ])
+        self.assertEqual(pks(groups), [[1, 2], [3, 4]])
+
+    def test_chain_of_nearby_points_is_split(self):
+        groups = DuplicateFinder().groups([
+            row(1, 'Flood in Punjab', lat=30.0, lon=70.0),
+            row(2, 'Flood in Punjab', lat=30.0, lon=72.0),
+            row(3, 'Flood in Punjab', lat=30.0, lon=74.0),
+        ])
+        self.assertEqual(pks(groups), [[1, 2]])
+
+    def test_merge_values_fill_only_what_the_survivor_misses(self):
+        finder = DuplicateFinder()
+        survivor, first, second = finder.groups([
+            row(1, 'Flood in Sindh', 'ReliefWeb Alert', population_affected=10),
+            row(2, 'Flood in Sindh', 'FL', lat=25.0, lon=68.0, population_affected=500, description='From GDACS'),
+            row(3, 'Flood in Sindh', 'FL', lat=26.0, lon=69.0, population_affected=200),
+        ])[0]
+
+        self.assertEqual(merge_values(survivor, [first, second]), {
+            'latitude': 25.0, 'longitude': 68.0, 'population_affected': 500,
+            'disaster_type': 'FL', 'description': 'From GDACS',
+        })
+
+
+class DedupeCommandTests(TestCase):
+    def setUp(self):
+        self.first = disaster_alerts.objects.create(title='Flood in Sindh Pakistan', location='Sindh',
+                                                    disaster_type='FL', disaster_time=NOW)
+        self.second = disaster_alerts.objects.create(title='Red alert: Flood in Sindh, Pakistan', location='Pakistan',
+                                                     disaster_type='FL', disaster_time=NOW, latitude=25.0,
+                                                     longitude=68.0, population_affected=300)
+        disaster_alerts.objects.create(title='Earthquake in Nepal', location='Nepal', disaster_type='EQ')
+
+    def dedupe(self, *args):
+        out = io.StringIO()
+        call_command('dedupe_disasters', *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run_lists_groups_without_merging(self):
+        output = self.dedupe('--dry-run')
+
+        self.assertIn(f'ID {self.first.pk}: Flood in Sindh Pakistan', output)
+        self.assertIn(f'duplicate ID {self.second.pk}', output)
+        self.assertIn('1 duplicate groups, 1 alerts would be merged', output)
+        self.assertEqual(disaster_alerts.objects.count(), 3)
+
+    def test_duplicates_are_merged_and_kept_as_aliases(self):
+        self.dedupe()
+
+        self.assertFalse(disaster_alerts.objects.filter(pk=self.second.pk).exists())
+        survivor = disaster_alerts.objects.get(pk=self.first.pk)
+        self.assertEqual((survivor.latitude, survivor.longitude, survivor.population_affected), (25.0, 68.0, 300))
+        alias = AlertAlias.objects.get()
+        self.assertEqual((alias.title, alias.location, alias.alert_id),
+                         ('Red alert: Flood in Sindh, Pakistan', 'Pakistan', self.first.pk))
+
+
+class EnrichmentTests(TestCase):
+    def setUp(self):
+        self.found = disaster_alerts.objects.create(title='Flood in Lahore', location='Lat 31.52, Lon 74.35')
+        self.nothing = disaster_alerts.objects.create(title='Quiet day', location='Nowhere', disaster_type='FL')
+        PendingIndexChange.objects.all().delete()
+
+    def enrich(self, **options):
+        return [result for found in enrich_alerts(**options) for result in found]
+
+    def pending(self):
+        return set(pending_alerts().values_list('pk', flat=True))
+
+    def test_run_writes_what_it_finds_and_stamps_every_alert(self):
+        updated_at = self.nothing.updated_at
+        found = self.enrich()
+
+        self.assertEqual([(pk, values) for pk, _, values in found],
+                         [(self.found.pk, {'latitude': 31.52, 'longitude': 74.35, 'disaster_type': 'FL'})])
+        self.found.refresh_from_db()
+        self.nothing.refresh_from_db()
+        self.assertEqual((self.found.latitude, self.found.disaster_type), (31.52, 'FL'))
+        self.assertEqual(self.found.enriched_at, self.found.updated_at)
+        self.assertEqual(PendingIndexChange.objects.get().changed_fields, {'latitude', 'longitude', 'disaster_type'})
+        self.assertEqual(self.nothing.extraction_version, EXTRACTION_VERSION)
+        self.assertEqual(self.nothing.enriched_at, watermark().enriched_until)
+        # Stamping is not a change of the alert
+        self.assertEqual(self.nothing.updated_at, updated_at)
+
+    def test_next_run_reads_only_changed_or_outdated_alerts(self):
+        self.assertEqual(self.pending(), {self.found.pk, self.nothing.pk})
+        self.enrich()
+        self.assertEqual(self.pending(), set())
+
+        self.nothing.description = 'Edited'
+        self.nothing.save()
+        self.assertEqual(self.pending(), {self.nothing.pk})
+
+        disaster_alerts.objects.filter(pk=self.found.pk).update(extraction_version=EXTRACTION_VERSION - 1)
+        self.assertEqual([pk for pk, _, _ in self.enrich()], [])
+        self.assertEqual(self.pending(), set())
+
+    def test_partial_run_does_not_stamp_or_move_the_watermark(self):
+        self.enrich(fields=frozenset({COORDINATES}))
+
+        self.assertIsNone(watermark())
+        self.assertEqual(self.pending(), {self.found.pk, self.nothing.pk})
+        self.found.refresh_from_db()
+        self.assertEqual((self.found.latitude, self.found.disaster_type), (31.52, 'Unknown'))
+
+    def test_single_field_run_reads_every_alert_missing_the_field(self):
+        self.enrich()
+        disaster_alerts.objects.filter(pk=self.found.pk).update(latitude=None, longitude=None)
+        self.assertEqual(self.pending(), set())
+
+        out = io.StringIO()
+        call_command('fix_missing_data', '--coords-only', stdout=out)
+
+        self.assertIn('Fixing coordinates for 2 records', out.getvalue())
+        self.assertEqual(disaster_alerts.objects.get(pk=self.found.pk).latitude, 31.52)
+
+    def test_command_runs_in_process_by_default(self):
+        with mock.patch('disasters.enrichment.ProcessPoolExecutor', side_effect=AssertionError('pool started')):
+            call_command('enhance_disaster_data', stdout=io.StringIO())
+
+        self.assertEqual(self.pending(), set())
@@ -0,0 +1,9 @@
+from django.urls import path
+from .views import DisasterAlertChangesView, DisasterAlertDetailView, DisasterAlertListView, DisasterAlertStreamView
+
+urlpatterns = [
+    path('disasters/', DisasterAlertListView.as_view(), name='disaster_alert_list'),
+    path('disasters/changes/', DisasterAlertChangesView.as_view(), name='disaster_alert_changes'),
+    path('disasters/stream/', DisasterAlertStreamView.as_view(), name='disaster_alert_stream'),
+    path('disasters/<int:pk>/', DisasterAlertDetailView.as_view(), name='disaster_alert_detail'),
+]
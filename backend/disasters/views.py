@@ -1,3 +1,69 @@
-from django.shortcuts import render
+from backend.api import RecordChangesView, RecordDetailView, RecordListView, negated, parse_bool, parse_time
+from backend.push import RecordStreamView
 
-# Create your views here.
+from .dedup import distance_km
+from .models import disaster_alerts
+from .records import disaster_serializer
+
+
+class DisasterAlertListView(RecordListView):
+    model = disaster_alerts
+    serializer = disaster_serializer
+    orderings = ('-created_at', 'updated_at', 'id')
+    filters = {
+        # Changed since a client's last fetch, with ordering=updated_at
+        'updated_since': ('updated_at__gt', parse_time),
+        'created_since': ('created_at__gte', parse_time),
+        'created_until': ('created_at__lt', parse_time),
+        'type': ('disaster_type', str),
+        'has_coordinates': ('latitude__isnull', negated(parse_bool)),
+        'has_time': ('disaster_time__isnull', negated(parse_bool)),
+    }
+
+
+class DisasterAlertDetailView(RecordDetailView):
+    model = disaster_alerts
+    serializer = disaster_serializer
+
+
+class DisasterAlertChangesView(RecordChangesView):
+    model = disaster_alerts
+    serializer = disaster_serializer
+
+
+def parse_floats(value, count):
+    try:
+        floats = [float(part) for part in value.split(',')]
+    except ValueError:
+        floats = []
+    if len(floats) != count:
+        raise ValueError(f'{value!r} is not {count} comma separated numbers')
+    return floats
+
+
+class DisasterAlertStreamView(RecordStreamView):
+    """
+    New and updated alerts as they are ingested. Optional subscriptions:
+    `type=FL,EQ`, `bbox=min_lon,min_lat,max_lon,max_lat`, or
+    `near=lat,lon` with `radius_km` (default 100). Deletes go to everyone.
+    """
+    model = disaster_alerts
+    serializer = disaster_serializer
+
+    def subscription(self, params):
+        tests = []
+        if params.get('type'):
+            types = set(params['type'].split(','))
+            tests.append(lambda alert: alert['disaster_type'] in types)
+        if params.get('bbox'):
+            min_lon, min_lat, max_lon, max_lat = parse_floats(params['bbox'], 4)
+            tests.append(lambda alert: alert['latitude'] is not None and alert['longitude'] is not None
+                         and min_lat <= alert['latitude'] <= max_lat and min_lon <= alert['longitude'] <= max_lon)
+        if params.get('near'):
+            lat, lon = parse_floats(params['near'], 2)
+            radius = parse_floats(params.get('radius_km', '100'), 1)[0]
+            tests.append(lambda alert: alert['latitude'] is not None and alert['longitude'] is not None
+                         and distance_km(lat, lon, alert['latitude'], alert['longitude']) <= radius)
+        if not tests:
+            return None
+        return lambda change: 'record' not in change or all(test(change['record']) for test in tests)
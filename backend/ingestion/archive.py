@@ -0,0 +1,162 @@
+"""
+Archive of the raw responses downloaded by the fetch commands, for replaying
+a run offline (`--replay`) to reproduce a bug, benchmark the pipeline or
+rebuild the database without network access.
+
+Bodies are stored gzip-compressed under the SHA-256 of their content
+(`objects/ab/abcd....gz`), so a payload that did not change between runs is
+stored once. Each run of a command writes an index, `runs/<run>.jsonl`, with
+one line per response: source, URL, status, hash, size and fetch time. Run
+names start with their start time, so they sort in chronological order.
+"""
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+
+class PayloadArchive:
+    def __init__(self, directory, keep_days=None):
+        self.directory = Path(directory)
+        self.objects = self.directory / 'objects'
+        self.runs = self.directory / 'runs'
+        self.keep_days = keep_days
+
+    # Payloads
+
+    def object_path(self, digest):
+        return self.objects / digest[:2] / f'{digest}.gz'
+
+    def has(self, digest):
+        return self.object_path(digest).exists()
+
+    def iter_payload(self, digest, chunk_size=64 * 1024):
+        with gzip.open(self.object_path(digest), 'rb') as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+
+    def writer(self):
+        return PayloadWriter(self)
+
+    # Runs
+
+    def start_run(self, name):
+        """Open the index of a new run of command `name`; older runs past `keep_days` are pruned first."""
+        self.runs.mkdir(parents=True, exist_ok=True)
+        if self.keep_days:
+            self.prune(time.time() - self.keep_days * 24 * 60 * 60)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        for attempt in range(1, 100):
+            run = f'{stamp}-{name}' if attempt == 1 else f'{stamp}-{name}-{attempt}'
+            try:
+                return ArchiveRun(self, run, open(self.runs / f'{run}.jsonl', 'x', encoding='utf-8'))
+            except FileExistsError:
+                continue
+        raise FileExistsError(f'Could not name a new archive run for {name} in {self.runs}')
+
+    def run_names(self):
+        """Archived runs, oldest first."""
+        if not self.runs.exists():
+            return []
+        return sorted(path.stem for path in self.runs.glob('*.jsonl'))
+
+    def entries(self, run):
+        with open(self.runs / f'{run}.jsonl', encoding='utf-8') as index:
+            for line in index:
+                if line.strip():
+                    yield json.loads(line)
+
+    def latest_entries(self, until=None):
+        """
+        The last archived response per URL over the runs up to `until` (all
+        runs if None): the content each source had at the end of that run,
+        including sources that run found unchanged and did not download.
+        """
+        runs = self.run_names()
+        if until is not None:
+            if until not in runs:
+                raise KeyError(until)
+            runs = runs[:runs.index(until) + 1]
+        latest = {}
+        for run in runs:
+            for entry in self.entries(run):
+                latest[entry['url']] = entry
+        return latest
+
+    def prune(self, before):
+        """Delete the runs started before the `before` timestamp, and the payloads no remaining run refers to."""
+        for path in self.runs.glob('*.jsonl'):
+            if path.stat().st_mtime < before:
+                path.unlink()
+        referenced = {entry['sha256'] for run in self.run_names() for entry in self.entries(run)}
+        for path in self.objects.glob('*/*.gz'):
+            if path.name[:-len('.gz')] not in referenced:
+                path.unlink()
+
+
+class ArchiveRun:
+    """Index of one run; `record()` is safe to call from the fetch worker threads."""
+
+    def __init__(self, archive, name, index):
+        self.archive = archive
+        self.name = name
+        self.index = index
+        self.lock = threading.Lock()
+
+    def record(self, source, url, status, payload, complete=True):
+        entry = {
+            'source': source, 'url': url, 'status': status, 'sha256': payload.digest, 'size': payload.size,
+            'complete': complete, 'fetched_at': time.time(),
+        }
+        with self.lock:
+            self.index.write(json.dumps(entry) + '\n')
+            self.index.flush()
+
+    def close(self):
+        self.index.close()
+
+
+class PayloadWriter:
+    """
+    Hashes and compresses a body into a temporary file while it streams, and
+    moves it to its content address on `commit()`.
+    """
+
+    def __init__(self, archive):
+        self.archive = archive
+        archive.objects.mkdir(parents=True, exist_ok=True)
+        fd, self.tmp = tempfile.mkstemp(dir=archive.objects, suffix='.tmp')
+        self.raw = os.fdopen(fd, 'wb')
+        self.file = gzip.GzipFile(fileobj=self.raw, mode='wb', compresslevel=6, mtime=0)
+        self.hash = hashlib.sha256()
+        self.size = 0
+        self.digest = None
+
+    def write(self, chunk):
+        self.hash.update(chunk)
+        self.size += len(chunk)
+        self.file.write(chunk)
+
+    def close(self):
+        self.file.close()
+        self.raw.close()
+
+    def commit(self):
+        self.close()
+        self.digest = self.hash.hexdigest()
+        path = self.archive.object_path(self.digest)
+        if path.exists():
+            os.unlink(self.tmp)
+        else:
+            path.parent.mkdir(exist_ok=True)
+            os.replace(self.tmp, path)
+        return self
+
+    def discard(self):
+        self.close()
+        os.unlink(self.tmp)
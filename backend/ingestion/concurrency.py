@@ -0,0 +1,114 @@
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline:
+    """A point in time after which work should be abandoned; `seconds=None` never expires."""
+
+    def __init__(self, seconds=None):
+        self.expires = None if seconds is None else time.monotonic() + seconds
+
+    @classmethod
+    def earliest(cls, *deadlines):
+        deadline = cls()
+        expiring = [d.expires for d in deadlines if d.expires is not None]
+        deadline.expires = min(expiring) if expiring else None
+        return deadline
+
+    def remaining(self):
+        if self.expires is None:
+            return None
+        return max(self.expires - time.monotonic(), 0.0)
+
+    def expired(self):
+        return self.expires is not None and time.monotonic() >= self.expires
+
+    def check(self, what=''):
+        if self.expired():
+            raise DeadlineExceeded(what)
+
+
+class HostLimiter:
+    """Caps the number of requests in flight to each host."""
+
+    def __init__(self, per_host=2):
+        self.per_host = per_host
+        self._lock = threading.Lock()
+        self._slots = {}
+
+    def slot(self, url):
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            if host not in self._slots:
+                self._slots[host] = threading.BoundedSemaphore(self.per_host)
+            return self._slots[host]
+
+
+def run_concurrently(jobs, fetch, workers=8, per_host=2, timeout=None, total_timeout=None):
+    """
+    Run `fetch(url, deadline)` for every `name -> url` in `jobs` on a thread pool.
+
+    Yields `(name, result, error)` as each source finishes, so callers can
+    process results while slower sources are still downloading. At most
+    `per_host` requests hit the same host at once; each source gets `timeout`
+    seconds from the moment it starts, and sources still running when
+    `total_timeout` passes are reported with `DeadlineExceeded`.
+    """
+    total = Deadline(total_timeout)
+    limiter = HostLimiter(per_host)
+
+    def run(url):
+        slot = limiter.slot(url)
+        if not slot.acquire(timeout=total.remaining()):
+            raise DeadlineExceeded(url)
+        try:
+            deadline = Deadline.earliest(Deadline(timeout), total)
+            deadline.check(url)
+            return fetch(url, deadline)
+        finally:
+            slot.release()
+
+    executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='ingest')
+    try:
+        pending = {executor.submit(run, url): name for name, url in jobs.items()}
+        while pending:
+            done, _ = wait(pending, timeout=total.remaining(), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                name = pending.pop(future)
+                error = future.exception()
+                yield name, None if error else future.result(), error
+        for future, name in pending.items():
+            future.cancel()
+            yield name, None, DeadlineExceeded(jobs[name])
+    finally:
+        # Workers still downloading stop on their own deadline; don't wait for them here
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+class Counters:
+    """A Counter that worker threads can increment safely."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+
+    def incr(self, key, n=1):
+        with self._lock:
+            self._counts[key] += n
+
+    def __getitem__(self, key):
+        with self._lock:
+            return self._counts[key]
+
+    def items(self):
+        with self._lock:
+            return sorted(self._counts.items())
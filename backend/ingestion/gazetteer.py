@@ -0,0 +1,177 @@
+"""
+Offline geocoding of the places named in free text, such as alert titles or
+shelter addresses, from the place-name file bundled with this package
+(`places.tsv`, or `INGESTION['GAZETTEER_FILE']`).
+
+Names are normalized (case, accents, punctuation) and stored in a trie of
+words, so a text is resolved in one left-to-right pass over its words,
+matching the longest name at each position ("Dera Ghazi Khan" before
+"Khan", "Papua New Guinea" before "Guinea"). The most specific place found
+wins (a city over its province or country), then the first mentioned. No
+network request is made, and repeated texts are answered from an LRU cache.
+
+Some names are also common words ("turkey farms hit", "Jordan river
+flooding"). A text names such a place only when it says so some other way:
+the name is capitalized inside a text that is not all capitals or title
+case, it heads the text as in ReliefWeb's "Chad: Floods", or the text names
+another place in the same country.
+"""
+import csv
+import re
+import unicodedata
+from functools import lru_cache
+from pathlib import Path
+from typing import NamedTuple
+
+from .http import ingestion_setting
+
+PLACES_FILE = Path(__file__).with_name('places.tsv')
+
+# Least to most specific
+KINDS = ('country', 'province', 'district', 'city')
+
+# Apostrophes are dropped ("Cote d'Ivoire"), other punctuation separates words
+_APOSTROPHES = re.compile(r"['’`]")
+_WORD = re.compile(r'[A-Za-z0-9]+')
+_COLON = re.compile(r'\s*:')
+# Marks the places whose name ends at a trie node
+_PLACES = ''
+# Marks the places for which that name is also a common word
+_COMMON = ':'
+
+
+class Place(NamedTuple):
+    name: str
+    kind: str
+    country: str
+    latitude: float
+    longitude: float
+
+
+class Word(NamedTuple):
+    text: str
+    capitalized: bool
+    # Followed by a colon
+    heading: bool
+
+
+def words(text):
+    """`Word`s of a text: lowercased, accents and punctuation removed, with what their writing tells."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = _APOSTROPHES.sub('', ''.join(char for char in text if not unicodedata.combining(char)))
+    return [Word(match.group().lower(), match.group()[0].isupper(), bool(_COLON.match(text, match.end())))
+            for match in _WORD.finditer(text)]
+
+
+def normalize(text):
+    """Words of a place name or text: lowercased, accents and punctuation removed."""
+    return [word.text for word in words(text)]
+
+
+class Gazetteer:
+    def __init__(self, places):
+        """`places` is an iterable of (`Place`, names, the names that are also common words) tuples."""
+        self.trie = {}
+        self.size = 0
+        for place, names, *common in places:
+            self.size += 1
+            common = {tuple(normalize(name)) for name in (common[0] if common else ())}
+            for name in names:
+                name = tuple(normalize(name))
+                if not name:
+                    continue
+                node = self.trie
+                for word in name:
+                    node = node.setdefault(word, {})
+                node.setdefault(_PLACES, []).append(place)
+                if name in common:
+                    node.setdefault(_COMMON, []).append(place)
+
+    @classmethod
+    def load(cls, path=PLACES_FILE):
+        """Read a tab-separated place file (see the header of `places.tsv`)."""
+        def places(lines):
+            for row in csv.reader(lines, delimiter='\t'):
+                if not row or row[0].startswith('#'):
+                    continue
+                name, kind, country, latitude, longitude, *others = row
+                if kind not in KINDS:
+                    raise ValueError(f'Unknown kind of place {kind!r} for {name!r} in {path}')
+                other_names, common = [
+                    [value.strip() for value in column.split(',') if value.strip()]
+                    for column in (others + ['', ''])[:2]
+                ]
+                yield Place(name, kind, country, float(latitude), float(longitude)), [name, *other_names], common
+
+        with open(path, encoding='utf-8', newline='') as lines:
+            return cls(places(lines))
+
+    def lookup(self, name):
+        """Places called exactly `name` (after normalization), in file order."""
+        node = self.trie
+        for word in normalize(name):
+            node = node.get(word)
+            if node is None:
+                return []
+        return list(node.get(_PLACES, []))
+
+    def find(self, text):
+        """
+        Every name found in the text, longest match at each word, as lists of
+        the places it may be; a common word counts only for the places the text
+        gives a sign of, see the module docstring.
+        """
+        text_words = words(text)
+        # Capitals tell nothing in a text without lowercase words, or at its start
+        cased = any(not word.capitalized and not word.text.isdigit() for word in text_words)
+        found = []
+        i = 0
+        while i < len(text_words):
+            node, match, end = self.trie, None, i
+            for j in range(i, len(text_words)):
+                node = node.get(text_words[j].text)
+                if node is None:
+                    break
+                if _PLACES in node:
+                    match, end = node, j + 1
+            if match:
+                first = text_words[i]
+                named = (cased and first.capitalized and i > 0) or text_words[end - 1].heading
+                found.append((match[_PLACES], [] if named else match.get(_COMMON, [])))
+                i = end
+            else:
+                i += 1
+
+        # Countries of the places named without doubt
+        countries = {place.country for places, common in found for place in places if place not in common}
+        return [places for places in (
+            [place for place in places if place not in common or place.country in countries]
+            for places, common in found
+        ) if places]
+
+    def locate(self, text):
+        """The most specific place named in the text, or None."""
+        found = self.find(text)
+        if not found:
+            return None
+        countries = {place.country for places in found for place in places if place.kind == 'country'}
+        best = None
+        for places in found:
+            # An ambiguous name is the place in a country the text mentions, or the first listed
+            place = next((place for place in places if place.country in countries), places[0])
+            if best is None or KINDS.index(place.kind) > KINDS.index(best.kind):
+                best = place
+        return best
+
+
+@lru_cache(maxsize=None)
+def default_gazetteer():
+    return Gazetteer.load(ingestion_setting('GAZETTEER_FILE', PLACES_FILE))
+
+
+@lru_cache(maxsize=10000)
+def geocode(text):
+    """The most specific `Place` named in the text by the bundled gazetteer, or None."""
+    if not text:
+        return None
+    return default_gazetteer().locate(text)
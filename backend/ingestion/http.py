@@ -0,0 +1,387 @@
+import gzip
+import hashlib
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterable, NamedTuple
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from ingestion.archive import PayloadArchive
+from ingestion.concurrency import DeadlineExceeded
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Relief-Shelter-App/1.0',
+}
+
+# Upper bound for a single connect/read wait, so a stalled socket notices the deadline
+SOCKET_TIMEOUT = 10
+
+# Responses worth asking again for
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class HTTPStatusError(Exception):
+    def __init__(self, url, status):
+        super().__init__(f'HTTP {status} for {url}')
+        self.url = url
+        self.status = status
+
+
+class Response(NamedTuple):
+    status: int
+    body: bytes
+    # The upstream content is the same as on the previous fetch (a 304, or a cache entry within its TTL)
+    not_modified: bool = False
+
+
+def is_transient(error):
+    """Whether a failed request may succeed if it is simply tried again."""
+    if isinstance(error, HTTPStatusError):
+        return error.status in RETRY_STATUSES
+    return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+
+def ingestion_setting(name, default):
+    return getattr(settings, 'INGESTION', {}).get(name, default)
+
+
+class ResponseCache:
+    """
+    Gzip-compressed copies of successful responses on disk, one file per URL.
+
+    Each file holds a JSON header line (validators and fetch time) followed by
+    the body, and its modification time is when the entry was last fetched or
+    revalidated. Entries checked less than `ttl` seconds ago are served without
+    a request; older ones are revalidated with If-None-Match /
+    If-Modified-Since.
+    """
+
+    def __init__(self, directory, ttl):
+        self.directory = Path(directory)
+        self.ttl = ttl
+
+    def path(self, url):
+        return self.directory / f'{hashlib.sha1(url.encode()).hexdigest()}.gz'
+
+    def meta(self, url):
+        """The header of the entry of `url` plus its `checked_at` time, None if there is no entry."""
+        path = self.path(url)
+        try:
+            with gzip.open(path, 'rb') as f:
+                meta = json.loads(f.readline())
+            meta['checked_at'] = path.stat().st_mtime
+            return meta
+        except (OSError, EOFError, ValueError):
+            return None
+
+    def body(self, url):
+        return b''.join(self.iter_body(url))
+
+    def iter_body(self, url, chunk_size=64 * 1024):
+        with gzip.open(self.path(url), 'rb') as f:
+            f.readline()
+            while chunk := f.read(chunk_size):
+                yield chunk
+
+    def is_fresh(self, meta):
+        return time.time() - meta['checked_at'] < self.ttl
+
+    def writer(self, url, etag=None, last_modified=None):
+        return CacheEntryWriter(self, url, etag, last_modified)
+
+    def store(self, url, body, etag=None, last_modified=None):
+        writer = self.writer(url, etag, last_modified)
+        writer.write(body)
+        writer.commit()
+
+    def touch(self, url):
+        """Restart the TTL of an entry that was revalidated with a 304, without rewriting its body."""
+        try:
+            os.utime(self.path(url))
+        except FileNotFoundError:
+            # Removed meanwhile; the next fetch downloads it again
+            pass
+
+
+class CacheEntryWriter:
+    """
+    Compresses a response into a temporary file while it streams, and moves it
+    into place on `commit()` so readers never see a partial entry. A stream
+    the caller stopped reading early is discarded, not committed.
+    """
+
+    def __init__(self, cache, url, etag, last_modified):
+        self.cache = cache
+        self.url = url
+        cache.directory.mkdir(parents=True, exist_ok=True)
+        fd, self.tmp = tempfile.mkstemp(dir=cache.directory, suffix='.tmp')
+        self.raw = os.fdopen(fd, 'wb')
+        self.file = gzip.GzipFile(fileobj=self.raw, mode='wb', compresslevel=6)
+        meta = {'url': url, 'etag': etag, 'last_modified': last_modified, 'fetched_at': time.time()}
+        self.file.write(json.dumps(meta).encode() + b'\n')
+
+    def write(self, chunk):
+        self.file.write(chunk)
+
+    def close(self):
+        self.file.close()
+        self.raw.close()
+
+    def commit(self):
+        self.close()
+        os.replace(self.tmp, self.cache.path(self.url))
+
+    def discard(self):
+        self.close()
+        os.unlink(self.tmp)
+
+
+class StreamedResponse(NamedTuple):
+    status: int
+    # Iterable of body chunks, read from the network (or the cache) as it is consumed
+    chunks: Iterable[bytes]
+    not_modified: bool = False
+
+
+class HTTPClient:
+    """
+    HTTP client shared by the ingestion commands.
+
+    One `requests.Session` keeps a pool of connections per host, so repeated
+    requests to the same portal reuse TCP/TLS connections. GET responses can go
+    through a `ResponseCache`: a fresh entry or a `304 Not Modified` comes back
+    with `not_modified=True`, which callers use to skip parsing altogether.
+    While an `archiving()` run is open, downloaded bodies are also kept in its
+    `PayloadArchive`.
+    """
+
+    def __init__(self, cache=None, pool_size=10):
+        self.cache = cache
+        # The `ArchiveRun` recording the responses downloaded, if any
+        self.run = None
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update(DEFAULT_HEADERS)
+
+    def get(self, url, deadline, headers=None, use_cache=True, source=None):
+        """GET `url` and return a `Response` with the whole body, see `stream()`."""
+        with self.stream(url, deadline, headers=headers, use_cache=use_cache, source=source) as resp:
+            return Response(resp.status, b''.join(resp.chunks), resp.not_modified)
+
+    @contextmanager
+    def stream(self, url, deadline, headers=None, use_cache=True, chunk_size=64 * 1024, source=None):
+        """
+        GET `url` and yield a `StreamedResponse` whose chunks are read lazily.
+
+        The download is abandoned with `DeadlineExceeded` once `deadline`
+        passes, so a portal that trickles bytes cannot hold a worker longer
+        than its budget. Chunks are written to the response cache, and to the
+        archive under `source` (the host by default), as they are consumed.
+        Only a body read to the end is cached.
+        """
+        cache = self.cache if use_cache else None
+        meta = cache.meta(url) if cache else None
+        if meta and cache.is_fresh(meta):
+            yield StreamedResponse(200, cache.iter_body(url), not_modified=True)
+            return
+
+        headers = dict(headers or {})
+        if meta and meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta and meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+        remaining = deadline.remaining()
+        socket_timeout = SOCKET_TIMEOUT if remaining is None else max(min(remaining, SOCKET_TIMEOUT), 0.1)
+        with self.session.get(url, headers=headers, timeout=socket_timeout, stream=True) as resp:
+            if resp.status_code == 304 and meta:
+                cache.touch(url)
+                yield StreamedResponse(304, cache.iter_body(url), not_modified=True)
+                return
+
+            writers = []
+            entry = None
+            if cache and resp.status_code == 200:
+                entry = cache.writer(url, resp.headers.get('ETag'), resp.headers.get('Last-Modified'))
+                writers.append(entry)
+            run = self.run
+            payload = run.archive.writer() if run is not None else None
+            if payload is not None:
+                writers.append(payload)
+            finished = []
+
+            def chunks():
+                # read1() returns whatever has arrived instead of waiting for a full chunk
+                while chunk := resp.raw.read1(chunk_size, decode_content=True):
+                    if deadline.expired():
+                        raise DeadlineExceeded(url)
+                    for writer in writers:
+                        writer.write(chunk)
+                    yield chunk
+                finished.append(True)
+
+            try:
+                yield StreamedResponse(resp.status_code, chunks())
+            except BaseException:
+                for writer in writers:
+                    writer.discard()
+                raise
+            if entry is not None and not finished:
+                # A truncated body must not be served later under the validators of the whole resource
+                entry.discard()
+                writers.remove(entry)
+            for writer in writers:
+                writer.commit()
+            if payload is not None:
+                # A body the caller stopped reading early is archived as far as it was read
+                run.record(source or urlsplit(url).hostname, url, resp.status_code, payload, complete=bool(finished))
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The process-wide ingestion client, configured from `settings.INGESTION`."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            cache_dir = ingestion_setting('HTTP_CACHE_DIR', None)
+            cache = ResponseCache(cache_dir, ingestion_setting('HTTP_CACHE_TTL', 300)) if cache_dir else None
+            _client = HTTPClient(cache, pool_size=ingestion_setting('HTTP_POOL_SIZE', 10))
+        return _client
+
+
+def get(url, deadline, headers=None, use_cache=True, source=None):
+    """GET `url` through the shared client, see `HTTPClient.get`."""
+    return get_client().get(url, deadline, headers=headers, use_cache=use_cache, source=source)
+
+
+def stream(url, deadline, headers=None, use_cache=True, source=None):
+    """Stream `url` through the shared client, see `HTTPClient.stream`."""
+    return get_client().stream(url, deadline, headers=headers, use_cache=use_cache, source=source)
+
+
+def get_archive():
+    """The payload archive configured in `settings.INGESTION`, or None when archiving is off."""
+    directory = ingestion_setting('ARCHIVE_DIR', None)
+    return PayloadArchive(directory, ingestion_setting('ARCHIVE_KEEP_DAYS', None)) if directory else None
+
+
+@contextmanager
+def archiving(name):
+    """Archive the bodies the shared client downloads meanwhile as a run of command `name`; yields the run or None."""
+    archive = get_archive()
+    if archive is None:
+        yield None
+        return
+    client = get_client()
+    run = client.run = archive.start_run(name)
+    try:
+        yield run
+    finally:
+        client.run = None
+        run.close()
+
+
+class ReplayClient:
+    """
+    Stands in for `HTTPClient`, serving archived bodies instead of the network:
+    for each URL, the last one archived up to run `until` (the latest if None).
+    A URL never archived gets an empty 404.
+    """
+
+    def __init__(self, archive, until=None):
+        self.archive = archive
+        self.entries = archive.latest_entries(until)
+        self.run = None
+        # When the replayed run downloaded its last response, standing in for "now"
+        fetched_at = max((entry['fetched_at'] for entry in self.entries.values()), default=None)
+        self.fetched_at = datetime.fromtimestamp(fetched_at, timezone.utc) if fetched_at else None
+
+    def get(self, url, deadline, headers=None, use_cache=True, source=None):
+        with self.stream(url, deadline) as resp:
+            return Response(resp.status, b''.join(resp.chunks), resp.not_modified)
+
+    @contextmanager
+    def stream(self, url, deadline, headers=None, use_cache=True, chunk_size=64 * 1024, source=None):
+        entry = self.entries.get(url)
+        if entry is None or not self.archive.has(entry['sha256']):
+            yield StreamedResponse(404, iter(()))
+            return
+        yield StreamedResponse(entry['status'], self.archive.iter_payload(entry['sha256'], chunk_size))
+
+
+def replay_client(until=None):
+    """A `ReplayClient` of the configured archive; raises `LookupError` without archived runs or for an unknown run."""
+    archive = get_archive()
+    runs = archive.run_names() if archive is not None else []
+    if not runs:
+        raise LookupError('No archived runs to replay (is INGESTION["ARCHIVE_DIR"] set?)')
+    if until is not None and until not in runs:
+        raise LookupError(f"No archived run {until!r}; archived runs: {', '.join(runs[-10:])}")
+    return ReplayClient(archive, until)
+
+
+@contextmanager
+def replaying(replay):
+    """Serve the shared client's requests from `replay`, a `ReplayClient`, meanwhile."""
+    global _client
+    with _client_lock:
+        previous, _client = _client, replay
+    try:
+        yield replay
+    finally:
+        with _client_lock:
+            _client = previous
+
+
+def fetch_session(name, replay=None, archive=True):
+    """
+    Context for one run of fetch command `name`: with `replay`, the archived
+    run to read instead of the network ('latest' for the last one), see
+    `replay_client()`; otherwise the downloads are archived unless `archive`
+    is False. Yields the `ReplayClient` when replaying, else None.
+    """
+    if replay:
+        return replaying(replay_client(None if replay == 'latest' else replay))
+    if archive:
+        return archiving(name)
+    return nullcontext()
+
+
+def with_retries(fetch, attempts=3, backoff=0.5, on_retry=None):
+    """
+    Wrap `fetch(url, deadline)` so transient failures are retried.
+
+    Waits grow exponentially from `backoff` seconds with full jitter and never
+    sleep past the deadline; `on_retry(url, error)` is called before each retry.
+    """
+    def fetch_with_retries(url, deadline):
+        for attempt in range(attempts):
+            try:
+                return fetch(url, deadline)
+            except Exception as error:
+                if attempt == attempts - 1 or not is_transient(error):
+                    raise
+                delay = random.uniform(0, backoff * 2 ** attempt)
+                remaining = deadline.remaining()
+                if remaining is not None and delay >= remaining:
+                    raise
+                if on_retry is not None:
+                    on_retry(url, error)
+                time.sleep(delay)
+    return fetch_with_retries
+
@@ -0,0 +1,199 @@
+"""
+Incremental reading of large JSON documents from a stream of byte chunks.
+
+Only the parts of the document that are asked for are decoded: the elements
+of the arrays at `arrays` paths one at a time, and the values at `values`
+paths whole. Everything else is skipped by scanning for brackets and string
+delimiters, without building Python objects. Memory use is bounded by the
+largest single element rather than by the document.
+
+A path is a tuple of object keys from the root, `()` being the document
+itself; `('result', 'records')` is the array in `{"result": {"records": [...]}}`.
+"""
+import codecs
+import json
+import re
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+# Characters that matter when skipping a value
+_STRUCTURE = re.compile(r'["\[\]{}]')
+# The rest of a string after its opening quote, up to and including the closing one
+_STRING_REST = re.compile(r'(?:[^"\\]|\\.)*"', re.DOTALL)
+
+_NUMBER_CHARS = frozenset('0123456789.eE+-')
+
+_decoder = json.JSONDecoder()
+
+
+def iter_values(chunks, arrays=(), values=()):
+    """
+    Yield `(path, value)` for each element of the arrays found at one of the
+    `arrays` paths, and for each value found at one of the `values` paths.
+
+    A path in `arrays` holding something other than an array is descended
+    into as usual, so `arrays=[(), ('features',)]` reads both a top-level
+    list and a FeatureCollection. Raises `json.JSONDecodeError` on malformed
+    or truncated input, like `json.loads`.
+    """
+    return _Reader(chunks, arrays, values).read()
+
+
+class _Reader:
+    def __init__(self, chunks, arrays, values):
+        self.chunks = iter(chunks)
+        self.arrays = set(map(tuple, arrays))
+        self.values = set(map(tuple, values))
+        # Paths with something wanted below them
+        self.prefixes = {path[:i] for path in self.arrays | self.values for i in range(len(path))}
+        self.decode_text = codecs.getincrementaldecoder('utf-8')().decode
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def read(self):
+        yield from self.value(())
+
+    # Buffer
+
+    def more(self):
+        """Append the next chunk to the buffer, dropping what was consumed; False at the end of the stream."""
+        if self.eof:
+            return False
+        for chunk in self.chunks:
+            text = self.decode_text(chunk)
+            if text:
+                self.buf = self.buf[self.pos:] + text
+                self.pos = 0
+                return True
+        self.eof = True
+        self.buf = self.buf[self.pos:]
+        self.pos = 0
+        try:
+            self.buf += self.decode_text(b'', final=True)
+        except UnicodeDecodeError:
+            # The stream stopped inside a character
+            self.pos = len(self.buf)
+            raise self.error('Unexpected end of document')
+        return False
+
+    def error(self, message):
+        return json.JSONDecodeError(message, self.buf, self.pos)
+
+    def peek(self):
+        """Next significant character, skipping whitespace; '' at the end of the document."""
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.more():
+                return ''
+
+    def expect(self, chars):
+        char = self.peek()
+        if not char or char not in chars:
+            raise self.error(f"Expecting one of {chars!r}" if char else 'Unexpected end of document')
+        self.pos += 1
+        return char
+
+    def decode(self):
+        """Decode the complete value at the current position."""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+                # A number cut by the end of the buffer ("3" or "3." of "3.25") continues in the next chunk
+                cut = (
+                    isinstance(value, (int, float)) and not isinstance(value, bool)
+                    and (end == len(self.buf) or self.buf[end] in _NUMBER_CHARS)
+                )
+                if not cut or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # Buffer at least twice as much before retrying, so a long value is decoded a few times at most
+            wanted = 2 * max(len(self.buf) - self.pos, 1)
+            while len(self.buf) - self.pos < wanted and self.more():
+                pass
+
+    def key(self):
+        self.expect('"')
+        while True:
+            try:
+                key, self.pos = json.decoder.scanstring(self.buf, self.pos)
+                return key
+            except json.JSONDecodeError:
+                if not self.more():
+                    raise
+
+    def skip(self):
+        """Move past the value at the current position without decoding it."""
+        char = self.peek()
+        if char not in '[{"':
+            # true, false, null or a number: short enough to decode
+            self.decode()
+            return
+        depth = 0
+        while True:
+            match = _STRUCTURE.search(self.buf, self.pos)
+            if match is None:
+                self.pos = len(self.buf)
+                if not self.more():
+                    raise self.error('Unexpected end of document')
+                continue
+            self.pos = match.end()
+            char = match.group()
+            if char == '"':
+                start = self.pos
+                while (end := _STRING_REST.match(self.buf, self.pos)) is None:
+                    # Unterminated in this buffer: read on and rescan the string from its start
+                    self.pos = start
+                    if not self.more():
+                        raise self.error('Unterminated string')
+                    start = self.pos
+                self.pos = end.end()
+                if depth == 0:
+                    return
+            elif char in '[{':
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return
+
+    # Structure
+
+    def value(self, path):
+        char = self.peek()
+        if path in self.values:
+            yield path, self.decode()
+        elif char == '[' and path in self.arrays:
+            for element in self.elements():
+                yield path, element
+        elif char == '{' and path in self.prefixes:
+            yield from self.members(path)
+        else:
+            self.skip()
+
+    def elements(self):
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.decode()
+            if self.expect(',]') == ']':
+                return
+
+    def members(self, path):
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.key()
+            self.expect(':')
+            yield from self.value(path + (key,))
+            if self.expect(',}') == '}':
+                return
@@ -0,0 +1,253 @@
+import queue
+import threading
+import time
+
+# Marks the end of a queue's items, one per consuming worker
+_DONE = object()
+
+# Seconds between checks for a failed pipeline while waiting on a queue
+_POLL = 0.1
+
+
+class _Stopped(Exception):
+    """Raised in a stage waiting on a queue once another stage has failed."""
+
+
+class Stage:
+    """
+    One step of a `Pipeline`.
+
+    `func(item)` returns an iterable of the items to hand to the next stage
+    (a generator, a list, or None for nothing). With `batch_size`, `func`
+    receives lists of up to that many items instead of single items.
+    """
+
+    def __init__(self, name, func, workers=1, batch_size=None):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.batch_size = batch_size
+
+
+class StageStats:
+    """Items through one stage, and the depth of the queue it reads from."""
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.received = 0
+        self.emitted = 0
+        # Time spent blocked on a full output queue, i.e. held back by the next stage
+        self.blocked = 0.0
+        self.started = None
+        self.finished = None
+        self.max_depth = 0
+        self._depth_total = 0
+        self._depth_samples = 0
+        self._lock = threading.Lock()
+
+    def record_depth(self, depth):
+        with self._lock:
+            self.max_depth = max(self.max_depth, depth)
+            self._depth_total += depth
+            self._depth_samples += 1
+
+    def add(self, received=0, emitted=0, blocked=0.0):
+        with self._lock:
+            self.received += received
+            self.emitted += emitted
+            self.blocked += blocked
+
+    def start(self):
+        with self._lock:
+            if self.started is None:
+                self.started = time.perf_counter()
+
+    def finish(self):
+        with self._lock:
+            self.finished = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        if self.started is None or self.finished is None:
+            return 0.0
+        return self.finished - self.started
+
+    @property
+    def throughput(self):
+        """Items handled per second while the stage ran; what it emits for the source."""
+        count = self.emitted if self.name == Pipeline.SOURCE else self.received
+        return count / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def mean_depth(self):
+        return self._depth_total / self._depth_samples if self._depth_samples else 0.0
+
+
+class Pipeline:
+    """
+    Items flow from `source` through `stages`, connected by bounded queues.
+
+    The source is iterated on its own thread and every stage but the last
+    runs on `workers` threads of its own, so downloads, parsing and
+    normalization overlap and the last stage (typically the database writes)
+    starts with the first items instead of after the last. The last stage
+    runs on the calling thread, which keeps database access on the thread
+    owning the connection. A full queue blocks the stage feeding it, so at
+    most `maxsize` items wait between two stages whatever the input size.
+
+    If a stage raises, the others stop at their next queue operation and
+    `run()` re-raises the error.
+    """
+    SOURCE = 'source'
+
+    def __init__(self, source, stages, maxsize=1000):
+        self.source = source
+        self.stages = list(stages)
+        self.queues = [queue.Queue(maxsize) for _ in self.stages]
+        self.stats = [StageStats(self.SOURCE, 1)] + [StageStats(stage.name, stage.workers) for stage in self.stages]
+        self._failed = threading.Event()
+        self._error = None
+        self._lock = threading.Lock()
+        self._remaining = [stage.workers for stage in self.stages]
+
+    def run(self):
+        """Run every stage to the end; returns the `StageStats` of the source and each stage."""
+        threads = [threading.Thread(target=self._run_source, name='pipeline-source', daemon=True)]
+        for index, stage in enumerate(self.stages[:-1]):
+            threads += [
+                threading.Thread(target=self._run_stage, args=(index,), name=f'pipeline-{stage.name}', daemon=True)
+                for _ in range(stage.workers)
+            ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            self._run_stage(len(self.stages) - 1)
+        except BaseException:
+            self._failed.set()
+            raise
+        finally:
+            if self._error is not None:
+                self._failed.set()
+            for thread in threads:
+                thread.join()
+        if self._error is not None:
+            raise self._error
+        return self.stats
+
+    def _fail(self, error):
+        with self._lock:
+            if self._error is None:
+                self._error = error
+        self._failed.set()
+
+    def _put(self, index, item):
+        """Hand an item to stage `index`; returns the seconds spent waiting for room."""
+        target = self.queues[index]
+        started = time.perf_counter()
+        while True:
+            if self._failed.is_set():
+                raise _Stopped()
+            try:
+                target.put(item, timeout=_POLL)
+                break
+            except queue.Full:
+                continue
+        self.stats[index + 1].record_depth(target.qsize())
+        return time.perf_counter() - started
+
+    def _get(self, index):
+        source = self.queues[index]
+        while True:
+            if self._failed.is_set():
+                raise _Stopped()
+            try:
+                return source.get(timeout=_POLL)
+            except queue.Empty:
+                continue
+
+    def _emit(self, index, items, stats):
+        """Pass what a stage produced to the next one, if any."""
+        if items is None:
+            return
+        if index + 1 >= len(self.stages):
+            for _ in items:
+                stats.add(emitted=1)
+            return
+        for item in items:
+            stats.add(emitted=1, blocked=self._put(index + 1, item))
+
+    def _done(self, index):
+        """The last worker of stage `index - 1` (or the source) to finish ends the input of stage `index`."""
+        if index >= len(self.stages):
+            return
+        for _ in range(self.stages[index].workers):
+            self._put(index, _DONE)
+
+    def _run_source(self):
+        stats = self.stats[0]
+        stats.start()
+        iterator = None
+        try:
+            iterator = iter(self.source)
+            self._emit(-1, iterator, stats)
+            self._done(0)
+        except _Stopped:
+            pass
+        except Exception as error:
+            self._fail(error)
+        finally:
+            # Lets a generator source release what it holds (threads, connections)
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+            stats.finish()
+
+    def _run_stage(self, index):
+        stage, stats = self.stages[index], self.stats[index + 1]
+        batch = []
+        try:
+            while True:
+                item = self._get(index)
+                if item is _DONE:
+                    break
+                if stats.started is None:
+                    stats.start()
+                stats.add(received=1)
+                if stage.batch_size:
+                    batch.append(item)
+                    if len(batch) >= stage.batch_size:
+                        self._emit(index, stage.func(batch), stats)
+                        batch = []
+                else:
+                    self._emit(index, stage.func(item), stats)
+            if batch:
+                self._emit(index, stage.func(batch), stats)
+
+            with self._lock:
+                self._remaining[index] -= 1
+                last = self._remaining[index] == 0
+            if last:
+                stats.finish()
+                self._done(index + 1)
+        except _Stopped:
+            pass
+        except Exception as error:
+            self._fail(error)
+
+
+def format_stats(stats):
+    """Lines describing a finished pipeline, one per stage."""
+    lines = [f"  {'stage':<12} {'workers':>7} {'in':>9} {'out':>9} {'items/s':>10} {'queue max':>9} {'queue avg':>9} {'blocked':>8}"]
+    for stage in stats:
+        if stage.name == Pipeline.SOURCE:
+            # The source reads no queue
+            received = max_depth = mean_depth = '-'
+        else:
+            received, max_depth, mean_depth = f'{stage.received:,}', stage.max_depth, f'{stage.mean_depth:.1f}'
+        lines.append(
+            f'  {stage.name:<12} {stage.workers:>7} {received:>9} {stage.emitted:>9,} '
+            f'{stage.throughput:>10,.0f} {max_depth:>9} {mean_depth:>9} {stage.blocked:>7.2f}s'
+        )
+    return lines
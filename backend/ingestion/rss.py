@@ -0,0 +1,43 @@
+import xml.etree.ElementTree as ET
+
+
+def local_name(tag):
+    """`{http://www.gdacs.org}eventid` -> `eventid`"""
+    return tag.rsplit('}', 1)[-1]
+
+
+def iter_items(chunks, fields, item_tag='item'):
+    """
+    Yield one dict per RSS `<item>` while the feed is still downloading.
+
+    `chunks` is any iterable of bytes (e.g. `StreamedResponse.chunks`); they
+    are fed to a pull parser and every item is handed out as soon as its end
+    tag has been parsed. Only direct children named in `fields` are read
+    (namespace prefixes ignored, first occurrence wins), all in one pass over
+    the item, and the item is then removed from the tree so memory stays flat
+    however long the feed is. Stop iterating to stop reading the response.
+    """
+    wanted = frozenset(fields)
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    parents = []
+
+    for chunk in chunks:
+        parser.feed(chunk)
+        for event, elem in parser.read_events():
+            if event == 'start':
+                parents.append(elem)
+                continue
+            parents.pop()
+            if local_name(elem.tag) != item_tag:
+                continue
+
+            item = dict.fromkeys(wanted)
+            for child in elem:
+                name = local_name(child.tag)
+                if name in wanted and item[name] is None:
+                    item[name] = (child.text or '').strip()
+            elem.clear()
+            if parents:
+                parents[-1].remove(elem)
+            yield item
+    parser.close()
@@ -0,0 +1,342 @@
+import io
+import json
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from disasters.ingest import merge_reliefweb, upsert_alerts
+from disasters.models import AlertAlias, disaster_alerts
+from ingestion.concurrency import Deadline
+from ingestion.gazetteer import Gazetteer, Place, default_gazetteer, geocode
+from ingestion.http import HTTPClient, ResponseCache
+from ingestion.jsonstream import iter_values
+from relief_shelter.ingest import upsert_shelters
+from relief_shelter.models import Relief_Shelter
+from sync.models import PendingIndexChange
+
+
+class FakeRaw:
+    def __init__(self, body):
+        self.body = io.BytesIO(body)
+
+    def read1(self, size, decode_content=True):
+        return self.body.read(min(size, 4))
+
+
+class FakeResponse:
+    def __init__(self, status, body=b'', headers=None):
+        self.status_code = status
+        self.headers = headers or {}
+        self.raw = FakeRaw(body)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    """Serves `bodies[url]` with an ETag of its content, and 304 to a matching If-None-Match."""
+
+    def __init__(self, bodies):
+        self.bodies = bodies
+        self.requests = []
+
+    def get(self, url, headers=None, timeout=None, stream=False):
+        self.requests.append((url, dict(headers or {})))
+        body = self.bodies[url]
+        etag = f'"{len(body)}-{hash(body)}"'
+        if (headers or {}).get('If-None-Match') == etag:
+            return FakeResponse(304)
+        return FakeResponse(200, body, {'ETag': etag})
+
+
+class ResponseCacheTests(SimpleTestCase):
+    url = 'https://feeds.example.org/alerts.xml'
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        self.cache = ResponseCache(self.directory, ttl=60)
+        self.session = FakeSession({self.url: b'<rss>first</rss>'})
+        self.client = HTTPClient(self.cache)
+        self.client.session = self.session
+
+    def get(self):
+        return self.client.get(self.url, Deadline(5))
+
+    def age_entry(self, seconds):
+        checked_at = time.time() - seconds
+        os.utime(self.cache.path(self.url), (checked_at, checked_at))
+
+    def test_fresh_entry_is_served_without_a_request(self):
+        first, second = self.get(), self.get()
+
+        self.assertEqual((first.status, first.body, first.not_modified), (200, b'<rss>first</rss>', False))
+        self.assertEqual((second.body, second.not_modified), (b'<rss>first</rss>', True))
+        self.assertEqual(len(self.session.requests), 1)
+
+    def test_expired_entry_is_revalidated_without_rewriting_it(self):
+        self.get()
+        self.age_entry(120)
+        stored = self.cache.path(self.url).read_bytes()
+
+        response = self.get()
+
+        self.assertEqual((response.status, response.body, response.not_modified), (304, b'<rss>first</rss>', True))
+        self.assertIn('If-None-Match', self.session.requests[-1][1])
+        self.assertEqual(self.cache.path(self.url).read_bytes(), stored)
+        # The 304 restarted the TTL
+        self.assertTrue(self.get().not_modified)
+        self.assertEqual(len(self.session.requests), 2)
+
+    def test_changed_resource_replaces_the_entry(self):
+        self.get()
+        self.age_entry(120)
+        self.session.bodies[self.url] = b'<rss>second</rss>'
+
+        response = self.get()
+
+        self.assertEqual((response.status, response.body, response.not_modified), (200, b'<rss>second</rss>', False))
+        self.assertEqual(self.cache.body(self.url), b'<rss>second</rss>')
+
+    def test_body_read_partly_is_not_cached(self):
+        with self.client.stream(self.url, Deadline(5)) as response:
+            next(iter(response.chunks))
+
+        self.assertIsNone(self.cache.meta(self.url))
+        self.assertEqual(list(self.directory.iterdir()), [])
+        self.assertFalse(self.get().not_modified)
+        self.assertEqual(len(self.session.requests), 2)
+
+    def test_failed_read_is_not_cached(self):
+        with self.assertRaises(ValueError):
+            with self.client.stream(self.url, Deadline(5)) as response:
+                for _ in response.chunks:
+                    raise ValueError('parse error')
+
+        self.assertEqual(list(self.directory.iterdir()), [])
+
+
+def split(data, sizes):
+    """`data` in chunks of the given sizes, cycled."""
+    chunks, start = [], 0
+    while start < len(data):
+        size = sizes[len(chunks) % len(sizes)]
+        chunks.append(data[start:start + size])
+        start += size
+    return chunks
+
+
+def random_value(rng, depth=0):
+    kind = rng.choice(['int', 'float', 'str', 'const'] + ['list', 'dict'] * (depth < 3))
+    if kind == 'int':
+        return rng.randint(-10 ** rng.randint(0, 12), 10 ** rng.randint(0, 12))
+    if kind == 'float':
+        return rng.uniform(-1e6, 1e6) * 10 ** rng.randint(-30, 30)
+    if kind == 'str':
+        return ''.join(rng.choice('ab "\\/[]{}:,\n\té中😀\x00') for _ in range(rng.randint(0, 12)))
+    if kind == 'const':
+        return rng.choice([True, False, None])
+    if kind == 'list':
+        return [random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))]
+    return {random_value(rng, 3) if rng.random() < 0.8 else 'records': random_value(rng, depth + 1)
+            for _ in range(rng.randint(0, 4))}
+
+
+class JSONStreamTests(SimpleTestCase):
+    def read(self, data, sizes=(1,), **paths):
+        return list(iter_values(split(data, sizes), **paths))
+
+    def test_random_documents_in_random_chunks_match_json_loads(self):
+        rng = random.Random(41)
+        for _ in range(300):
+            document = {
+                'meta': random_value(rng),
+                'skipped': random_value(rng),
+                'result': {'records': [random_value(rng) for _ in range(rng.randint(0, 5))]},
+            }
+            keys = list(document)
+            rng.shuffle(keys)
+            data = json.dumps({key: document[key] for key in keys}, ensure_ascii=rng.random() < 0.5).encode()
+            sizes = [rng.randint(1, 16) for _ in range(5)]
+
+            values = self.read(data, sizes, arrays=[('result', 'records')], values=[('meta',)])
+
+            expected = json.loads(data)
+            self.assertEqual(values, sorted(
+                [(('meta',), expected['meta'])] + [(('result', 'records'), r) for r in expected['result']['records']],
+                key=lambda item: keys.index(item[0][0])))
+            with self.assertRaises(json.JSONDecodeError):
+                self.read(data[:rng.randrange(len(data))], sizes, arrays=[('result', 'records')], values=[('meta',)])
+
+    def test_strings_split_inside_escapes_and_characters(self):
+        data = json.dumps(['a"b\\c\n\u00e9', 'é中😀', {'k€y': 'v'}], ensure_ascii=False).encode()
+        for size in (1, 2, 3):
+            self.assertEqual([value for _, value in self.read(data, (size,), arrays=[()])],
+                             ['a"b\\c\n\u00e9', 'é中😀', {'k€y': 'v'}])
+        escaped = json.dumps(['é中😀']).encode()
+        self.assertEqual(self.read(escaped, (1,), arrays=[()]), [((), 'é中😀')])
+
+    def test_numbers_split_across_chunks(self):
+        data = b'{"n": 12345.678e-3, "records": [-0, 10, 2.5E+2, 7]}'
+        self.assertEqual(self.read(data, (1, 2), values=[('n',)], arrays=[('records',)]),
+                         [(('n',), 12.345678), (('records',), 0), (('records',), 10), (('records',), 250.0),
+                          (('records',), 7)])
+        self.assertEqual(self.read(b'31415', (2,), values=[()]), [((), 31415)])
+
+    def test_skipped_values_with_brackets_in_strings(self):
+        data = b'{"skip": {"a": "]}[{\\"", "b": [1, "}", {"c": "\\\\"}]}, "x": "[", "records": [{"id": "]"}]}'
+        for size in (1, 3, len(data)):
+            self.assertEqual(self.read(data, (size,), arrays=[('records',)]), [(('records',), {'id': ']'})])
+
+    def test_path_holding_an_object_is_descended_into(self):
+        collection = b'{"type": "FeatureCollection", "features": [{"id": 1}, {"id": 2}]}'
+        self.assertEqual(self.read(collection, (4,), arrays=[(), ('features',)]),
+                         [(('features',), {'id': 1}), (('features',), {'id': 2})])
+        self.assertEqual(self.read(b'[{"id": 1}]', (4,), arrays=[(), ('features',)]), [((), {'id': 1})])
+
+    def test_truncated_or_malformed_input_is_a_decode_error(self):
+        for data in (b'{"records": [1, 2', b'{"records": [1, 2]', b'{"skip": "abc', b'{"skip": [1, {"a": 2}',
+                     b'{"records": ["\xc3', b'{"records": [1 2]}', b'{"records" [1]}', b''):
+            with self.subTest(data=data), self.assertRaises(json.JSONDecodeError):
+                self.read(data, (3,), arrays=[('records',)])
+
+
+class GazetteerTests(SimpleTestCase):
+    def locate(self, text):
+        place = default_gazetteer().locate(text)
+        return place and (place.name, place.country)
+
+    def test_longest_name_and_most_specific_place_win(self):
+        self.assertEqual(self.locate('Dera Ghazi Khan floods'), ('Dera Ghazi Khan', 'Pakistan'))
+        self.assertEqual(self.locate('Earthquake, Papua New Guinea'), ('Papua New Guinea', 'Papua New Guinea'))
+        self.assertEqual(self.locate('Flood in Sindh near Karachi'), ('Karachi', 'Pakistan'))
+        # Equally specific: the first mentioned
+        self.assertEqual(self.locate('Rain in Lahore and Karachi'), ('Lahore', 'Pakistan'))
+        self.assertEqual(self.locate("Flooding in Cote d’Ivoire"), ("Cote d'Ivoire", "Cote d'Ivoire"))
+        self.assertIsNone(self.locate('Storm warning for the coast'))
+
+    def test_shared_name_resolves_to_the_country_mentioned(self):
+        self.assertEqual(self.locate('Floods in Punjab'), ('Punjab', 'Pakistan'))
+        self.assertEqual(self.locate('Floods in Punjab, India'), ('Punjab', 'India'))
+        self.assertEqual(self.locate('Heavy rain in Hyderabad'), ('Hyderabad', 'Pakistan'))
+        self.assertEqual(self.locate('Hyderabad, India: heavy rain'), ('Hyderabad', 'India'))
+
+    def test_common_words_need_a_sign_they_name_the_place(self):
+        for text in ('turkey farms hit by bird flu', 'Jordan river flooding', 'Guinea pig rescue',
+                     'FLOODS IN CHAD', 'Bird Flu Outbreak Turkey Farms'):
+            with self.subTest(text=text):
+                self.assertIsNone(self.locate(text))
+        self.assertEqual(self.locate('Floods in Jordan'), ('Jordan', 'Jordan'))
+        self.assertEqual(self.locate('Chad: Floods - Jul 2025'), ('Chad', 'Chad'))
+        self.assertEqual(self.locate('swat valley floods, pakistan'), ('Swat', 'Pakistan'))
+        self.assertEqual(self.locate('Thar desert drought in Sindh'), ('Tharparkar', 'Pakistan'))
+        # Its other names are not common words
+        self.assertEqual(self.locate('türkiye earthquake'), ('Turkey', 'Turkey'))
+
+    def test_file_rows_and_common_words(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / 'places.tsv'
+        path.write_text('# name\tkind\tcountry\tlat\tlon\tother names\tcommon words\n'
+                        'Springfield\tcity\tUSA\t39.8\t-89.6\tSpringfield IL\n'
+                        'Bath\tcity\tUK\t51.4\t-2.4\t\tBath\n', encoding='utf-8')
+        gazetteer = Gazetteer.load(path)
+
+        self.assertEqual(gazetteer.size, 2)
+        self.assertEqual(gazetteer.lookup('springfield il'), [Place('Springfield', 'city', 'USA', 39.8, -89.6)])
+        self.assertIsNone(gazetteer.locate('a hot bath'))
+        self.assertEqual(gazetteer.locate('Floods in Bath').name, 'Bath')
+
+    def test_repeated_texts_come_from_the_cache(self):
+        geocode.cache_clear()
+        first = geocode('Flood in Lahore')
+        self.assertIs(geocode('Flood in Lahore'), first)
+        self.assertEqual((geocode.cache_info().hits, geocode.cache_info().misses), (1, 1))
+        self.assertIsNone(geocode(''))
+
+
+class BulkUpsertTests(TestCase):
+    def setUp(self):
+        upsert_shelters([
+            {'name': 'North', 'address': 'Street 1', 'available_spaces': 10},
+            {'name': 'South', 'address': 'Street 2', 'available_spaces': 20},
+        ])
+        self.written = {shelter.name: shelter for shelter in Relief_Shelter.objects.all()}
+
+    def queued(self):
+        return {change.object_pk: change for change in PendingIndexChange.objects.all()}
+
+    def test_new_rows_are_inserted_and_queued_in_full(self):
+        self.assertEqual(len(self.written), 2)
+        self.assertEqual(self.written['North'].available_spaces, 10)
+        changes = self.queued()
+        self.assertEqual(set(changes), {str(shelter.pk) for shelter in self.written.values()})
+        self.assertTrue(all(change.action == 'upsert' and not change.changed_fields for change in changes.values()))
+
+    def test_known_rows_are_updated_with_their_changed_fields(self):
+        PendingIndexChange.objects.all().delete()
+        north, south = self.written['North'], self.written['South']
+        north_updated_at, south_updated_at = north.updated_at, south.updated_at
+
+        result = upsert_shelters([
+            {'name': 'North', 'address': 'Street 1', 'available_spaces': 5},
+            {'name': 'South', 'address': 'Street 2', 'available_spaces': 20},
+            {'name': 'East', 'address': 'Street 3'},
+        ])
+
+        self.assertEqual((len(result.created), len(result.updated), len(result.unchanged)), (1, 1, 1))
+        north.refresh_from_db()
+        south.refresh_from_db()
+        self.assertEqual(north.available_spaces, 5)
+        self.assertGreater(north.updated_at, north_updated_at)
+        self.assertEqual(south.updated_at, south_updated_at)
+        changes = self.queued()
+        self.assertEqual(changes[str(north.pk)].changed_fields, {'available_spaces'})
+        self.assertNotIn(str(south.pk), changes)
+
+    def test_rows_repeating_a_key_are_merged_in_order(self):
+        result = upsert_shelters([
+            {'name': 'West', 'address': 'Street 4', 'available_spaces': 1},
+            {'name': 'West', 'address': 'Street 4', 'available_spaces': 2},
+            {'name': 'North', 'address': 'Street 1', 'available_spaces': 3},
+            {'name': 'North', 'address': 'Street 1', 'available_spaces': 4},
+        ])
+
+        self.assertEqual((len(result.created), len(result.updated)), (1, 1))
+        self.assertEqual(dict(Relief_Shelter.objects.values_list('name', 'available_spaces')),
+                         {'North': 4, 'South': 20, 'West': 2})
+
+    def test_batches_written_before_a_failure_are_kept(self):
+        rows = [{'name': f'Shelter {i}', 'address': 'Street'} for i in range(4)]
+        rows.append({'name': 'Shelter 5', 'address': 'Street', 'no_such_field': 1})
+
+        with self.assertRaises(TypeError):
+            upsert_shelters(rows, batch_size=2)
+
+        self.assertEqual(Relief_Shelter.objects.filter(address='Street').count(), 4)
+
+    def test_alerts_reported_under_a_merged_key_update_the_survivor(self):
+        survivor = disaster_alerts.objects.create(title='Flood in Sindh', location='Sindh')
+        AlertAlias.objects.create(title='Sindh floods', location='Pakistan', alert=survivor)
+        PendingIndexChange.objects.all().delete()
+        reported = timezone.now()
+
+        result = upsert_alerts([{'title': 'Sindh floods', 'location': 'Pakistan', 'disaster_time': reported}],
+                               merge_reliefweb)
+
+        self.assertEqual((len(result.created), len(result.updated)), (0, 1))
+        self.assertEqual(disaster_alerts.objects.get().disaster_time, reported)
+        self.assertEqual(self.queued()[str(survivor.pk)].changed_fields, {'disaster_time'})
+        # Known times are kept
+        result = upsert_alerts([{'title': 'Flood in Sindh', 'location': 'Sindh', 'disaster_time': None}],
+                               merge_reliefweb)
+        self.assertEqual(len(result.unchanged), 1)
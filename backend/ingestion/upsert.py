@@ -0,0 +1,86 @@
+from itertools import islice
+from typing import List, NamedTuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from sync.models import PendingIndexChange
+
+
+class UpsertResult(NamedTuple):
+    created: List
+    updated: List
+    # Existing objects the rows matched without changing anything
+    unchanged: List
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def bulk_upsert(model, rows, key_fields, merge, batch_size=500):
+    """
+    Insert or update `rows` (dicts of field values) with a few queries per batch.
+
+    Rows are matched to existing objects on `key_fields`: the existing objects
+    of a whole batch are loaded with one `IN` query, new rows are collected for
+    `bulk_create`, and `merge(obj, row)` applies a row to an already existing
+    (or already collected) object and returns the names of the fields it
+    changed, which are written with one `bulk_update`. Rows repeating a key are
+    merged in order, as if they had been saved one after another.
+
+    Bulk writes skip the model signals, so the written objects are queued for
+    the next Algolia sync here, and `updated_at` is set explicitly.
+
+    Each batch is written in its own transaction: queuing its changes locks
+    the change log (`ChangeLog.objects.record`), and other writers wait for
+    one batch rather than the whole ingest. A batch that fails leaves the
+    batches before it written.
+    """
+    lead = key_fields[0]
+    has_updated_at = any(field.name == 'updated_at' for field in model._meta.concrete_fields)
+    result = UpsertResult([], [], [])
+
+    for batch in chunked(rows, batch_size):
+        with transaction.atomic():
+            existing = {}
+            # Unordered: the models have a unique constraint on their key fields, there is no duplicate to choose from
+            for obj in model.objects.filter(**{f'{lead}__in': {row[lead] for row in batch}}).order_by():
+                existing.setdefault(tuple(getattr(obj, field) for field in key_fields), obj)
+
+            to_create = {}
+            dirty = {}
+            matched = set()
+            for row in batch:
+                key = tuple(row[field] for field in key_fields)
+                if key in existing:
+                    matched.add(key)
+                    changed = merge(existing[key], row)
+                    if changed:
+                        dirty.setdefault(key, set()).update(changed)
+                elif key in to_create:
+                    merge(to_create[key], row)
+                else:
+                    to_create[key] = model(**row)
+
+            created = model.objects.bulk_create(to_create.values())
+            updated = [existing[key] for key in dirty]
+            fields = set().union(*dirty.values())
+            if updated:
+                write_fields = set(fields)
+                if has_updated_at:
+                    now = timezone.now()
+                    for obj in updated:
+                        obj.updated_at = now
+                    write_fields.add('updated_at')
+                model.objects.bulk_update(updated, sorted(write_fields))
+
+            PendingIndexChange.objects.queue(model, [obj.pk for obj in created])
+            PendingIndexChange.objects.queue(model, [obj.pk for obj in updated], fields=fields)
+            result.created.extend(created)
+            result.updated.extend(updated)
+            result.unchanged.extend(existing[key] for key in matched - dirty.keys())
+
+    return result
@@ -3,6 +3,7 @@
 from algoliasearch_django import AlgoliaIndex
 from algoliasearch_django.decorators import register
 from .models import Relief_Shelter
+from .records import relief_shelter_serializer
 
 @register(Relief_Shelter)
 class ReliefShelterIndex(AlgoliaIndex):
@@ -42,26 +43,21 @@ class ReliefShelterIndex(AlgoliaIndex):
         ]
     }
 
-    def get_queryset(self):
-        return Relief_Shelter.objects.all()
+    # Sort replicas, named <index>_<key>; each sorts by its attributes before relevance
+    replicas = {
+        'most_capacity': ['desc(total_spaces)', 'desc(available_spaces)'],
+        'most_available': ['desc(available_spaces)'],
+    }
 
-    def prepare_record(self, instance):
-        record = {}
-        for field in self.fields:
-            value = getattr(instance, field, None)
-            record[field] = value
+    serializer = relief_shelter_serializer
 
-        # Fallback coordinate parsing (if lat/lng missing but present in address string)
-        if (not record.get('latitude') or not record.get('longitude')) and record.get('address'):
-            import re
-            coord_pattern = r'\((-?\d+\.?\d*),\s*(-?\d+\.?\d*)\)'
-            match = re.search(coord_pattern, record['address'])
-            if match:
-                record['latitude'] = float(match.group(1))
-                record['longitude'] = float(match.group(2))
+    # Record attributes computed from another field, resent on partial updates of that field
+    derived_fields = {
+        'address': ('latitude', 'longitude'),
+    }
 
-        # Add objectID and id for Algolia
-        record['objectID'] = instance.pk
-        record['id'] = instance.pk
+    def get_queryset(self):
+        return Relief_Shelter.objects.all()
 
-        return record
+    def prepare_record(self, instance):
+        return self.serializer.index_record(instance)
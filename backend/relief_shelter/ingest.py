@@ -0,0 +1,45 @@
+from django.db import models
+
+from ingestion.upsert import bulk_upsert
+
+from .models import Relief_Shelter
+
+# Source rows are matched to existing shelters on these fields
+KEY_FIELDS = ('name', 'address')
+
+FIELDS = {field.name: field for field in Relief_Shelter._meta.concrete_fields}
+
+
+def invalid_reason(row):
+    """Why a row can't be written, or None; checked up front so one bad row doesn't fail a batch."""
+    unknown = [name for name in row if name not in FIELDS]
+    if unknown:
+        return f"Invalid field name(s) for model Relief_Shelter: {', '.join(map(repr, unknown))}."
+    for name, value in row.items():
+        field = FIELDS[name]
+        if isinstance(field, models.CharField) and isinstance(value, str) and len(value) > field.max_length:
+            return f"{name} is longer than {field.max_length} characters"
+    return None
+
+
+def merge_changed(shelter, row):
+    """Copy the values that differ from the row onto the shelter; returns the changed fields."""
+    changed = set()
+    for name, value in row.items():
+        if getattr(shelter, name) != value:
+            setattr(shelter, name, value)
+            changed.add(name)
+    return changed
+
+
+def merge_all(shelter, row):
+    """Rewrite every field of the row, changed or not (--force-update)."""
+    for name, value in row.items():
+        setattr(shelter, name, value)
+    return set(row)
+
+
+def upsert_shelters(rows, force=False, batch_size=500):
+    """Insert new shelters and update known ones in place, see `ingestion.upsert.bulk_upsert`."""
+    merge = merge_all if force else merge_changed
+    return bulk_upsert(Relief_Shelter, rows, KEY_FIELDS, merge, batch_size=batch_size)
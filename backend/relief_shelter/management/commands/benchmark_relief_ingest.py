@@ -0,0 +1,74 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from relief_shelter.ingest import upsert_shelters
+from relief_shelter.management.commands.fetch_relief import Command as FetchReliefCommand
+from relief_shelter.models import Relief_Shelter
+
+
+def sample_features(count, changed_every=0):
+    """DC-style GeoJSON features; with `changed_every`, every n-th shelter reports fewer available beds."""
+    features = []
+    for i in range(count):
+        beds = 50 + i % 100
+        features.append({
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [-77.03 + i % 50 / 1000, 38.90 + i % 70 / 1000]},
+            'properties': {
+                'FacilityName': f'Benchmark Shelter {i}',
+                'Address': f'{i} Benchmark Street NW, Washington, DC',
+                'Phone': '(202) 555-0100',
+                'Beds': beds,
+                'AvailableBeds': beds - 1 if changed_every and i % changed_every == 0 else beds,
+                'Food': 'Yes', 'Water': 'Yes', 'Open_24x7': i % 2,
+            },
+        })
+    return features
+
+
+def upsert_per_row(rows):
+    """The previous write path: one update_or_create per shelter."""
+    for row in rows:
+        Relief_Shelter.objects.update_or_create(name=row['name'], address=row['address'], defaults=row)
+
+
+class Command(BaseCommand):
+    help = 'Measure rows per second of relief shelter ingestion, update_or_create per row versus bulk upsert'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='GeoJSON features per run (default: 10000)')
+
+    def handle(self, *args, **options):
+        fetch = FetchReliefCommand()
+        # Normalized the same way fetch_relief prepares DC_API_URL features
+        def normalize(features):
+            return [fetch.ensure_complete_data(fetch.normalize_dc_data(feature)) for feature in features]
+
+        new_rows = normalize(sample_features(options['rows']))
+        changed_rows = normalize(sample_features(options['rows'], changed_every=10))
+
+        methods = [
+            ('update_or_create per row', upsert_per_row),
+            ('bulk upsert', upsert_shelters),
+        ]
+
+        # Everything runs in a transaction that is rolled back at the end
+        with transaction.atomic():
+            for name, upsert in methods:
+                self.stdout.write(self.style.SUCCESS(name))
+                savepoint = transaction.savepoint()
+                # First run inserts every shelter, the second finds them all and updates every tenth
+                self.measure('insert', upsert, new_rows)
+                self.measure('re-run (10% changed)', upsert, changed_rows)
+                transaction.savepoint_rollback(savepoint)
+            transaction.set_rollback(True)
+
+    def measure(self, name, upsert, rows):
+        # Rows are copied because the write paths may keep references to them
+        rows = [dict(row) for row in rows]
+        started = time.perf_counter()
+        upsert(rows)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'  {name:<24} {len(rows) / elapsed:>12,.0f} rows/s ({elapsed:.2f}s)')
@@ -0,0 +1,107 @@
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from ingestion.jsonstream import iter_values
+from relief_shelter.management.commands.benchmark_relief_ingest import sample_features
+from relief_shelter.management.commands.fetch_relief import Command as FetchReliefCommand
+
+CHUNK_SIZE = 64 * 1024
+
+
+def write_fixture(path, size_mb):
+    """A DC-style GeoJSON FeatureCollection of about `size_mb` megabytes; returns the number of features."""
+    features = [json.dumps(feature) for feature in sample_features(1000)]
+    target = size_mb * 1024 * 1024
+    count = written = 0
+    with open(path, 'w') as fixture:
+        fixture.write('{"type": "FeatureCollection", "name": "Shelters", "features": [\n')
+        while written < target:
+            for feature in features:
+                text = ('' if count == 0 else ',\n') + feature.replace('Benchmark Shelter ', f'Shelter {count} ', 1)
+                fixture.write(text)
+                written += len(text)
+                count += 1
+        fixture.write('\n], "crs": {"type": "name", "properties": {"name": "EPSG:4326"}}}\n')
+    return count
+
+
+def read_chunks(path):
+    with open(path, 'rb') as fixture:
+        while chunk := fixture.read(CHUNK_SIZE):
+            yield chunk
+
+
+def parse_whole(path):
+    """The previous path: the whole payload decoded with json.loads, then its features walked."""
+    data = json.loads(b''.join(read_chunks(path)))
+    return (feature for feature in data.get('features', []))
+
+
+def parse_streaming(path):
+    return (feature for _, feature in iter_values(read_chunks(path), arrays=[('features',)]))
+
+
+def memory_kb(field):
+    """A memory figure of this process from /proc (Linux), e.g. VmRSS or its peak VmHWM."""
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+    return 0
+
+
+def measure(parse, path, results):
+    """Runs in a forked process, so each method's peak memory is its own."""
+    normalize = FetchReliefCommand().normalize_dc_data
+    # Reset the peak, which a forked process inherits from its parent
+    with open('/proc/self/clear_refs', 'w') as clear_refs:
+        clear_refs.write('5')
+    baseline = memory_kb('VmRSS')
+    started = time.perf_counter()
+    count = sum(1 for feature in parse(path) if normalize(feature))
+    elapsed = time.perf_counter() - started
+    results.put((count, elapsed, max(memory_kb('VmHWM') - baseline, 0)))
+
+
+class Command(BaseCommand):
+    help = 'Measure elapsed time and peak memory of reading a large GeoJSON payload, json.loads versus streaming'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size-mb', type=int, default=500, help='Size of the synthetic fixture (default: 500)')
+        parser.add_argument('--fixture', help='Use this GeoJSON file instead of generating one')
+
+    def handle(self, *args, **options):
+        path = options['fixture']
+        generated = path is None
+        if generated:
+            fd, path = tempfile.mkstemp(suffix='.geojson')
+            os.close(fd)
+            started = time.perf_counter()
+            count = write_fixture(path, options['size_mb'])
+            self.stdout.write(f'Wrote {count:,} features ({os.path.getsize(path) / 2**20:,.0f} MB) '
+                              f'in {time.perf_counter() - started:.1f}s')
+
+        # Forked, not spawned: the children reuse this process's Django setup
+        context = multiprocessing.get_context('fork')
+        try:
+            for name, parse in [('json.loads', parse_whole), ('streaming', parse_streaming)]:
+                results = context.Queue()
+                process = context.Process(target=measure, args=(parse, path, results))
+                process.start()
+                process.join()
+                if process.exitcode != 0:
+                    self.stdout.write(self.style.ERROR(f'  {name:<12} failed (exit code {process.exitcode})'))
+                    continue
+                count, elapsed, peak_kb = results.get()
+                self.stdout.write(
+                    f'  {name:<12} {count / elapsed:>12,.0f} features/s ({elapsed:.2f}s), '
+                    f'peak memory +{peak_kb / 1024:,.1f} MB'
+                )
+        finally:
+            if generated:
+                os.remove(path)
@@ -1,9 +1,14 @@
 import requests
 import json
+import time as time_module
 from datetime import datetime, time
-from django.core.management.base import BaseCommand
-from django.utils import timezone
-from relief_shelter.models import Relief_Shelter
+from django.core.management.base import BaseCommand, CommandError
+from ingestion import http
+from ingestion.concurrency import Counters, Deadline, DeadlineExceeded, HostLimiter
+from ingestion.gazetteer import geocode
+from ingestion.jsonstream import iter_values
+from ingestion.pipeline import Pipeline, Stage, format_stats
+from relief_shelter.ingest import invalid_reason, upsert_shelters
 
 class Command(BaseCommand):
     help = "Fetch Pakistani relief center data and update Relief_Shelter model with comprehensive information"
@@ -44,7 +49,11 @@ class Command(BaseCommand):
         'jdc_pakistan': 'https://jdcpakistan.com/api/emergency-response',  # Mock
     }
 
+    # Placeholder endpoints that are not live yet
+    MOCK_API_MARKERS = ['ndma.gov.pk/api', 'pdma.', 'edhi.org/api', 'akhuwat.org.pk/api']
+
     # DC API for comparison (original)
+    DC_SOURCE = 'dc_opendata'
     DC_API_URL = (
         "https://opendata.dc.gov/api/download/v1/"
         "items/87c5e68942304363a4578b30853f385d/geojson?layers=25"
@@ -71,12 +80,74 @@ class Command(BaseCommand):
             action='store_true',
             help='Run in test mode with sample data',
         )
+        parser.add_argument(
+            '--refresh',
+            action='store_true',
+            help='Ignore cached responses and re-process every source',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Sources fetched at the same time (default: 8)',
+        )
+        parser.add_argument(
+            '--per-host',
+            type=int,
+            default=2,
+            help='Concurrent requests allowed per host (default: 2)',
+        )
+        parser.add_argument(
+            '--timeout',
+            type=float,
+            default=30,
+            help='Seconds allowed for each source, from the request to its last record (default: 30)',
+        )
+        parser.add_argument(
+            '--deadline',
+            type=float,
+            default=90,
+            help='Seconds allowed for fetching all sources (default: 90)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Shelters written per database batch (default: 500)',
+        )
+        parser.add_argument(
+            '--queue-size',
+            type=int,
+            default=1000,
+            help='Records allowed to wait between two pipeline stages (default: 1000)',
+        )
+        parser.add_argument(
+            '--replay',
+            nargs='?',
+            const='latest',
+            metavar='RUN',
+            help='Read the responses of an archived run (default: the latest) instead of the network',
+        )
+        parser.add_argument(
+            '--no-archive',
+            action='store_true',
+            help='Do not archive the downloaded responses',
+        )
 
     def handle(self, *args, **options):
+        try:
+            session = http.fetch_session('fetch_relief', options['replay'], not options['no_archive'])
+        except LookupError as e:
+            raise CommandError(str(e))
+        with session:
+            self.fetch(options)
+
+    def fetch(self, options):
         self.verbose = options.get('verbose', False)
         self.force_update = options.get('force_update', False)
         self.source = options.get('source', 'all')
         self.test_mode = options.get('test_mode', False)
+        self.refresh = options.get('refresh', False)
         
         self.stdout.write(self.style.SUCCESS(f"Starting relief center data fetch from: {self.source}"))
         
@@ -89,16 +160,15 @@ class Command(BaseCommand):
             total_updated += updated
             total_skipped += skipped
         
+        # All remote sources (Pakistani portals and DC) are fetched concurrently
+        sources = {}
         if self.source in ['all', 'pakistan']:
-            # Fetch Pakistani relief center data
-            added, updated, skipped = self.fetch_pakistani_data()
-            total_added += added
-            total_updated += updated
-            total_skipped += skipped
-        
+            sources.update(self.pakistani_sources())
         if self.source in ['all', 'dc']:
-            # Fetch DC data (original functionality)
-            added, updated, skipped = self.fetch_dc_data()
+            sources[self.DC_SOURCE] = self.DC_API_URL
+        
+        if sources:
+            added, updated, skipped = self.fetch_sources(sources, options)
             total_added += added
             total_updated += updated
             total_skipped += skipped
@@ -109,127 +179,218 @@ class Command(BaseCommand):
             )
         )
 
-    def fetch_pakistani_data(self):
-        """Fetch data from Pakistani sources"""
-        self.stdout.write("Fetching Pakistani relief center data...")
-        
-        all_data = []
-        working_apis = 0
-        
+    def pakistani_sources(self):
+        """Pakistani sources to fetch, without the mock APIs that don't exist yet"""
+        sources = {}
         for source_name, api_url in self.PAKISTANI_APIS.items():
-            try:
-                if self.verbose:
-                    self.stdout.write(f"  Trying {source_name}...")
-                
-                # Skip mock APIs in production (they don't exist yet)
-                if any(mock in api_url for mock in ['ndma.gov.pk/api', 'pdma.', 'edhi.org/api', 'akhuwat.org.pk/api']):
-                    if self.verbose:
-                        self.stdout.write(f"    Skipping mock API: {source_name}")
-                    continue
-                
-                headers = {
-                    'User-Agent': 'Relief-Shelter-App/1.0',
-                    'Accept': 'application/json'
-                }
-                
-                response = requests.get(api_url, headers=headers, timeout=30)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    
-                    # Process different API response formats
-                    processed_data = self.process_api_response(data, source_name)
-                    if processed_data:
-                        all_data.extend(processed_data)
-                        working_apis += 1
-                        if self.verbose:
-                            self.stdout.write(f"    ✓ {source_name}: {len(processed_data)} records")
-                    
-                elif response.status_code == 404:
-                    if self.verbose:
-                        self.stdout.write(f"    - {source_name}: No data available (404)")
-                else:
-                    if self.verbose:
-                        self.stdout.write(f"    - {source_name}: HTTP {response.status_code}")
-                        
-            except requests.exceptions.Timeout:
-                if self.verbose:
-                    self.stdout.write(f"    - {source_name}: Timeout")
-            except requests.exceptions.RequestException as e:
-                if self.verbose:
-                    self.stdout.write(f"    - {source_name}: Connection error")
-            except json.JSONDecodeError:
-                if self.verbose:
-                    self.stdout.write(f"    - {source_name}: Invalid JSON response")
-            except Exception as e:
+            if any(mock in api_url for mock in self.MOCK_API_MARKERS):
                 if self.verbose:
-                    self.stdout.write(f"    - {source_name}: Error - {str(e)}")
+                    self.stdout.write(f"  Skipping mock API: {source_name}")
+                continue
+            sources[source_name] = api_url
+        return sources
+
+    def fetch_sources(self, sources, options):
+        """
+        Fetch all sources concurrently and stream their records into the database.
+
+        Sources go through a pipeline (fetch -> normalize -> upsert) with
+        bounded queues between the stages. Responses are parsed as they
+        download, one record at a time, and records are written in batches
+        while other sources are still downloading; at most --queue-size
+        records wait at each step, so memory does not grow with the size of a
+        source. Every source gets its own deadline (--timeout) and the whole
+        fetch is bounded by --deadline, so the run takes as long as the
+        slowest source instead of the sum of all of them.
+        """
+        self.stdout.write(f"Fetching {len(sources)} sources concurrently...")
+        started = time_module.monotonic()
         
-        self.stdout.write(f"Successfully connected to {working_apis} Pakistani data sources")
-        self.stdout.write(f"Found {len(all_data)} relief center records from Pakistani sources")
+        self.unchanged = []
+        self.record_counts = Counters()
+        self.tallies = {}
+        self.timeout = options['timeout']
+        self.total = Deadline(options['deadline'])
+        self.limiter = HostLimiter(options['per_host'])
         
-        # If no real data found, use sample data for demonstration
-        if not all_data and not self.test_mode:
-            self.stdout.write(self.style.WARNING("No data from Pakistani APIs, using sample data for demonstration"))
-            return self.process_sample_data()
+        pipeline = Pipeline(sources.items(), [
+            Stage('fetch', self.fetch_records, workers=options['workers']),
+            Stage('normalize', self.normalize_record),
+            Stage('upsert', self.upsert_batch, batch_size=options['batch_size']),
+        ], maxsize=options['queue_size'])
+        stats = pipeline.run()
+        
+        added = updated = skipped = 0
+        working_apis = pakistani_records = 0
+        for source_name, (a, u, unchanged, s) in self.tallies.items():
+            if source_name == self.DC_SOURCE:
+                label = 'DC'
+            else:
+                working_apis += 1
+                pakistani_records += self.record_counts[source_name]
+                label = f'Pakistani ({source_name})'
+            if self.verbose:
+                self.stdout.write(f"    ✓ {source_name}: {self.record_counts[source_name]} records")
+            self.stdout.write(
+                self.style.SUCCESS(f"{label} - Added: {a}, Updated: {u}, Unchanged: {unchanged}, Skipped: {s}")
+            )
+            added += a
+            updated += u
+            skipped += s
         
-        return self.process_relief_data(all_data, 'Pakistani')
+        if self.source in ['all', 'pakistan']:
+            self.stdout.write(f"Successfully connected to {working_apis} Pakistani data sources")
+            self.stdout.write(f"Found {pakistani_records} relief center records from Pakistani sources")
+            
+            # If no real data found, use sample data for demonstration
+            pakistani_unchanged = [name for name in self.unchanged if name != self.DC_SOURCE]
+            if not pakistani_records and not pakistani_unchanged and not self.test_mode:
+                self.stdout.write(self.style.WARNING("No data from Pakistani APIs, using sample data for demonstration"))
+                a, u, s = self.process_sample_data()
+                added += a
+                updated += u
+                skipped += s
+        
+        self.stdout.write(
+            f"Fetched {len(sources)} sources in {time_module.monotonic() - started:.1f}s "
+            f"({len(self.unchanged)} unchanged since last fetch)"
+        )
+        for line in format_stats(stats):
+            self.stdout.write(line)
+        return added, updated, skipped
 
-    def process_api_response(self, data, source_name):
-        """Process different API response formats"""
-        processed = []
+    def report_fetch_error(self, source_name, error):
+        if isinstance(error, DeadlineExceeded):
+            message = "Deadline exceeded"
+        elif isinstance(error, requests.exceptions.Timeout):
+            message = "Timeout"
+        elif isinstance(error, requests.exceptions.RequestException):
+            message = "Connection error"
+        elif isinstance(error, json.JSONDecodeError):
+            message = "Invalid JSON response"
+        else:
+            message = f"Error - {error}"
         
+        if source_name == self.DC_SOURCE:
+            self.stderr.write(self.style.ERROR(f"Error fetching DC data: {message}"))
+        else:
+            self.stdout.write(f"    - {source_name}: {message}")
+
+    def fetch_records(self, source):
+        """
+        Pipeline stage: download one source and yield (source_name, normalize function, raw record)
+        for each record as the response streams in; runs on the fetch worker threads
+        """
+        source_name, url = source
+        slot = self.limiter.slot(url)
+        if not slot.acquire(timeout=self.total.remaining()):
+            if self.verbose or source_name == self.DC_SOURCE:
+                self.report_fetch_error(source_name, DeadlineExceeded(url))
+            return
         try:
-            # HDX API format
-            if source_name.startswith('hdx'):
-                if 'result' in data and 'records' in data['result']:
-                    for record in data['result']['records']:
-                        processed.append(self.normalize_hdx_data(record))
-                elif 'result' in data and 'results' in data['result']:
-                    for result in data['result']['results']:
-                        if 'resources' in result:
-                            for resource in result['resources']:
-                                processed.append(self.normalize_hdx_data(resource))
-            
-            # Open Data Pakistan format
-            elif source_name.startswith('opendata') or source_name.startswith('kp'):
-                if 'result' in data and 'results' in data['result']:
-                    for result in data['result']['results']:
-                        processed.append(self.normalize_opendata_pk(result))
-            
-            # ReliefWeb format
-            elif source_name == 'reliefweb_pak':
-                if 'data' in data:
-                    for item in data['data']:
-                        processed.append(self.normalize_reliefweb_data(item))
-            
-            # OCHA format
-            elif source_name == 'ocha_pak':
-                if 'data' in data:
-                    processed.append(self.normalize_ocha_data(data['data']))
-            
-            # Generic format
-            else:
-                if isinstance(data, list):
-                    for item in data:
-                        processed.append(self.normalize_generic_data(item))
-                elif isinstance(data, dict) and 'features' in data:
-                    for feature in data['features']:
-                        processed.append(self.normalize_geojson_data(feature))
-                        
+            deadline = Deadline.earliest(Deadline(self.timeout), self.total)
+            deadline.check(url)
+            headers = {'Accept': 'application/json'}
+            with http.stream(url, deadline, headers=headers, use_cache=not self.refresh, source=source_name) as resp:
+                if resp.not_modified:
+                    # Same payload as on the last run, nothing to parse or save
+                    self.unchanged.append(source_name)
+                    if self.verbose:
+                        self.stdout.write(f"    = {source_name}: unchanged since last fetch")
+                    return
+                
+                if resp.status != 200:
+                    if source_name == self.DC_SOURCE:
+                        self.stderr.write(self.style.ERROR(f"Error fetching DC data: HTTP {resp.status}"))
+                    elif self.verbose:
+                        reason = "No data available (404)" if resp.status == 404 else f"HTTP {resp.status}"
+                        self.stdout.write(f"    - {source_name}: {reason}")
+                    return
+                
+                if source_name == self.DC_SOURCE:
+                    features = iter_values(resp.chunks, arrays=[('features',)])
+                    records = ((self.normalize_dc_data, feature) for _, feature in features)
+                else:
+                    records = self.iter_api_records(resp.chunks, source_name)
+                for normalize, record in records:
+                    yield source_name, normalize, record
+        except Exception as e:
+            # Records read before the error have already been passed on
+            if self.verbose or source_name == self.DC_SOURCE:
+                self.report_fetch_error(source_name, e)
+        finally:
+            slot.release()
+
+    def normalize_record(self, item):
+        """Pipeline stage: raw record -> (source_name, complete shelter row), nothing for unusable records"""
+        source_name, normalize, record = item
+        try:
+            relief_data = normalize(record)
         except Exception as e:
             if self.verbose:
                 self.stdout.write(f"Error processing {source_name}: {str(e)}")
+            return None
+        if not relief_data:
+            return None
+        self.record_counts.incr(source_name)
+        return [(source_name, self.ensure_complete_data(relief_data))]
+
+    def upsert_batch(self, items):
+        """Pipeline stage: write a batch of (source_name, row), tallying the results per source"""
+        by_source = {}
+        for source_name, relief_data in items:
+            by_source.setdefault(source_name, []).append(relief_data)
         
-        return processed
+        for source_name, data_list in by_source.items():
+            result, skipped = self.upsert_rows(data_list)
+            tally = self.tallies.setdefault(source_name, [0, 0, 0, 0])
+            tally[0] += len(result.created)
+            tally[1] += len(result.updated)
+            tally[2] += len(result.unchanged)
+            tally[3] += skipped
+        return None
+
+    def iter_api_records(self, chunks, source_name):
+        """(normalize function, raw record) for each record of the different API response formats, read from the response stream"""
+        # HDX API format
+        if source_name.startswith('hdx'):
+            for path, value in iter_values(chunks, arrays=[('result', 'records'), ('result', 'results')]):
+                if path == ('result', 'records'):
+                    yield self.normalize_hdx_data, value
+                elif 'resources' in value:
+                    for resource in value['resources']:
+                        yield self.normalize_hdx_data, resource
+        
+        # Open Data Pakistan format
+        elif source_name.startswith('opendata') or source_name.startswith('kp'):
+            for _, result in iter_values(chunks, arrays=[('result', 'results')]):
+                yield self.normalize_opendata_pk, result
+        
+        # ReliefWeb format
+        elif source_name == 'reliefweb_pak':
+            for _, item in iter_values(chunks, arrays=[('data',)]):
+                yield self.normalize_reliefweb_data, item
+        
+        # OCHA format
+        elif source_name == 'ocha_pak':
+            for _, data in iter_values(chunks, values=[('data',)]):
+                yield self.normalize_ocha_data, data
+        
+        # Generic format: a list of records, or GeoJSON features
+        else:
+            for path, item in iter_values(chunks, arrays=[(), ('features',)]):
+                if path == ():
+                    yield self.normalize_generic_data, item
+                else:
+                    yield self.normalize_geojson_data, item
 
     def normalize_hdx_data(self, record):
         """Normalize HDX data format to standard format"""
         return {
             'name': record.get('name', 'Unknown Facility'),
             'address': f"{record.get('city', '')}, {record.get('admin1', '')}, Pakistan".strip(', '),
-            'latitude': float(record.get('latitude', 0)) if record.get('latitude') else 31.5204,  # Lahore default
-            'longitude': float(record.get('longitude', 0)) if record.get('longitude') else 74.3587,
+            'latitude': float(record['latitude']) if record.get('latitude') else None,
+            'longitude': float(record['longitude']) if record.get('longitude') else None,
             'phone_number': record.get('phone', ''),
             'source': 'HDX Pakistan',
             'has_bed': True,  # Assume shelters have beds
@@ -244,8 +405,8 @@ class Command(BaseCommand):
         return {
             'name': record.get('title', 'Relief Center'),
             'address': record.get('notes', '').split('\n')[0] if record.get('notes') else 'Pakistan',
-            'latitude': 31.5204,  # Default coordinates for Pakistan
-            'longitude': 74.3587,
+            'latitude': None,
+            'longitude': None,
             'phone_number': '',
             'source': 'Open Data Pakistan',
             'website': record.get('url', ''),
@@ -262,8 +423,8 @@ class Command(BaseCommand):
         return {
             'name': fields.get('title', 'Relief Center'),
             'address': f"{fields.get('country', {}).get('name', 'Pakistan')}",
-            'latitude': 31.5204,
-            'longitude': 74.3587,
+            'latitude': None,
+            'longitude': None,
             'phone_number': '',
             'source': 'ReliefWeb',
             'website': fields.get('url', ''),
@@ -279,8 +440,8 @@ class Command(BaseCommand):
         return {
             'name': record.get('name', 'OCHA Relief Center'),
             'address': 'Pakistan',
-            'latitude': 31.5204,
-            'longitude': 74.3587,
+            'latitude': None,
+            'longitude': None,
             'phone_number': '',
             'source': 'OCHA',
             'has_bed': True,
@@ -295,8 +456,8 @@ class Command(BaseCommand):
         return {
             'name': record.get('name', record.get('title', 'Relief Center')),
             'address': record.get('address', record.get('location', 'Pakistan')),
-            'latitude': float(record.get('lat', record.get('latitude', 31.5204))),
-            'longitude': float(record.get('lng', record.get('longitude', 74.3587))),
+            'latitude': self.coordinate(record.get('lat', record.get('latitude'))),
+            'longitude': self.coordinate(record.get('lng', record.get('longitude'))),
             'phone_number': record.get('phone', record.get('contact', '')),
             'source': 'Generic API',
             'has_bed': record.get('beds', True),
@@ -309,13 +470,13 @@ class Command(BaseCommand):
     def normalize_geojson_data(self, feature):
         """Normalize GeoJSON data format"""
         props = feature.get('properties', {})
-        coords = feature.get('geometry', {}).get('coordinates', [74.3587, 31.5204])
+        coords = (feature.get('geometry') or {}).get('coordinates') or []
         
         return {
             'name': props.get('name', props.get('NAME', 'Relief Center')),
             'address': props.get('address', props.get('ADDRESS', 'Pakistan')),
-            'latitude': float(coords[1]) if len(coords) > 1 else 31.5204,
-            'longitude': float(coords[0]) if len(coords) > 0 else 74.3587,
+            'latitude': self.coordinate(coords[1]) if len(coords) > 1 else None,
+            'longitude': self.coordinate(coords[0]) if len(coords) > 1 else None,
             'phone_number': props.get('phone', props.get('PHONE', '')),
             'source': 'GeoJSON Data',
             'has_bed': props.get('beds', True),
@@ -415,27 +576,6 @@ class Command(BaseCommand):
         
         return self.process_relief_data(sample_data, 'Pakistani Sample')
 
-    def fetch_dc_data(self):
-        """Fetch DC data (original functionality)"""
-        try:
-            self.stdout.write("Fetching DC shelter data...")
-            resp = requests.get(self.DC_API_URL, timeout=10)
-            resp.raise_for_status()
-            
-            data = resp.json()
-            dc_data = []
-            
-            for feature in data.get("features", []):
-                normalized = self.normalize_dc_data(feature)
-                if normalized:
-                    dc_data.append(normalized)
-            
-            return self.process_relief_data(dc_data, 'DC')
-            
-        except Exception as e:
-            self.stderr.write(self.style.ERROR(f"Error fetching DC data: {e}"))
-            return 0, 0, 0
-
     def normalize_dc_data(self, feature):
         """Normalize DC data to standard format"""
         props = feature.get("properties", {})
@@ -467,60 +607,52 @@ class Command(BaseCommand):
         }
 
     def process_relief_data(self, data_list, source_name):
-        """Process relief center data and update database"""
-        added = updated = skipped = 0
-        
-        for relief_data in data_list:
-            try:
-                # Ensure all required fields have default values
-                relief_data = self.ensure_complete_data(relief_data)
-                
-                # Use name and address as unique identifiers
-                lookup_fields = {
-                    'name': relief_data['name'],
-                    'address': relief_data['address']
-                }
-                
-                if self.force_update:
-                    Relief_Shelter.objects.filter(**lookup_fields).delete()
-                    obj = Relief_Shelter.objects.create(**relief_data)
-                    created = True
-                else:
-                    obj, created = Relief_Shelter.objects.update_or_create(
-                        **lookup_fields,
-                        defaults=relief_data
-                    )
-
-                if created:
-                    added += 1
-                    if self.verbose:
-                        self.stdout.write(f"  Added: {relief_data['name']}")
-                else:
-                    updated += 1
-                    if self.verbose:
-                        self.stdout.write(f"  Updated: {relief_data['name']}")
-
-            except Exception as e:
-                self.stderr.write(
-                    self.style.ERROR(f"Error processing {relief_data.get('name', 'Unknown')}: {e}")
-                )
-                skipped += 1
+        """Process relief center data and update database in bulk, matching on name and address"""
+        # Ensure all required fields have default values
+        result, skipped = self.upsert_rows([self.ensure_complete_data(relief_data) for relief_data in data_list])
+        added = len(result.created)
+        updated = len(result.updated)
 
         self.stdout.write(
             self.style.SUCCESS(
-                f"{source_name} - Added: {added}, Updated: {updated}, Skipped: {skipped}"
+                f"{source_name} - Added: {added}, Updated: {updated}, "
+                f"Unchanged: {len(result.unchanged)}, Skipped: {skipped}"
             )
         )
         
         return added, updated, skipped
 
+    def upsert_rows(self, data_list):
+        """Write complete shelter rows in bulk; returns the upsert result and the number of invalid rows skipped"""
+        rows = []
+        skipped = 0
+        for relief_data in data_list:
+            error = invalid_reason(relief_data)
+            if error:
+                self.stderr.write(
+                    self.style.ERROR(f"Error processing {relief_data.get('name', 'Unknown')}: {error}")
+                )
+                skipped += 1
+                continue
+            rows.append(relief_data)
+        
+        # Existing shelters are updated in place (--force-update rewrites every field),
+        # so primary keys and Algolia objectIDs stay stable
+        result = upsert_shelters(rows, force=self.force_update)
+        
+        if self.verbose:
+            for shelter in result.created:
+                self.stdout.write(f"  Added: {shelter.name}")
+            for shelter in result.updated:
+                self.stdout.write(f"  Updated: {shelter.name}")
+        
+        return result, skipped
+
     def ensure_complete_data(self, data):
         """Ensure all Relief_Shelter fields have appropriate default values"""
         defaults = {
             'name': 'Unknown Relief Center',
             'address': 'Pakistan',
-            'latitude': 31.5204,  # Pakistan center
-            'longitude': 74.3587,
             'phone_number': '',
             'email': '',
             'website': '',
@@ -547,12 +679,26 @@ class Command(BaseCommand):
             'available_spaces': 0,
             'distance': 0.0,
             'source': 'Unknown',
-            'last_updated': timezone.now(),
         }
         
         # Merge with provided data
         for key, default_value in defaults.items():
             if key not in data or data[key] is None:
                 data[key] = default_value
+
+        # Missing coordinates come from the town named in the address or name; a country
+        # or province centre would misplace the shelter, so those leave them unknown
+        if data.get('latitude') is None or data.get('longitude') is None:
+            place = geocode(f"{data['address']}, {data['name']}")
+            local = place is not None and place.kind in ('district', 'city')
+            data['latitude'] = place.latitude if local else None
+            data['longitude'] = place.longitude if local else None
         
-        return data
\ No newline at end of file
+        return data
+
+    @staticmethod
+    def coordinate(value):
+        """A latitude or longitude from a source field, None when missing"""
+        if value is None or value == '':
+            return None
+        return float(value)
\ No newline at end of file
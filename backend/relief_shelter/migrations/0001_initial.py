@@ -0,0 +1,52 @@
+# Generated by Django 5.2.4 on 2026-10-19 03:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Relief_Shelter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('address', models.CharField(max_length=255)),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+                ('distance', models.FloatField(blank=True, help_text='Distance in miles from user or central point', null=True)),
+                ('is_open', models.BooleanField(default=True)),
+                ('is_24_7', models.BooleanField(default=False)),
+                ('total_spaces', models.PositiveIntegerField(default=0)),
+                ('available_spaces', models.PositiveIntegerField(default=0)),
+                ('has_bed', models.BooleanField(default=False)),
+                ('has_food', models.BooleanField(default=False)),
+                ('has_water', models.BooleanField(default=False)),
+                ('has_medical', models.BooleanField(default=False)),
+                ('has_laundry', models.BooleanField(default=False)),
+                ('has_shower', models.BooleanField(default=False)),
+                ('has_case_management', models.BooleanField(default=False)),
+                ('has_mental_health', models.BooleanField(default=False)),
+                ('has_substance_abuse', models.BooleanField(default=False)),
+                ('accepts_families', models.BooleanField(default=False)),
+                ('accepts_men', models.BooleanField(default=False)),
+                ('accepts_women', models.BooleanField(default=False)),
+                ('accepts_pets', models.BooleanField(default=False)),
+                ('wheelchair_accessible', models.BooleanField(default=False)),
+                ('is_emergency', models.BooleanField(default=False)),
+                ('phone_number', models.CharField(blank=True, max_length=20)),
+                ('email', models.EmailField(blank=True, max_length=254, null=True)),
+                ('website', models.URLField(blank=True, null=True)),
+                ('hours_open', models.TimeField(blank=True, null=True)),
+                ('hours_close', models.TimeField(blank=True, null=True)),
+                ('source', models.CharField(default='Unknown', max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
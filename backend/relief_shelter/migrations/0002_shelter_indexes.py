@@ -0,0 +1,54 @@
+# Generated by Django 5.2.4 on 2026-10-19 03:42
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.utils import timezone
+
+
+def merge_duplicate_keys(apps, schema_editor):
+    """
+    Keep one shelter per (name, address) before the key becomes unique: the
+    oldest, which is the one fetches have been updating. The others' Algolia
+    records are queued for deletion since historical models send no signals
+    to the sync receivers.
+    """
+    shelters = apps.get_model('relief_shelter', 'Relief_Shelter')
+    changes = apps.get_model('sync', 'PendingIndexChange')
+    using = schema_editor.connection.alias
+    keys = (shelters.objects.using(using).order_by().values_list('name', 'address')
+            .annotate(count=Count('pk')).filter(count__gt=1))
+    removed = []
+    for name, address, _ in list(keys):
+        keep, *others = (shelters.objects.using(using).filter(name=name, address=address)
+                         .order_by('pk').values_list('pk', flat=True))
+        removed += others
+    now = timezone.now()
+    for start in range(0, len(removed), 500):
+        batch = removed[start:start + 500]
+        shelters.objects.using(using).filter(pk__in=batch).delete()
+        changes.objects.using(using).bulk_create(
+            [changes(model_label='relief_shelter.relief_shelter', object_pk=str(pk), action='delete', queued_at=now)
+             for pk in batch],
+            update_conflicts=True, unique_fields=['model_label', 'object_pk'],
+            update_fields=['action', 'fields', 'queued_at'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('relief_shelter', '0001_initial'),
+        ('sync', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='relief_shelter',
+            index=models.Index(fields=['updated_at'], name='relief_shelter_updated_idx'),
+        ),
+        migrations.RunPython(merge_duplicate_keys, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='relief_shelter',
+            constraint=models.UniqueConstraint(fields=('name', 'address'), name='unique_relief_shelter'),
+        ),
+    ]
@@ -3,8 +3,9 @@ from django.db import models
 class Relief_Shelter(models.Model):
     name = models.CharField(max_length=255)
     address = models.CharField(max_length=255)
-    latitude = models.FloatField()
-    longitude = models.FloatField()
+    # None when the source gives no coordinates and the address names no known place
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
 
     distance = models.FloatField(null=True, blank=True, help_text="Distance in miles from user or central point")
     is_open = models.BooleanField(default=True)
@@ -43,5 +44,15 @@ class Relief_Shelter(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            # The key sources are matched on (`relief_shelter.ingest.KEY_FIELDS`)
+            models.UniqueConstraint(fields=['name', 'address'], name='unique_relief_shelter'),
+        ]
+        indexes = [
+            # Changed since the last Algolia sync
+            models.Index(fields=['updated_at'], name='relief_shelter_updated_idx'),
+        ]
+
     def __str__(self):
         return self.name
@@ -0,0 +1,69 @@
+import re
+
+from sync.records import RecordSerializer
+
+# Coordinates embedded in an address string, e.g. "Main Road (31.52, 74.35)"
+COORDINATES_RE = re.compile(r'\((-?\d+\.?\d*),\s*(-?\d+\.?\d*)\)')
+
+
+class ReliefShelterSerializer(RecordSerializer):
+    value_fields = (
+        'pk', 'name', 'address', 'phone_number', 'has_bed', 'has_food', 'has_water', 'has_medical',
+        'is_24_7', 'is_open', 'total_spaces', 'available_spaces', 'latitude', 'longitude', 'updated_at',
+    )
+    dict_fields = (
+        'id', 'name', 'address', 'phone_number', 'has_bed', 'has_food', 'has_water', 'has_medical',
+        'is_24_7', 'is_open', 'total_spaces', 'available_spaces', 'latitude', 'longitude', 'updated_at',
+    )
+
+    def build_index_record(self, row):
+        (pk, name, address, phone_number, has_bed, has_food, has_water, has_medical,
+         is_24_7, is_open, total_spaces, available_spaces, latitude, longitude, _updated_at) = row
+
+        # Fallback coordinate parsing (if lat/lng missing but present in address string)
+        if (not latitude or not longitude) and address:
+            match = COORDINATES_RE.search(address)
+            if match:
+                latitude, longitude = float(match.group(1)), float(match.group(2))
+
+        return {
+            'name': name,
+            'address': address,
+            'phone_number': phone_number,
+            'has_bed': has_bed,
+            'has_food': has_food,
+            'has_water': has_water,
+            'has_medical': has_medical,
+            'is_24_7': is_24_7,
+            'is_open': is_open,
+            'total_spaces': total_spaces,
+            'available_spaces': available_spaces,
+            'latitude': latitude,
+            'longitude': longitude,
+            'objectID': pk,
+            'id': pk,
+        }
+
+    def build_dict(self, row):
+        (pk, name, address, phone_number, has_bed, has_food, has_water, has_medical,
+         is_24_7, is_open, total_spaces, available_spaces, latitude, longitude, updated_at) = row
+        return {
+            'id': pk,
+            'name': name,
+            'address': address,
+            'phone_number': phone_number,
+            'has_bed': has_bed,
+            'has_food': has_food,
+            'has_water': has_water,
+            'has_medical': has_medical,
+            'is_24_7': is_24_7,
+            'is_open': is_open,
+            'total_spaces': total_spaces,
+            'available_spaces': available_spaces,
+            'latitude': latitude,
+            'longitude': longitude,
+            'updated_at': updated_at.isoformat(),
+        }
+
+
+relief_shelter_serializer = ReliefShelterSerializer()
@@ -0,0 +1,8 @@
+from django.urls import path
+from .views import ReliefShelterChangesView, ReliefShelterDetailView, ReliefShelterListView
+
+urlpatterns = [
+    path('shelters/', ReliefShelterListView.as_view(), name='relief_shelter_list'),
+    path('shelters/changes/', ReliefShelterChangesView.as_view(), name='relief_shelter_changes'),
+    path('shelters/<int:pk>/', ReliefShelterDetailView.as_view(), name='relief_shelter_detail'),
+]
@@ -1,3 +1,24 @@
-from django.shortcuts import render
+from backend.api import RecordChangesView, RecordDetailView, RecordListView, parse_time
 
-# Create your views here.
+from .models import Relief_Shelter
+from .records import relief_shelter_serializer
+
+
+class ReliefShelterListView(RecordListView):
+    model = Relief_Shelter
+    serializer = relief_shelter_serializer
+    orderings = ('id', 'updated_at')
+    filters = {
+        'updated_since': ('updated_at__gt', parse_time),
+        'name': ('name', str),
+    }
+
+
+class ReliefShelterDetailView(RecordDetailView):
+    model = Relief_Shelter
+    serializer = relief_shelter_serializer
+
+
+class ReliefShelterChangesView(RecordChangesView):
+    model = Relief_Shelter
+    serializer = relief_shelter_serializer
@@ -0,0 +1,14 @@
+from django.contrib import admin
+
+from .models import JobRun, JobState
+
+
+@admin.register(JobState)
+class JobStateAdmin(admin.ModelAdmin):
+    list_display = ('name', 'last_outcome', 'last_started_at', 'last_duration', 'failures', 'next_run_at', 'locked_by')
+
+
+@admin.register(JobRun)
+class JobRunAdmin(admin.ModelAdmin):
+    list_display = ('job', 'started_at', 'duration', 'outcome', 'triggered_by')
+    list_filter = ('job', 'outcome')
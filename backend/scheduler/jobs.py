@@ -0,0 +1,242 @@
+"""
+Jobs run by `manage.py run_scheduler`, as configured in `settings.SCHEDULER`.
+
+A job is a management command run in-process at its `interval`, spread by
+`JITTER` so that jobs (and several schedulers) do not fire in lockstep. A
+job runs under its `JobState` lock, so two runs of it never overlap, even
+across processes or hosts sharing the database. The lock is refreshed while
+the command runs, however long it takes; only a lock left unrefreshed for
+`LOCK_TIMEOUT`, by a scheduler that died, is taken over.
+
+When a run succeeds, or finishes having reported errors on stderr (some
+sources failed, others were ingested), the jobs in its `then` list run next:
+ingest -> enrich -> index sync. A run that raises ends its chain. Every run
+that did not succeed doubles the wait before the job's next scheduled run,
+up to `MAX_BACKOFF`; the first successful run restores the interval.
+
+Each run is recorded as a `JobRun` (outcome, duration, error output).
+"""
+import io
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from .models import JobRun, JobState
+
+logger = logging.getLogger(__name__)
+
+# Characters of stderr output or traceback kept on a JobRun
+ERROR_LIMIT = 4000
+
+
+def scheduler_setting(name, default):
+    return getattr(settings, 'SCHEDULER', {}).get(name, default)
+
+
+class Job:
+    """A management command with its schedule; `interval` None for jobs that only run chained."""
+
+    def __init__(self, name, command, args=(), interval=None, then=()):
+        self.name = name
+        self.command = command
+        self.args = list(args)
+        self.interval = interval
+        self.then = list(then)
+
+    def __repr__(self):
+        return f'<Job {self.name}>'
+
+
+def load_jobs(config=None):
+    """The `settings.SCHEDULER['JOBS']` as a dict of name -> `Job`."""
+    if config is None:
+        config = scheduler_setting('JOBS', {})
+    jobs = {name: Job(name, **options) for name, options in config.items()}
+    for job in jobs.values():
+        unknown = [name for name in job.then if name not in jobs]
+        if unknown:
+            raise ImproperlyConfigured(f"Scheduler job {job.name} chains unknown jobs: {', '.join(unknown)}")
+    return jobs
+
+
+def owner_name():
+    """Identifies this process in the locks it holds."""
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def next_delay(interval, failures, jitter=None, max_backoff=None):
+    """
+    Seconds until the next scheduled run: the interval doubled for each
+    consecutive failure up to `max_backoff` (never below the interval), then
+    spread by +/- `jitter` of itself.
+    """
+    if jitter is None:
+        jitter = scheduler_setting('JITTER', 0.1)
+    if max_backoff is None:
+        max_backoff = scheduler_setting('MAX_BACKOFF', 6 * 60 * 60)
+    delay = interval
+    if failures:
+        delay = min(interval * 2 ** failures, max(max_backoff, interval))
+    return delay * (1 + random.uniform(-jitter, jitter))
+
+
+class _Tee(io.TextIOBase):
+    """Writes to a stream and keeps a copy."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.copy = io.StringIO()
+
+    def write(self, text):
+        self.copy.write(text)
+        self.stream.write(text)
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+class _Heartbeat(threading.Thread):
+    """Refreshes a job's lock every `interval` seconds until stopped."""
+
+    def __init__(self, name, owner, interval):
+        super().__init__(name=f'heartbeat {name}', daemon=True)
+        self.job = name
+        self.owner = owner
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(self.interval):
+                try:
+                    if not JobState.objects.refresh(self.job, self.owner):
+                        logger.warning("LOCK OF %s LOST BY %s", self.job, self.owner)
+                        return
+                except Exception:
+                    # Tried again on the next beat; the lock lasts several of them
+                    logger.warning("LOCK OF %s NOT REFRESHED", self.job, exc_info=True)
+                    close_old_connections()
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class Runner:
+    """Runs jobs under their locks, records the runs and follows the chains."""
+
+    def __init__(self, jobs, stdout, stderr, owner=None):
+        self.jobs = jobs
+        self.stdout = stdout
+        self.stderr = stderr
+        self.owner = owner or owner_name()
+        self.lock_timeout = scheduler_setting('LOCK_TIMEOUT', 60 * 60)
+        self.keep_runs = timedelta(days=scheduler_setting('KEEP_RUNS_DAYS', 30))
+
+    def due(self, now=None):
+        """Jobs with an interval whose next run is due, earliest first; never run ones count as due."""
+        now = now or timezone.now()
+        states = {state.name: state for state in JobState.objects.filter(name__in=list(self.jobs))}
+        due = []
+        for job in self.jobs.values():
+            state = states.get(job.name)
+            next_run = state and state.next_run_at
+            if job.interval and (next_run is None or next_run <= now):
+                due.append((next_run or now, job))
+        return [job for _, job in sorted(due, key=lambda item: item[0])]
+
+    def next_wakeup(self):
+        """When the earliest scheduled job is next due, None if no job has an interval."""
+        names = [job.name for job in self.jobs.values() if job.interval]
+        if not names:
+            return None
+        known = JobState.objects.filter(name__in=names).exclude(next_run_at=None)
+        if known.count() < len(names):
+            return timezone.now()
+        return min(known.values_list('next_run_at', flat=True))
+
+    def run_chain(self, job, triggered_by=''):
+        """Run `job`, then the jobs it chains to while runs do not raise; returns the `JobRun`s."""
+        runs = []
+        pending = [(job, triggered_by)]
+        while pending:
+            job, parent = pending.pop(0)
+            run = self.run(job, parent)
+            if run is None:
+                # Held by another run, which takes care of the chain
+                continue
+            runs.append(run)
+            if run.outcome != JobRun.FAILED:
+                pending += [(self.jobs[name], job.name) for name in job.then]
+        return runs
+
+    def run(self, job, triggered_by=''):
+        """Run one job under its lock; returns its `JobRun`, or None if another run holds the lock."""
+        close_old_connections()
+        if not JobState.objects.acquire(job.name, self.owner, self.lock_timeout):
+            self.stdout.write(f'{job.name}: already running, skipped')
+            if job.interval:
+                # Else the job stays due and the scheduler loop retries it without sleeping
+                JobState.objects.postpone_while_locked(job.name, self.lock_timeout)
+            return None
+
+        started_at = timezone.now()
+        started = time.monotonic()
+        stderr = _Tee(self.stderr)
+        self.stdout.write(f"{job.name}: running {' '.join([job.command] + job.args)}"
+                          + (f' (after {triggered_by})' if triggered_by else ''))
+        heartbeat = _Heartbeat(job.name, self.owner, self.lock_timeout / 4)
+        heartbeat.start()
+        try:
+            call_command(job.command, *job.args, stdout=self.stdout, stderr=stderr)
+        except (Exception, SystemExit):
+            # Some commands exit instead of raising CommandError
+            outcome, error = JobRun.FAILED, traceback.format_exc()
+        else:
+            error = stderr.copy.getvalue()
+            outcome = JobRun.ERROR if error.strip() else JobRun.OK
+        finally:
+            heartbeat.stop()
+            # A dropped connection must not keep the lock until it times out
+            close_old_connections()
+            JobState.objects.release(job.name, self.owner)
+        duration = time.monotonic() - started
+
+        run = JobRun.objects.create(
+            job=job.name, triggered_by=triggered_by, started_at=started_at,
+            duration=duration, outcome=outcome, error=error[-ERROR_LIMIT:],
+        )
+        self.record(job, run)
+        message = f'{job.name}: {outcome} in {duration:.1f}s'
+        if outcome == JobRun.OK:
+            self.stdout.write(message)
+        else:
+            self.stderr.write(message + (f'\n{error.strip()}' if outcome == JobRun.FAILED else ''))
+        return run
+
+    def record(self, job, run):
+        """Move the job's state on after a run: failure count, next scheduled run, latest outcome."""
+        state = JobState.objects.get(name=job.name)
+        state.failures = 0 if run.outcome == JobRun.OK else state.failures + 1
+        if job.interval:
+            state.next_run_at = timezone.now() + timedelta(seconds=next_delay(job.interval, state.failures))
+        state.last_started_at = run.started_at
+        state.last_duration = run.duration
+        state.last_outcome = run.outcome
+        state.save(update_fields=['failures', 'next_run_at', 'last_started_at', 'last_duration',
+                                  'last_outcome', 'updated_at'])
+        JobRun.objects.filter(job=job.name, started_at__lt=timezone.now() - self.keep_runs).delete()
@@ -0,0 +1,107 @@
+import signal
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Avg, Count, Max, Q
+from django.utils import timezone
+
+from scheduler.jobs import Runner, load_jobs
+from scheduler.models import JobRun, JobState
+
+# Longest sleep between two looks at the schedule, so that changes made by
+# other schedulers (or a manual --run) are picked up
+MAX_SLEEP = 60
+
+
+class Command(BaseCommand):
+    help = 'Run the ingestion jobs of settings.SCHEDULER at their intervals: ingest -> enrich -> index sync'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Run the jobs that are due (and their chains) once, then exit')
+        parser.add_argument('--run', metavar='JOB', action='append', default=[],
+                            help='Run this job and its chain now, whatever its schedule (repeatable)')
+        parser.add_argument('--status', action='store_true',
+                            help='Print the state of every job and its runs over the last 24 hours')
+
+    def handle(self, *args, **options):
+        jobs = load_jobs()
+        if not jobs:
+            raise CommandError('No jobs configured in settings.SCHEDULER')
+
+        if options['status']:
+            self.print_status(jobs)
+            return
+
+        runner = Runner(jobs, self.stdout, self.stderr)
+        if options['run']:
+            unknown = [name for name in options['run'] if name not in jobs]
+            if unknown:
+                raise CommandError(f"Unknown jobs: {', '.join(unknown)} (configured: {', '.join(jobs)})")
+            for name in options['run']:
+                runner.run_chain(jobs[name])
+            return
+
+        if options['once']:
+            for job in runner.due():
+                runner.run_chain(job)
+            return
+
+        self.loop(runner)
+
+    def loop(self, runner):
+        stopping = []
+
+        def stop(signum, frame):
+            # Let the running job finish and release its lock
+            self.stdout.write('Stopping after the current job')
+            stopping.append(signum)
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        self.stdout.write(f"Scheduler {runner.owner} started with jobs: {', '.join(runner.jobs)}")
+
+        while not stopping:
+            for job in runner.due():
+                if stopping:
+                    break
+                runner.run_chain(job)
+            wakeup = runner.next_wakeup()
+            sleep = MAX_SLEEP if wakeup is None else (wakeup - timezone.now()).total_seconds()
+            deadline = time.monotonic() + min(max(sleep, 0), MAX_SLEEP)
+            while not stopping and time.monotonic() < deadline:
+                time.sleep(min(1, deadline - time.monotonic()))
+
+    def print_status(self, jobs):
+        states = {state.name: state for state in JobState.objects.filter(name__in=list(jobs))}
+        since = timezone.now() - timedelta(hours=24)
+        recent = {
+            row['job']: row for row in JobRun.objects.filter(started_at__gte=since)
+            .values('job').order_by()
+            .annotate(runs=Count('pk'), failed=Count('pk', filter=~Q(outcome=JobRun.OK)),
+                      mean=Avg('duration'), longest=Max('duration'))
+        }
+
+        self.stdout.write(
+            f"{'job':<20} {'interval':>8} {'last run':<20} {'outcome':<7} {'took':>8} {'failures':>8} "
+            f"{'next run':<20} {'runs 24h':>8} {'failed':>6} {'mean':>8} {'max':>8}  locked by"
+        )
+        for job in jobs.values():
+            state = states.get(job.name) or JobState(name=job.name)
+            row = recent.get(job.name, {'runs': 0, 'failed': 0, 'mean': None, 'longest': None})
+            interval = f'{job.interval}s' if job.interval else '-'
+            self.stdout.write(
+                f"{job.name:<20} {interval:>8} {format_time(state.last_started_at):<20} "
+                f"{state.last_outcome or '-':<7} {format_seconds(state.last_duration):>8} {state.failures:>8} "
+                f"{format_time(state.next_run_at):<20} {row['runs']:>8} {row['failed']:>6} "
+                f"{format_seconds(row['mean']):>8} {format_seconds(row['longest']):>8}  {state.locked_by or '-'}"
+            )
+
+
+def format_seconds(seconds):
+    return '-' if seconds is None else f'{seconds:.1f}s'
+
+
+def format_time(value):
+    return '-' if value is None else timezone.localtime(value).strftime('%Y-%m-%d %H:%M:%S')
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.4 on 2026-10-19 03:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('locked_by', models.CharField(blank=True, default='', max_length=255)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('next_run_at', models.DateTimeField(blank=True, null=True)),
+                ('failures', models.PositiveIntegerField(default=0)),
+                ('last_started_at', models.DateTimeField(blank=True, null=True)),
+                ('last_duration', models.FloatField(blank=True, null=True)),
+                ('last_outcome', models.CharField(blank=True, default='', max_length=10)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='JobRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job', models.CharField(max_length=100)),
+                ('triggered_by', models.CharField(blank=True, default='', max_length=100)),
+                ('started_at', models.DateTimeField()),
+                ('duration', models.FloatField()),
+                ('outcome', models.CharField(choices=[('ok', 'OK'), ('error', 'Error'), ('failed', 'Failed')], max_length=10)),
+                ('error', models.TextField(blank=True, default='')),
+            ],
+            options={
+                'ordering': ['-started_at'],
+                'indexes': [models.Index(fields=['job', 'started_at'], name='scheduler_j_job_a7e7c3_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,81 @@
+from datetime import timedelta
+
+from django.db import models
+from django.db.models import F, Q
+from django.utils import timezone
+
+
+class JobStateManager(models.Manager):
+    def acquire(self, name, owner, timeout):
+        """
+        Take the lock of job `name` for `owner`; False if another run holds it.
+
+        The lock is one conditional UPDATE, so of two schedulers racing for it
+        exactly one wins. A lock older than `timeout` seconds was left by a run
+        that died and is taken over.
+        """
+        now = timezone.now()
+        self.get_or_create(name=name)
+        free = Q(locked_by='') | Q(locked_at__lt=now - timedelta(seconds=timeout))
+        return self.filter(free, name=name).update(locked_by=owner, locked_at=now) == 1
+
+    def refresh(self, name, owner):
+        """Restart the timeout of the lock `owner` holds on job `name`; False if it no longer holds it."""
+        return self.filter(name=name, locked_by=owner).update(locked_at=timezone.now()) == 1
+
+    def release(self, name, owner):
+        self.filter(name=name, locked_by=owner).update(locked_by='', locked_at=None)
+
+    def postpone_while_locked(self, name, timeout):
+        """
+        Move the next run of job `name`, held by another run, to when its lock
+        can be taken over. The holder reschedules the job when it finishes.
+        """
+        self.filter(name=name).exclude(locked_by='').update(
+            next_run_at=F('locked_at') + timedelta(seconds=timeout))
+
+
+class JobState(models.Model):
+    """Lock, schedule and latest outcome of a scheduler job."""
+    name = models.CharField(max_length=100, unique=True)
+    # Scheduler process running the job ("host:pid"), empty when idle
+    locked_by = models.CharField(max_length=255, blank=True, default='')
+    locked_at = models.DateTimeField(null=True, blank=True)
+    next_run_at = models.DateTimeField(null=True, blank=True)
+    # Consecutive runs that did not succeed; drives the backoff
+    failures = models.PositiveIntegerField(default=0)
+    last_started_at = models.DateTimeField(null=True, blank=True)
+    last_duration = models.FloatField(null=True, blank=True)
+    last_outcome = models.CharField(max_length=10, blank=True, default='')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = JobStateManager()
+
+    def __str__(self):
+        return f"{self.name} ({self.last_outcome or 'never run'})"
+
+
+class JobRun(models.Model):
+    """One run of a scheduler job, kept for monitoring."""
+    OK = 'ok'
+    # The command finished but reported errors (e.g. a source that could not be fetched)
+    ERROR = 'error'
+    # The command raised
+    FAILED = 'failed'
+    OUTCOMES = [(OK, 'OK'), (ERROR, 'Error'), (FAILED, 'Failed')]
+
+    job = models.CharField(max_length=100)
+    # Job whose success started this run, empty for scheduled and manual runs
+    triggered_by = models.CharField(max_length=100, blank=True, default='')
+    started_at = models.DateTimeField()
+    duration = models.FloatField()
+    outcome = models.CharField(max_length=10, choices=OUTCOMES)
+    # What the command wrote to stderr, or the traceback
+    error = models.TextField(blank=True, default='')
+
+    class Meta:
+        ordering = ['-started_at']
+        indexes = [models.Index(fields=['job', 'started_at'])]
+
+    def __str__(self):
+        return f"{self.job} @ {self.started_at}: {self.outcome} ({self.duration:.1f}s)"
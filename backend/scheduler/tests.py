@@ -0,0 +1,135 @@
+import io
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from scheduler.jobs import Job, Runner, _Heartbeat, next_delay
+from scheduler.models import JobRun, JobState
+
+
+def make_runner(*jobs):
+    return Runner({job.name: job for job in jobs}, io.StringIO(), io.StringIO(), owner='test:1')
+
+
+class JobLockTests(TestCase):
+    def test_lock_is_exclusive_until_released(self):
+        self.assertTrue(JobState.objects.acquire('fetch', 'a:1', timeout=60))
+        self.assertFalse(JobState.objects.acquire('fetch', 'b:2', timeout=60))
+        # Only the holder releases it
+        JobState.objects.release('fetch', 'b:2')
+        self.assertFalse(JobState.objects.acquire('fetch', 'b:2', timeout=60))
+        JobState.objects.release('fetch', 'a:1')
+        self.assertTrue(JobState.objects.acquire('fetch', 'b:2', timeout=60))
+
+    def test_abandoned_lock_is_taken_over(self):
+        JobState.objects.acquire('fetch', 'a:1', timeout=60)
+        JobState.objects.filter(name='fetch').update(locked_at=timezone.now() - timedelta(seconds=120))
+        self.assertTrue(JobState.objects.acquire('fetch', 'b:2', timeout=60))
+        self.assertEqual(JobState.objects.get(name='fetch').locked_by, 'b:2')
+
+
+class HeartbeatTests(TransactionTestCase):
+    def test_lock_of_a_long_run_is_not_taken_over(self):
+        ingest = Job('ingest', 'check', interval=60)
+        runner = make_runner(ingest)
+        runner.lock_timeout = 0.2
+        taken_over = []
+
+        def long_command(*args, **kwargs):
+            time.sleep(0.5)
+            taken_over.append(JobState.objects.acquire('ingest', 'other:2', timeout=0.2))
+
+        with mock.patch('scheduler.jobs.call_command', long_command):
+            run = runner.run(ingest)
+
+        self.assertEqual((run.outcome, taken_over), (JobRun.OK, [False]))
+        self.assertEqual(JobState.objects.get(name='ingest').locked_by, '')
+
+    def test_heartbeat_stops_once_the_lock_is_lost(self):
+        JobState.objects.acquire('ingest', 'test:1', timeout=60)
+        heartbeat = _Heartbeat('ingest', 'test:1', 0.01)
+        with self.assertLogs('scheduler.jobs', 'WARNING'):
+            heartbeat.start()
+            JobState.objects.filter(name='ingest').update(locked_by='other:2')
+            heartbeat.join(timeout=5)
+        self.assertFalse(heartbeat.is_alive())
+        self.assertEqual(JobState.objects.get(name='ingest').locked_by, 'other:2')
+
+
+class RunnerTests(TestCase):
+    def test_chain_runs_after_success(self):
+        ingest = Job('ingest', 'check', interval=60, then=['enrich'])
+        enrich = Job('enrich', 'check', then=['index'])
+        index = Job('index', 'check', interval=30)
+        runs = make_runner(ingest, enrich, index).run_chain(ingest)
+
+        self.assertEqual([(run.job, run.triggered_by, run.outcome) for run in runs], [
+            ('ingest', '', JobRun.OK), ('enrich', 'ingest', JobRun.OK), ('index', 'enrich', JobRun.OK),
+        ])
+        states = {state.name: state for state in JobState.objects.all()}
+        self.assertEqual(states['ingest'].locked_by, '')
+        self.assertIsNone(states['enrich'].next_run_at)
+        self.assertGreater(states['index'].next_run_at, timezone.now())
+
+    def test_failure_stops_chain_and_backs_off(self):
+        ingest = Job('ingest', 'check', args=['no_such_app'], interval=60, then=['index'])
+        index = Job('index', 'check')
+        runner = make_runner(ingest, index)
+
+        runs = runner.run_chain(ingest) + runner.run_chain(ingest)
+        self.assertEqual([run.outcome for run in runs], [JobRun.FAILED, JobRun.FAILED])
+        self.assertIn('no_such_app', runs[0].error)
+        state = JobState.objects.get(name='ingest')
+        self.assertEqual(state.failures, 2)
+        self.assertEqual(state.locked_by, '')
+        # 60s doubled twice, less at most 10% jitter
+        self.assertGreater(state.next_run_at, timezone.now() + timedelta(seconds=200))
+        self.assertFalse(JobRun.objects.filter(job='index').exists())
+
+        runner.jobs['ingest'] = Job('ingest', 'check', interval=60)
+        runner.run_chain(runner.jobs['ingest'])
+        self.assertEqual(JobState.objects.get(name='ingest').failures, 0)
+
+    def test_job_held_elsewhere_is_skipped(self):
+        ingest = Job('ingest', 'check', interval=60)
+        JobState.objects.acquire('ingest', 'other:2', timeout=60)
+        self.assertEqual(make_runner(ingest).run_chain(ingest), [])
+        self.assertFalse(JobRun.objects.exists())
+
+    def test_job_held_elsewhere_is_not_due_until_the_lock_times_out(self):
+        ingest = Job('ingest', 'check', interval=60)
+        JobState.objects.acquire('ingest', 'other:2', timeout=3600)
+        runner = make_runner(ingest)
+        runner.lock_timeout = 3600
+
+        self.assertIsNone(runner.run(ingest))
+
+        state = JobState.objects.get(name='ingest')
+        self.assertEqual(state.next_run_at, state.locked_at + timedelta(seconds=3600))
+        self.assertEqual(runner.due(), [])
+        self.assertGreater(runner.next_wakeup(), timezone.now() + timedelta(minutes=59))
+        # Its holder finishing reschedules it as usual
+        JobState.objects.release('ingest', 'other:2')
+        self.assertIsNotNone(runner.run(ingest))
+        self.assertLess(JobState.objects.get(name='ingest').next_run_at, timezone.now() + timedelta(seconds=70))
+
+    def test_due_jobs(self):
+        ingest = Job('ingest', 'check', interval=60)
+        index = Job('index', 'check', interval=30)
+        chained = Job('enrich', 'check')
+        runner = make_runner(ingest, index, chained)
+        self.assertEqual(runner.due(), [ingest, index])
+
+        runner.run(ingest)
+        self.assertEqual(runner.due(), [index])
+        self.assertEqual(runner.due(timezone.now() + timedelta(seconds=120)), [ingest, index])
+
+    def test_backoff_is_capped(self):
+        self.assertEqual(next_delay(60, 0, jitter=0), 60)
+        self.assertEqual(next_delay(60, 3, jitter=0, max_backoff=3600), 480)
+        self.assertEqual(next_delay(60, 10, jitter=0, max_backoff=3600), 3600)
+        # A job slower than the cap keeps its interval
+        self.assertEqual(next_delay(7200, 2, jitter=0, max_backoff=3600), 7200)
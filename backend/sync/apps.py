@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class SyncConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'sync'
+
+    def ready(self):
+        # Index classes are registered by algoliasearch_django's own ready(),
+        # so this app must come after it in INSTALLED_APPS.
+        from .signals import connect_signals
+        connect_signals()
@@ -0,0 +1,137 @@
+import statistics
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections, connections, transaction
+from django.utils import timezone
+
+from backend.database import sqlite_database
+from disasters.models import disaster_alerts
+
+
+def profiles(directory):
+    """
+    (name, database settings) to compare: Django's defaults against the
+    configured profile, on scratch databases (temporary files for SQLite, a
+    test database on the configured server otherwise).
+    """
+    default = settings.DATABASES['default']
+    if default['ENGINE'] == 'django.db.backends.sqlite3':
+        baseline = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': Path(directory) / 'rollback.sqlite3'}
+        profile = sqlite_database(Path(directory) / 'wal.sqlite3')
+        baseline['TEST'] = {'NAME': baseline['NAME']}
+        profile['TEST'] = {'NAME': profile['NAME']}
+        return [('sqlite, rollback journal', baseline), ('sqlite, WAL profile', profile)]
+
+    options = {key: value for key, value in default.get('OPTIONS', {}).items() if key != 'pool'}
+    baseline = dict(default, CONN_MAX_AGE=0, OPTIONS=options)
+    return [('connection per request', baseline), ('configured profile', dict(default))]
+
+
+class Command(BaseCommand):
+    help = 'Measure API-style reads while an ingest writes in batches, for the database profiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=10, help='Duration of each run (default: 10)')
+        parser.add_argument('--readers', type=int, default=4, help='Threads reading like API requests (default: 4)')
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Alerts written per ingest transaction (default: 2000)')
+        parser.add_argument('--rows', type=int, default=20000, help='Alerts in the table before the run (default: 20000)')
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'profile':<26} {'reads/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'errors':>7} {'writes/s':>9}"
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            for name, database in profiles(directory):
+                self.run_profile(name, database, options)
+
+    def run_profile(self, name, database, options):
+        alias = 'benchmark'
+        settings.DATABASES[alias] = connections.configure_settings({'default': {}, alias: database})[alias]
+        connection = connections[alias]
+        # A test database: scratch tables, migrated, dropped afterwards
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.fill(alias, options['rows'])
+            stats = self.measure(alias, options)
+        finally:
+            if getattr(connection, 'pool', None):
+                # Idle pooled connections would keep the test database from being dropped
+                connection.close_pool()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            del connections[alias]
+            del settings.DATABASES[alias]
+
+        latencies = sorted(stats['latencies']) or [0]
+        self.stdout.write(
+            f"{name:<26} {len(stats['latencies']) / options['seconds']:>8.0f} "
+            f"{statistics.median(latencies) * 1000:>8.1f} "
+            f"{latencies[int(len(latencies) * 0.95) - 1 if len(latencies) > 1 else 0] * 1000:>8.1f} "
+            f"{latencies[-1] * 1000:>8.1f} {stats['errors']:>7} {stats['written'] / options['seconds']:>9.0f}"
+        )
+
+    def fill(self, alias, rows):
+        now = timezone.now()
+        disaster_alerts.objects.using(alias).bulk_create([
+            disaster_alerts(title=f'Existing alert {i}', location=f'Place {i}', created_at=now - timedelta(minutes=i))
+            for i in range(rows)
+        ], batch_size=1000)
+
+    def measure(self, alias, options):
+        stop = threading.Event()
+        stats = {'latencies': [], 'errors': 0, 'written': 0}
+        lock = threading.Lock()
+
+        def ingest():
+            batch = 0
+            try:
+                while not stop.is_set():
+                    now = timezone.now()
+                    # One source's worth of rows per transaction, as bulk_upsert writes them
+                    with transaction.atomic(using=alias):
+                        created = disaster_alerts.objects.using(alias).bulk_create([
+                            disaster_alerts(title=f'Ingested alert {batch}-{i}', location=f'Place {i}', created_at=now)
+                            for i in range(options['batch_size'])
+                        ], batch_size=500)
+                        disaster_alerts.objects.using(alias).filter(pk__in=[alert.pk for alert in created[:500]]) \
+                            .update(population_affected=batch, updated_at=now)
+                    stats['written'] += len(created)
+                    batch += 1
+            finally:
+                connections.close_all()
+
+        def read():
+            try:
+                while not stop.is_set():
+                    # A request: the connection is reused or closed as CONN_MAX_AGE says, as in Django's handlers
+                    close_old_connections()
+                    started = time.perf_counter()
+                    try:
+                        list(disaster_alerts.objects.using(alias)[:50])
+                        disaster_alerts.objects.using(alias).count()
+                    except OperationalError:
+                        with lock:
+                            stats['errors'] += 1
+                        continue
+                    finally:
+                        close_old_connections()
+                    with lock:
+                        stats['latencies'].append(time.perf_counter() - started)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=ingest)]
+        threads += [threading.Thread(target=read) for _ in range(options['readers'])]
+        for thread in threads:
+            thread.start()
+        time.sleep(options['seconds'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return stats
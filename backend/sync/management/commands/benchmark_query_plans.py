@@ -0,0 +1,137 @@
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from disasters.enrichment import VALUE_FIELDS, pending_alerts
+from disasters.extraction import EXTRACTION_VERSION
+from disasters.models import EnrichmentWatermark, disaster_alerts
+from relief_shelter.models import Relief_Shelter
+from sync.models import PendingIndexChange
+
+# Share of the rows that are still missing a field, or changed since the last sync / enrichment
+MISSING_SHARE = 50
+
+
+FULL_SCAN, PK_WALK, INDEX, UNKNOWN = 'FULL SCAN', 'pk walk', 'index', 'unknown'
+
+
+def access(plan):
+    """
+    How a plan reads its rows: FULL_SCAN when a whole table is read, PK_WALK
+    when the table is walked in primary-key order from a key (a keyset page
+    filtering on unindexed columns reads as far as it takes to fill the page),
+    else INDEX.
+    """
+    lines = plan.splitlines()
+    if connection.vendor == 'sqlite':
+        # "SCAN table" reads every row, "SCAN table USING INDEX" walks an index in order
+        if any(' SCAN ' in f' {line} ' and ' USING ' not in line for line in lines):
+            return FULL_SCAN
+        if any('USING INTEGER PRIMARY KEY (rowid>' in line for line in lines):
+            return PK_WALK
+        return INDEX
+    if connection.vendor == 'postgresql':
+        return FULL_SCAN if any('Seq Scan' in line for line in lines) else INDEX
+    return UNKNOWN
+
+
+class Command(BaseCommand):
+    help = 'Show how the database runs the hot ingestion, enrichment and sync queries, flagging full table scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=50000, help='Alerts and shelters to create (default: 50000)')
+        parser.add_argument('--repeat', type=int, default=20, help='Runs of each query to time (default: 20)')
+        parser.add_argument('--plans', action='store_true', help='Print the full plan of every query')
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        # Synthetic rows are inserted in a transaction that is rolled back at the end
+        with transaction.atomic():
+            now = self.create_rows(rows)
+            self.analyze()
+            counts = Counter()
+            self.stdout.write(f"{'query':<44} {'access':<10} {'rows':>6} {'ms/query':>9}")
+            for name, queryset in self.queries(now, rows):
+                plan = queryset.explain()
+                how = access(plan)
+                counts[how] += 1
+                count = len(list(queryset))
+                started = time.perf_counter()
+                for _ in range(options['repeat']):
+                    list(queryset.all())
+                elapsed = (time.perf_counter() - started) / options['repeat']
+                self.stdout.write(f'{name:<44} {how:<10} {count:>6} {elapsed * 1000:>9.2f}')
+                if options['plans'] or how == FULL_SCAN:
+                    for line in plan.splitlines():
+                        self.stdout.write(f'    {line}')
+            transaction.set_rollback(True)
+
+        style = self.style.WARNING if counts[FULL_SCAN] else self.style.SUCCESS
+        self.stdout.write(style(
+            f'{counts[FULL_SCAN]} queries scan a whole table, {counts[PK_WALK]} walk the primary key '
+            f'({connection.vendor}, {rows} rows per table)'
+        ))
+
+    def create_rows(self, rows):
+        now = timezone.now()
+        disaster_alerts.objects.bulk_create([
+            disaster_alerts(
+                title=f'Green flood alert {i} in Pakistan', location=f'District {i % 500}, Pakistan',
+                disaster_type='FL', population_affected=i,
+                disaster_time=None if i % MISSING_SHARE == 0 else now - timedelta(hours=i),
+                latitude=None if i % MISSING_SHARE == 1 else 30.0, longitude=None if i % MISSING_SHARE == 1 else 70.0,
+                created_at=now - timedelta(minutes=i),
+                extraction_version=EXTRACTION_VERSION - (i % MISSING_SHARE == 2),
+            ) for i in range(rows)
+        ], batch_size=1000)
+        Relief_Shelter.objects.bulk_create([
+            Relief_Shelter(name=f'Relief Center {i}', address=f'Street {i}, Lahore, Pakistan', source='Benchmark')
+            for i in range(rows)
+        ], batch_size=1000)
+        # bulk_create keeps the given updated_at, so only a share counts as changed since the watermarks
+        for model in (disaster_alerts, Relief_Shelter):
+            last_unchanged = model.objects.order_by('-pk').values_list('pk', flat=True)[rows // MISSING_SHARE]
+            model.objects.filter(pk__lte=last_unchanged).update(updated_at=now - timedelta(days=1))
+        EnrichmentWatermark.objects.update_or_create(
+            model_label=disaster_alerts._meta.label_lower, defaults={'enriched_until': now - timedelta(hours=1)})
+        PendingIndexChange.objects.bulk_create([
+            PendingIndexChange(model_label=label, object_pk=str(i), queued_at=now - timedelta(seconds=i))
+            for label in ('disasters.disaster_alerts', 'relief_shelter.relief_shelter', 'other.model')
+            for i in range(rows // MISSING_SHARE)
+        ], batch_size=1000)
+        return now
+
+    def analyze(self):
+        # Fresh statistics, as a database that has been running a while would have
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute('ANALYZE')
+            elif connection.vendor == 'postgresql':
+                for model in (disaster_alerts, Relief_Shelter, PendingIndexChange):
+                    cursor.execute(f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
+
+    def queries(self, now, rows):
+        """(name, queryset) of each hot query, shaped as the code that runs it"""
+        batch = range(0, rows, max(rows // 500, 1))
+        titles = {f'Green flood alert {i} in Pakistan' for i in batch}
+        names = {f'Relief Center {i}' for i in batch}
+        keyset_page = lambda queryset: queryset.order_by('pk').filter(pk__gt=0).values_list(*VALUE_FIELDS)[:1000]
+        return [
+            ('fetch_disaster: alerts by key (500)', disaster_alerts.objects.filter(title__in=titles).order_by()),
+            ('fetch_relief: shelters by key (500)', Relief_Shelter.objects.filter(name__in=names).order_by()),
+            ('enrichment: pending alerts page', keyset_page(pending_alerts())),
+            ('fix_missing_data: alerts without coordinates',
+             keyset_page(disaster_alerts.objects.filter(latitude__isnull=True, longitude__isnull=True))),
+            ('fix_missing_data: alerts without time', keyset_page(disaster_alerts.objects.filter(disaster_time__isnull=True))),
+            ('latest alerts (default ordering)', disaster_alerts.objects.all()[:50]),
+            ('sync: alerts changed since watermark',
+             disaster_alerts.objects.filter(updated_at__gt=now - timedelta(hours=1)).order_by().values_list('pk', flat=True)),
+            ('sync: shelters changed since watermark',
+             Relief_Shelter.objects.filter(updated_at__gt=now - timedelta(hours=1)).order_by().values_list('pk', flat=True)),
+            ('sync: queued changes of a model',
+             PendingIndexChange.objects.filter(model_label='disasters.disaster_alerts', queued_at__lte=now)),
+        ]
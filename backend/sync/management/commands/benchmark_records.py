@@ -0,0 +1,74 @@
+import time
+from datetime import timedelta
+
+from algoliasearch_django import get_adapter
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from disasters.models import disaster_alerts
+from relief_shelter.models import Relief_Shelter
+from sync.records import dumps, orjson
+
+
+def sample_disaster(i):
+    now = timezone.now()
+    return disaster_alerts(
+        title=f'Green earthquake alert (Magnitude 4.{i % 10}M) in Papua New Guinea',
+        description=f'On 17/07/2025 09:04 UTC an earthquake affected {i} thousand people.',
+        location=f'41 km SW of Tari, Papua New Guinea ({-6.08 + i % 7}, 142.66)',
+        disaster_type='EQ', population_affected=i * 10,
+        disaster_time=now - timedelta(minutes=i), created_at=now,
+    )
+
+
+def sample_shelter(i):
+    return Relief_Shelter(
+        name=f'Benchmark Relief Center {i}', address=f'Street {i}, Lahore, Punjab, Pakistan',
+        latitude=31.5204, longitude=74.3587, phone_number='(042) 111-222-333',
+        has_bed=True, has_food=i % 2 == 0, has_water=True, total_spaces=200, available_spaces=i % 200,
+    )
+
+
+class Command(BaseCommand):
+    help = 'Measure records per second of the record serializers (instances, value tuples and JSON encoding)'
+
+    SAMPLES = {
+        disaster_alerts: sample_disaster,
+        Relief_Shelter: sample_shelter,
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=20000, help='Rows per model (default: 20000)')
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        self.stdout.write(f"JSON encoder: {'orjson' if orjson is not None else 'json (stdlib)'}")
+
+        # Synthetic rows are inserted in a transaction that is rolled back at the end.
+        with transaction.atomic():
+            for model, sample in self.SAMPLES.items():
+                model.objects.bulk_create([sample(i) for i in range(rows)], batch_size=1000)
+                self.benchmark(model, model.objects.order_by('pk')[:rows])
+            transaction.set_rollback(True)
+
+    def benchmark(self, model, queryset):
+        adapter = get_adapter(model)
+        serializer = adapter.serializer
+        instances = list(queryset)
+        count = len(instances)
+
+        results = [
+            ('prepare_record() on loaded instances', lambda: [adapter.prepare_record(i) for i in instances]),
+            ('ORM read + prepare_record()', lambda: [adapter.prepare_record(i) for i in queryset.all()]),
+            ('values_list() read + build', lambda: list(serializer.index_records(queryset.all()))),
+        ]
+        records = [adapter.prepare_record(i) for i in instances]
+        results.append(('JSON encoding', lambda: [dumps(record) for record in records]))
+
+        self.stdout.write(self.style.SUCCESS(f'{model._meta.label_lower} ({count} rows)'))
+        for name, run in results:
+            started = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'  {name:<40} {count / elapsed:>12,.0f} records/s')
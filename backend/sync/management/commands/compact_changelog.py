@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from algoliasearch_django import get_registered_model
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from sync.models import ChangeLog
+
+
+class Command(BaseCommand):
+    help = 'Compact the change feed log: keep the last change of each object, drop old deletes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', action='append', default=[],
+                            help='Only compact this model label, e.g. disasters.disaster_alerts (repeatable)')
+        parser.add_argument('--keep-days', type=int,
+                            default=settings.CHANGE_LOG.get('KEEP_DELETES_DAYS', 30),
+                            help='Days deletes stay in the feed (default: 30, 0 keeps them forever)')
+
+    def handle(self, *args, **options):
+        deletes_before = None
+        if options['keep_days']:
+            deletes_before = timezone.now() - timedelta(days=options['keep_days'])
+        for model in get_registered_model():
+            label = model._meta.label_lower
+            if options['model'] and label not in options['model']:
+                continue
+            removed = ChangeLog.objects.compact(model, deletes_before)
+            remaining = ChangeLog.objects.filter(model_label=label).count()
+            self.stdout.write(self.style.SUCCESS(f'{label}: removed {removed} changes, {remaining} left'))
@@ -0,0 +1,48 @@
+from algoliasearch.http.exceptions import AlgoliaException
+from algoliasearch_django import get_registered_model
+from django.core.management.base import BaseCommand
+
+from sync.services.reindex import Reindexer
+
+
+class Command(BaseCommand):
+    help = 'Rebuild Algolia indices into a temporary index and swap it in atomically (or upload only changed records)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', action='append', default=[],
+                            help='Only reindex this model label, e.g. relief_shelter.relief_shelter (repeatable)')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Rows read from the database per keyset page (default: 1000)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Records per Algolia batch request (default: 1000)')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Threads building and uploading records (default: 4)')
+        parser.add_argument('--changed-only', action='store_true',
+                            help='Upload only records whose content hash changed, straight to the live index')
+
+    def handle(self, *args, **options):
+        reindexer = Reindexer(
+            chunk_size=options['chunk_size'],
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+        )
+        for model in get_registered_model():
+            label = model._meta.label_lower
+            if options['model'] and label not in options['model']:
+                continue
+
+            self.stdout.write(f'Reindexing {label}...')
+            try:
+                stats = reindexer.reindex(model, changed_only=options['changed_only'])
+            except AlgoliaException as e:
+                # The live index is only replaced by the final move, so it is left untouched.
+                self.stderr.write(self.style.ERROR(f'Error reindexing {label}: {e}'))
+                continue
+
+            memory = f"{stats['peak_memory_mb']:.1f} MB" if stats['peak_memory_mb'] is not None else 'n/a'
+            self.stdout.write(self.style.SUCCESS(
+                f"{label} - Records: {stats['records']}, Uploaded: {stats['uploaded']}, "
+                f"Unchanged: {stats['unchanged']}, Deleted: {stats['deleted']}, Batches: {stats['batches']}, "
+                f"Time: {stats['seconds']:.2f}s ({stats['records_per_second']:.0f} records/s), "
+                f"Peak memory: {memory}"
+            ))
@@ -0,0 +1,68 @@
+import time
+
+from algoliasearch.http.exceptions import AlgoliaException
+from algoliasearch_django import get_adapter, get_registered_model
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from sync.services.replicas import ensure_replicas
+from sync.services.sync_engine import SyncEngine
+
+
+class Command(BaseCommand):
+    help = 'Push queued model changes to Algolia in batches (run once, or every --interval seconds)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', action='append', default=[],
+                            help='Only sync this model label, e.g. disasters.disaster_alerts (repeatable)')
+        parser.add_argument('--batch-size', type=int,
+                            default=settings.ALGOLIA.get('SYNC_BATCH_SIZE', 1000),
+                            help='Objects per Algolia batch request (default: 1000)')
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Keep running and flush every N seconds (default: run once)')
+        parser.add_argument('--full', action='store_true',
+                            help='Push every row, not only the rows changed since the last sync')
+
+    def handle(self, *args, **options):
+        engine = SyncEngine(batch_size=options['batch_size'])
+        models = [
+            model for model in get_registered_model()
+            if not options['model'] or model._meta.label_lower in options['model']
+        ]
+
+        for model in models:
+            self.ensure_replicas(engine, model)
+
+        while True:
+            for model in models:
+                self.flush(engine, model, options['full'])
+            if not options['interval']:
+                break
+            options['full'] = False
+            time.sleep(options['interval'])
+
+    def ensure_replicas(self, engine, model):
+        adapter = get_adapter(model)
+        try:
+            if ensure_replicas(engine.client, adapter):
+                self.stdout.write(f"Configured replicas of {adapter.index_name}: {', '.join(adapter.replicas)}")
+        except AlgoliaException as e:
+            self.stderr.write(self.style.ERROR(f'Error configuring replicas of {adapter.index_name}: {e}'))
+
+    def flush(self, engine, model, full):
+        label = model._meta.label_lower
+        started = time.monotonic()
+        try:
+            stats = engine.flush(model, full=full)
+        except AlgoliaException as e:
+            # Queued changes are kept, the next run will retry them.
+            self.stderr.write(self.style.ERROR(f'Error syncing {label}: {e}'))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{label} - Upserts: {stats['upserts']}, Partial: {stats['partial']}, "
+            f"Deletes: {stats['deletes']}, Skipped unchanged: {stats['unchanged']}, "
+            f"Algolia operations: {stats['upserts'] + stats['partial'] + stats['deletes']} "
+            f"in {stats['requests']} batches "
+            f"({time.monotonic() - started:.2f}s)"
+        ))
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.4 on 2026-10-19 03:42
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_label', models.CharField(max_length=100, unique=True)),
+                ('synced_until', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PendingIndexChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_label', models.CharField(max_length=100)),
+                ('object_pk', models.CharField(max_length=64)),
+                ('action', models.CharField(choices=[('upsert', 'Upsert'), ('delete', 'Delete')], default='upsert', max_length=10)),
+                ('fields', models.TextField(blank=True, default='', help_text='Comma separated changed fields, empty for a full record')),
+                ('queued_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('model_label', 'object_pk'), name='unique_pending_index_change')],
+            },
+        ),
+        migrations.CreateModel(
+            name='RecordHash',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_label', models.CharField(max_length=100)),
+                ('object_pk', models.CharField(max_length=64)),
+                ('hash', models.CharField(max_length=40)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('model_label', 'object_pk'), name='unique_record_hash')],
+            },
+        ),
+    ]
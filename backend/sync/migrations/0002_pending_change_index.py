@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-19 03:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sync', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pendingindexchange',
+            index=models.Index(fields=['model_label', 'queued_at'], name='pending_change_queued_idx'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.4 on 2026-10-19 04:00
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.utils import timezone
+
+# The models with a change feed when the log was introduced
+TRACKED_MODELS = [('disasters', 'disaster_alerts'), ('relief_shelter', 'Relief_Shelter')]
+
+
+def log_existing_objects(apps, schema_editor):
+    """
+    One upsert per existing object, so that reading the feed from the start
+    gives every object, not only those changed after this migration.
+    """
+    changes = apps.get_model('sync', 'ChangeLog')
+    using = schema_editor.connection.alias
+    now = timezone.now()
+    for app_label, model_name in TRACKED_MODELS:
+        model = apps.get_model(app_label, model_name)
+        label = model._meta.label_lower
+        pks = model.objects.using(using).order_by('pk').values_list('pk', flat=True)
+        batch = []
+        for pk in pks.iterator(chunk_size=2000):
+            batch.append(changes(model_label=label, object_pk=str(pk), action='upsert', changed_at=now))
+            if len(batch) == 2000:
+                changes.objects.using(using).bulk_create(batch)
+                batch = []
+        changes.objects.using(using).bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sync', '0002_pending_change_index'),
+        ('disasters', '0003_alert_type_index'),
+        ('relief_shelter', '0002_shelter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_label', models.CharField(max_length=100, unique=True)),
+                ('pruned_until', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('model_label', models.CharField(max_length=100)),
+                ('object_pk', models.CharField(max_length=64)),
+                ('action', models.CharField(choices=[('upsert', 'Upsert'), ('delete', 'Delete')], default='upsert', max_length=10)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['model_label', 'id'], name='change_log_feed_idx'), models.Index(fields=['model_label', 'object_pk', 'id'], name='change_log_object_idx')],
+            },
+        ),
+        migrations.RunPython(log_existing_objects, migrations.RunPython.noop),
+    ]
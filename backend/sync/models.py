@@ -0,0 +1,230 @@
+from django.db import connection, models, transaction
+from django.db.models import Exists, Max, OuterRef
+from django.utils import timezone
+
+
+class PendingIndexChangeManager(models.Manager):
+    def queue(self, model, pks, action='upsert', fields=None):
+        """
+        Record that the given primary keys of `model` need to be pushed to Algolia.
+
+        Repeated changes to the same object collapse into a single row, so an
+        object saved ten times between two flushes is uploaded once.
+        `fields` limits an upsert to a partial update of those model fields.
+        """
+        label = model._meta.label_lower
+        keys = list(dict.fromkeys(str(pk) for pk in pks if pk is not None))
+        fields = set(fields or ())
+        now = timezone.now()
+
+        with transaction.atomic():
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                existing = {
+                    change.object_pk: change
+                    for change in self.filter(model_label=label, object_pk__in=chunk)
+                }
+                to_create, to_update = [], []
+                for key in chunk:
+                    change = existing.get(key)
+                    if change is None:
+                        change = self.model(model_label=label, object_pk=key, action=action,
+                                            fields=','.join(sorted(fields)) if action == 'upsert' else '')
+                        to_create.append(change)
+                    else:
+                        change.merge(action, fields)
+                        to_update.append(change)
+                    change.queued_at = now
+
+                # A concurrent writer may have inserted the same key meanwhile;
+                # the newest action wins, which is what a flush needs anyway.
+                self.bulk_create(to_create, update_conflicts=True,
+                                 unique_fields=['model_label', 'object_pk'],
+                                 update_fields=['action', 'fields', 'queued_at'])
+                self.bulk_update(to_update, ['action', 'fields', 'queued_at'])
+
+            # Every change the index hears of is also one for the change feed
+            ChangeLog.objects.record(model, keys, action)
+
+
+class PendingIndexChange(models.Model):
+    """An object whose Algolia record is out of date, waiting for the next sync flush."""
+    ACTION_CHOICES = [
+        ('upsert', 'Upsert'),
+        ('delete', 'Delete'),
+    ]
+
+    model_label = models.CharField(max_length=100)
+    object_pk = models.CharField(max_length=64)
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES, default='upsert')
+    fields = models.TextField(blank=True, default='', help_text="Comma separated changed fields, empty for a full record")
+    queued_at = models.DateTimeField(default=timezone.now)
+
+    objects = PendingIndexChangeManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['model_label', 'object_pk'], name='unique_pending_index_change'),
+        ]
+        indexes = [
+            # What a flush picks up: a model's changes queued before it started
+            models.Index(fields=['model_label', 'queued_at'], name='pending_change_queued_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.action} {self.model_label}:{self.object_pk}"
+
+    @property
+    def changed_fields(self):
+        return set(filter(None, self.fields.split(',')))
+
+    def merge(self, action, fields):
+        """Coalesce a newer change for the same object into this one."""
+        if action == 'delete':
+            self.action, self.fields = 'delete', ''
+        elif self.action == 'delete' or not fields or not self.fields:
+            # Any full upsert (or a resurrected object) needs the whole record.
+            self.action, self.fields = 'upsert', ''
+        else:
+            self.fields = ','.join(sorted(self.changed_fields | set(fields)))
+
+
+class ChangeLogManager(models.Manager):
+    def record(self, model, pks, action='upsert'):
+        """Append a change of each primary key of `model` to the log, in one transaction."""
+        label = model._meta.label_lower
+        keys = list(dict.fromkeys(str(pk) for pk in pks if pk is not None))
+        if not keys:
+            return
+        now = timezone.now()
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                # Held until commit, so ids become visible in order and a reader
+                # can't move its cursor past a change still being written.
+                # SQLite transactions already take the database's write lock.
+                with connection.cursor() as cursor:
+                    cursor.execute(f'LOCK TABLE {connection.ops.quote_name(self.model._meta.db_table)} '
+                                   f'IN SHARE ROW EXCLUSIVE MODE')
+            self.bulk_create(
+                [self.model(model_label=label, object_pk=key, action=action, changed_at=now) for key in keys],
+                batch_size=500,
+            )
+
+    def compact(self, model, deletes_before=None):
+        """
+        Drop the changes of `model` that a later change of the same object
+        supersedes, and the deletes older than `deletes_before`. Returns the
+        number of rows removed.
+
+        Reading the compacted log from the start still gives the current state
+        of every object. A client whose cursor is older than a dropped delete
+        would miss it; `ChangeLogWatermark` records how far that goes.
+        """
+        label = model._meta.label_lower
+        changes = self.filter(model_label=label)
+        newer = self.filter(model_label=label, object_pk=OuterRef('object_pk'), id__gt=OuterRef('id'))
+        removed = changes.filter(Exists(newer)).delete()[0]
+        if deletes_before is not None:
+            # Never the newest change: SQLite would give its id to the next one, and cursors would skip that
+            newest = self.aggregate(newest=Max('id'))['newest']
+            expired = changes.filter(action='delete', changed_at__lt=deletes_before, id__lt=newest)
+            last = expired.aggregate(last=Max('id'))['last']
+            if last is not None:
+                with transaction.atomic():
+                    removed += expired.filter(id__lte=last).delete()[0]
+                    ChangeLogWatermark.objects.update_or_create(model_label=label, defaults={'pruned_until': last})
+        return removed
+
+
+class ChangeLog(models.Model):
+    """
+    One change of a tracked object; the id is the change feed's cursor. Only
+    the object's key is kept, clients read its current values.
+    """
+    ACTION_CHOICES = PendingIndexChange.ACTION_CHOICES
+
+    id = models.BigAutoField(primary_key=True)
+    model_label = models.CharField(max_length=100)
+    object_pk = models.CharField(max_length=64)
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES, default='upsert')
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    objects = ChangeLogManager()
+
+    class Meta:
+        indexes = [
+            # A page of the feed: a model's changes after a cursor
+            models.Index(fields=['model_label', 'id'], name='change_log_feed_idx'),
+            # Compaction: the later changes of an object
+            models.Index(fields=['model_label', 'object_pk', 'id'], name='change_log_object_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.id} {self.action} {self.model_label}:{self.object_pk}"
+
+
+class ChangeLogWatermark(models.Model):
+    """Last change id of a model whose deletes compaction has dropped; older cursors must resync."""
+    model_label = models.CharField(max_length=100, unique=True)
+    pruned_until = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.model_label} pruned until #{self.pruned_until}"
+
+
+class SyncWatermark(models.Model):
+    """Latest `updated_at` already pushed to Algolia for a model."""
+    model_label = models.CharField(max_length=100, unique=True)
+    synced_until = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.model_label} @ {self.synced_until}"
+
+
+class RecordHashManager(models.Manager):
+    def lookup(self, label, keys):
+        """Return {object_pk: hash} for the given keys of a model label."""
+        hashes = {}
+        keys = [str(key) for key in keys]
+        for start in range(0, len(keys), 500):
+            hashes.update(self.filter(model_label=label, object_pk__in=keys[start:start + 500])
+                          .values_list('object_pk', 'hash'))
+        return hashes
+
+    def store(self, label, hashes):
+        """Remember the hashes of records that were just uploaded."""
+        self.bulk_create(
+            [self.model(model_label=label, object_pk=str(key), hash=value) for key, value in hashes.items()],
+            batch_size=500, update_conflicts=True,
+            unique_fields=['model_label', 'object_pk'], update_fields=['hash'],
+        )
+
+    def forget(self, label, keys):
+        keys = [str(key) for key in keys]
+        for start in range(0, len(keys), 500):
+            self.filter(model_label=label, object_pk__in=keys[start:start + 500]).delete()
+
+    def replace(self, label, staging_label):
+        """Make the hashes stored under `staging_label` the current ones for `label`."""
+        with transaction.atomic():
+            self.filter(model_label=label).delete()
+            self.filter(model_label=staging_label).update(model_label=label)
+
+
+class RecordHash(models.Model):
+    """Content hash of the record currently stored in Algolia for an object."""
+    model_label = models.CharField(max_length=100)
+    object_pk = models.CharField(max_length=64)
+    hash = models.CharField(max_length=40)
+
+    objects = RecordHashManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['model_label', 'object_pk'], name='unique_record_hash'),
+        ]
+
+    def __str__(self):
+        return f"{self.model_label}:{self.object_pk} {self.hash}"
@@ -0,0 +1,56 @@
+import json
+from operator import attrgetter
+
+try:
+    import orjson
+except ImportError:  # optional, the stdlib encoder is used when it is not installed
+    orjson = None
+
+
+def dumps(obj, indent=None):
+    """Encode to a JSON string, with orjson when available (non-ASCII kept as is)."""
+    if orjson is not None and indent is None:
+        return orjson.dumps(obj).decode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, indent=indent, separators=None if indent else (',', ':'))
+
+
+class RecordSerializer:
+    """
+    Builds the dicts of one model from a fixed tuple of values.
+
+    `value_fields` lists what the builders need, primary key first, and
+    `dict_fields` the keys `build_dict()` returns. The same builders run on
+    a model instance (values read through one precompiled attrgetter) or on
+    `values_list(*value_fields)` rows, which skips model instantiation
+    entirely when walking a queryset.
+    """
+    value_fields = ('pk',)
+    dict_fields = ()
+
+    def __init__(self):
+        self.row = attrgetter(*self.value_fields)
+
+    def build_index_record(self, row):
+        """Algolia record for one row."""
+        raise NotImplementedError
+
+    def build_dict(self, row):
+        """API / dump representation of one row."""
+        raise NotImplementedError
+
+    def index_record(self, instance):
+        return self.build_index_record(self.row(instance))
+
+    def to_dict(self, instance):
+        return self.build_dict(self.row(instance))
+
+    def rows(self, queryset, chunk_size=2000):
+        return queryset.values_list(*self.value_fields).iterator(chunk_size=chunk_size)
+
+    def index_records(self, queryset):
+        build = self.build_index_record
+        return (build(row) for row in self.rows(queryset))
+
+    def dicts(self, queryset):
+        build = self.build_dict
+        return (build(row) for row in self.rows(queryset))
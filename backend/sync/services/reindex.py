@@ -0,0 +1,216 @@
+import logging
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from operator import attrgetter
+
+from algoliasearch_django import algolia_engine, get_adapter
+from django.utils import timezone
+
+from sync.models import PendingIndexChange, RecordHash, SyncWatermark
+from sync.services.replicas import configure_replicas
+from sync.services.sync_engine import RecordSource, record_hash
+
+logger = logging.getLogger(__name__)
+
+
+def peak_memory_mb():
+    """Peak resident memory of this process in MB, None where `resource` is unavailable (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def iter_keyset_chunks(queryset, chunk_size, pk_of=attrgetter('pk')):
+    """Yield lists of rows ordered by pk, one `WHERE pk > last` query per chunk."""
+    queryset = queryset.order_by('pk')
+    last_pk = None
+    while True:
+        page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        chunk = list(page[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last_pk = pk_of(chunk[-1])
+
+
+class Reindexer:
+    """
+    Rebuilds an index into `<index>_tmp` and moves it over the live index.
+
+    Rows are streamed in keyset-paginated chunks; building the records and
+    uploading them runs in a thread pool while the next chunk is read, and the
+    number of chunks in flight is bounded so memory does not grow with the table.
+    Searches keep hitting the old index until the final move, which Algolia
+    applies atomically; the sort replicas declared on the index class are
+    attached and configured afterwards.
+
+    With `changed_only`, records are compared with the content hashes stored
+    at their last upload and only the changed ones are written, straight to
+    the live index; objects that no longer exist are deleted from it.
+    """
+
+    def __init__(self, client=None, chunk_size=1000, batch_size=1000, workers=4):
+        self.client = client or algolia_engine.client
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        self.workers = workers
+
+    def reindex(self, model, changed_only=False):
+        adapter = get_adapter(model)
+        label = model._meta.label_lower
+        started_at = timezone.now()
+        started = time.monotonic()
+
+        settings = {key: value for key, value in (adapter.settings or {}).items() if key != 'replicas'}
+        if changed_only:
+            target, hash_label = adapter.index_name, label
+        else:
+            self.prepare_tmp_index(adapter, settings)
+            target, hash_label = adapter.tmp_index_name, f'{label}:tmp'
+            RecordHash.objects.filter(model_label=hash_label).delete()
+
+        queryset = adapter.get_queryset() if callable(adapter.get_queryset) else model.objects.all()
+        counts = {'records': 0, 'uploaded': 0, 'unchanged': 0, 'deleted': 0, 'batches': 0}
+        task_ids = []
+        in_flight = deque()
+
+        def collect(future):
+            result = future.result()
+            for key in ('records', 'uploaded', 'unchanged', 'batches'):
+                counts[key] += result[key]
+            task_ids.extend(result['task_ids'])
+            RecordHash.objects.store(hash_label, result['hashes'])
+            if result['deleted']:
+                counts['deleted'] += len(result['deleted'])
+                RecordHash.objects.forget(hash_label, result['deleted'])
+
+        source = RecordSource(adapter)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for chunk in iter_keyset_chunks(source.rows(queryset), self.chunk_size, source.pk):
+                known_hashes = RecordHash.objects.lookup(label, [source.pk(row) for row in chunk]) if changed_only else None
+                in_flight.append(pool.submit(self.index_chunk, source, chunk, target, known_hashes))
+                while len(in_flight) > self.workers * 2:
+                    collect(in_flight.popleft())
+            while in_flight:
+                collect(in_flight.popleft())
+
+        if changed_only:
+            counts['deleted'] += self.delete_missing(adapter, model, label, task_ids)
+            counts['batches'] = len(task_ids)
+
+        for task_id in task_ids:
+            self.client.wait_for_task(target, task_id)
+
+        if not changed_only:
+            resp = self.client.operation_index(
+                adapter.tmp_index_name, {'operation': 'move', 'destination': adapter.index_name}
+            )
+            self.client.wait_for_task(adapter.tmp_index_name, resp.task_id)
+            logger.info("MOVE INDEX %s TO %s", adapter.tmp_index_name, adapter.index_name)
+            RecordHash.objects.replace(label, hash_label)
+
+            # Replicas are attached to the new primary only after the move.
+            configure_replicas(self.client, adapter)
+
+        # The index now reflects every change made before the reindex started.
+        PendingIndexChange.objects.filter(model_label=label, queued_at__lte=started_at).delete()
+        SyncWatermark.objects.update_or_create(model_label=label, defaults={'synced_until': started_at})
+
+        elapsed = time.monotonic() - started
+        return {
+            **counts,
+            'seconds': elapsed,
+            'records_per_second': counts['records'] / elapsed if elapsed else 0.0,
+            'peak_memory_mb': peak_memory_mb(),
+        }
+
+    def prepare_tmp_index(self, adapter, settings):
+        """Start from an empty tmp index carrying the live rules, synonyms and our settings."""
+        tmp = adapter.tmp_index_name
+        if self.client.index_exists(tmp):
+            resp = self.client.delete_index(tmp)
+            self.client.wait_for_task(tmp, resp.task_id)
+
+        if self.client.index_exists(adapter.index_name):
+            resp = self.client.operation_index(
+                adapter.index_name,
+                {'operation': 'copy', 'destination': tmp, 'scope': ['rules', 'synonyms']},
+            )
+            self.client.wait_for_task(adapter.index_name, resp.task_id)
+
+        if settings:
+            resp = self.client.set_settings(tmp, settings)
+            self.client.wait_for_task(tmp, resp.task_id)
+            logger.debug("APPLY SETTINGS ON %s", tmp)
+
+    def index_chunk(self, source, rows, target, known_hashes=None):
+        """
+        Build the records of one chunk and upload them to `target`.
+
+        When `known_hashes` is given, records whose hash is unchanged are not
+        uploaded and previously indexed objects that should no longer be
+        indexed are deleted.
+        """
+        requests, hashes, deleted = [], {}, []
+        records = unchanged = 0
+        for row in rows:
+            key = str(source.pk(row))
+            record = source.build(row)
+            if record is None:
+                if known_hashes and key in known_hashes:
+                    requests.append({'action': 'deleteObject', 'body': {'objectID': key}})
+                    deleted.append(key)
+                continue
+            digest = record_hash(record)
+            records += 1
+            if known_hashes is not None and known_hashes.get(key) == digest:
+                unchanged += 1
+                continue
+            hashes[key] = digest
+            requests.append({'action': 'addObject' if known_hashes is None else 'updateObject', 'body': record})
+
+        task_ids = self.upload(target, requests)
+        return {
+            'records': records,
+            'uploaded': len(requests) - len(deleted),
+            'unchanged': unchanged,
+            'batches': len(task_ids),
+            'task_ids': task_ids,
+            'hashes': hashes,
+            'deleted': deleted,
+        }
+
+    def delete_missing(self, adapter, model, label, task_ids):
+        """Delete objects that have a stored hash but no row anymore; returns how many."""
+        pk_field = model._meta.pk
+        stored = RecordHash.objects.filter(model_label=label).values_list('object_pk', flat=True)
+        keys = list(stored.iterator())
+        missing = []
+        for start in range(0, len(keys), self.chunk_size):
+            chunk = keys[start:start + self.chunk_size]
+            existing = {
+                str(pk) for pk in
+                model.objects.filter(pk__in=[pk_field.to_python(key) for key in chunk]).values_list('pk', flat=True)
+            }
+            missing.extend(key for key in chunk if key not in existing)
+
+        task_ids.extend(self.upload(adapter.index_name, [
+            {'action': 'deleteObject', 'body': {'objectID': key}} for key in missing
+        ]))
+        RecordHash.objects.forget(label, missing)
+        return len(missing)
+
+    def upload(self, index_name, requests):
+        task_ids = []
+        for start in range(0, len(requests), self.batch_size):
+            batch = requests[start:start + self.batch_size]
+            resp = self.client.batch(index_name=index_name, batch_write_params={'requests': batch})
+            task_ids.append(resp.task_id)
+            logger.info("SAVE %d OBJECTS TO %s", len(batch), index_name)
+        return task_ids
@@ -0,0 +1,52 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Algolia's default ranking criteria, kept after the sort attributes of a replica
+DEFAULT_RANKING = ['typo', 'geo', 'words', 'filters', 'proximity', 'attribute', 'exact', 'custom']
+
+
+def replica_names(adapter):
+    """Index names of the replicas declared by an index class, e.g. `disaster_alerts_newest`."""
+    return [f'{adapter.index_name}_{suffix}' for suffix in getattr(adapter, 'replicas', {})]
+
+
+def replica_settings(adapter, sort):
+    """Primary settings with a ranking that sorts by `sort` first."""
+    settings = {
+        key: value for key, value in (adapter.settings or {}).items()
+        if key not in ('replicas', 'ranking', 'customRanking')
+    }
+    settings['ranking'] = list(sort) + DEFAULT_RANKING
+    return settings
+
+
+def configure_replicas(client, adapter):
+    """Attach the declared replicas to the primary index and apply their rankings."""
+    replicas = getattr(adapter, 'replicas', {})
+    if not replicas:
+        return
+
+    resp = client.set_settings(adapter.index_name, {'replicas': replica_names(adapter)})
+    client.wait_for_task(adapter.index_name, resp.task_id)
+    for name, sort in zip(replica_names(adapter), replicas.values()):
+        resp = client.set_settings(name, replica_settings(adapter, sort))
+        client.wait_for_task(name, resp.task_id)
+        logger.info("APPLY SETTINGS ON REPLICA %s", name)
+
+
+def ensure_replicas(client, adapter):
+    """Reconfigure the replicas if the live settings drifted from the index class; returns True if it did."""
+    replicas = getattr(adapter, 'replicas', {})
+    if not replicas:
+        return False
+    if client.index_exists(adapter.index_name):
+        current = client.get_settings(adapter.index_name).to_dict().get('replicas') or []
+        up_to_date = set(current) == set(replica_names(adapter)) and all(
+            client.get_settings(name).to_dict().get('ranking') == replica_settings(adapter, sort)['ranking']
+            for name, sort in zip(replica_names(adapter), replicas.values())
+        )
+        if up_to_date:
+            return False
+    configure_replicas(client, adapter)
+    return True
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import logging
+
+from algoliasearch_django import algolia_engine, get_adapter, get_registered_model
+from django.core.exceptions import FieldDoesNotExist
+from django.utils import timezone
+
+from sync.models import PendingIndexChange, RecordHash, SyncWatermark
+
+logger = logging.getLogger(__name__)
+
+
+def build_record(adapter, instance):
+    """Use the index class' own prepare_record() when it defines one."""
+    prepare_record = getattr(adapter, 'prepare_record', None)
+    if callable(prepare_record):
+        return prepare_record(instance)
+    return adapter.get_raw_record(instance)
+
+
+class RecordSource:
+    """
+    How to read the rows of an index and turn them into records.
+
+    Index classes with a `serializer` (and no `should_index`) are read as
+    `values_list()` tuples and never instantiate model objects; others go
+    through model instances and prepare_record() / get_raw_record().
+    """
+
+    def __init__(self, adapter):
+        self.adapter = adapter
+        serializer = getattr(adapter, 'serializer', None)
+        self.serializer = serializer if serializer is not None and not adapter._has_should_index() else None
+
+    def rows(self, queryset):
+        if self.serializer:
+            return queryset.values_list(*self.serializer.value_fields)
+        return queryset
+
+    def pk(self, row):
+        return row[0] if self.serializer else row.pk
+
+    def build(self, row):
+        """The record for a row, or None when the object must not be indexed."""
+        if self.serializer:
+            return self.serializer.build_index_record(row)
+        if not self.adapter._should_index(row):
+            return None
+        return build_record(self.adapter, row)
+
+
+def record_hash(record):
+    """Stable content hash of a record, independent of key order."""
+    payload = json.dumps(record, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def partial_record(adapter, record, fields):
+    """
+    Keep only the attributes of `record` affected by the changed model `fields`.
+
+    An attribute is affected when it has the field's name, is derived from it
+    (`disaster_time` -> `disaster_time_str`), or is listed for it in the index
+    class' `derived_fields`.
+    """
+    derived = getattr(adapter, 'derived_fields', {})
+    names = set(fields)
+    for field in fields:
+        names.update(derived.get(field, ()))
+    partial = {'objectID': record['objectID']}
+    for key, value in record.items():
+        if key in names or any(key.startswith(f'{name}_') for name in names):
+            partial[key] = value
+    return partial
+
+
+class SyncEngine:
+    """
+    Flushes queued changes to Algolia in batched write requests.
+
+    Changes come from two places: PendingIndexChange rows written by the
+    model signals, and rows whose `updated_at` is newer than the model's
+    SyncWatermark (covers bulk writes that never fire signals).
+
+    Records whose content hash matches the one stored at the last upload
+    are skipped, so re-saving an unchanged row costs no Algolia operation.
+    """
+
+    def __init__(self, batch_size=1000, client=None):
+        self.batch_size = batch_size
+        self.client = client or algolia_engine.client
+
+    def flush_all(self, full=False):
+        return {
+            model._meta.label_lower: self.flush(model, full=full)
+            for model in get_registered_model()
+        }
+
+    def flush(self, model, full=False):
+        adapter = get_adapter(model)
+        label = model._meta.label_lower
+        started = timezone.now()
+        stats = {'upserts': 0, 'partial': 0, 'deletes': 0, 'unchanged': 0, 'requests': 0}
+
+        changes = self.collect_changes(model, label, started, full)
+        keys = list(changes)
+        pk_field = model._meta.pk
+        source = RecordSource(adapter)
+
+        for start in range(0, len(keys), self.batch_size):
+            chunk = keys[start:start + self.batch_size]
+            rows = {
+                str(source.pk(row)): row
+                for row in source.rows(model.objects.filter(pk__in=[pk_field.to_python(key) for key in chunk]))
+            }
+            known_hashes = RecordHash.objects.lookup(label, chunk)
+            requests, new_hashes, deleted = [], {}, []
+            for key in chunk:
+                action, fields = changes[key]
+                record = source.build(rows[key]) if action != 'delete' and key in rows else None
+                if record is None:
+                    requests.append({'action': 'deleteObject', 'body': {'objectID': key}})
+                    deleted.append(key)
+                    stats['deletes'] += 1
+                    continue
+                digest = record_hash(record)
+                if known_hashes.get(key) == digest:
+                    stats['unchanged'] += 1
+                    continue
+                new_hashes[key] = digest
+                if fields and key in known_hashes:
+                    requests.append({'action': 'partialUpdateObject',
+                                     'body': partial_record(adapter, record, fields)})
+                    stats['partial'] += 1
+                else:
+                    requests.append({'action': 'updateObject', 'body': record})
+                    stats['upserts'] += 1
+
+            if requests:
+                self.client.batch(index_name=adapter.index_name,
+                                  batch_write_params={'requests': requests})
+                stats['requests'] += 1
+                logger.info("SYNC %d OBJECTS TO %s", len(requests), adapter.index_name)
+            RecordHash.objects.store(label, new_hashes)
+            RecordHash.objects.forget(label, deleted)
+
+            # Changes queued again while we were flushing stay for the next run.
+            PendingIndexChange.objects.filter(
+                model_label=label, object_pk__in=chunk, queued_at__lte=started
+            ).delete()
+
+        SyncWatermark.objects.update_or_create(model_label=label, defaults={'synced_until': started})
+        return stats
+
+    def collect_changes(self, model, label, started, full=False):
+        """Return {object_pk: (action, changed_fields)} with one entry per object."""
+        changes = {
+            change.object_pk: (change.action, change.changed_fields)
+            for change in PendingIndexChange.objects.filter(model_label=label, queued_at__lte=started)
+        }
+
+        try:
+            model._meta.get_field('updated_at')
+        except FieldDoesNotExist:
+            return changes
+
+        watermark = SyncWatermark.objects.filter(model_label=label).first()
+        if full:
+            rows = model.objects.all()
+        elif watermark and watermark.synced_until:
+            rows = model.objects.filter(updated_at__gt=watermark.synced_until)
+        else:
+            # First run: start tracking from now, use --full (or a reindex) to backfill.
+            return changes
+
+        # Unordered: the default ordering would walk that index instead of the one on updated_at
+        for pk in rows.order_by().values_list('pk', flat=True).iterator():
+            # A queued change already says which fields changed: `auto_now` moves
+            # `updated_at` on every save, so the rows it covers are found here too.
+            # The other rows changed outside the signals, we cannot tell which fields.
+            changes.setdefault(str(pk), ('upsert', set()))
+        return changes
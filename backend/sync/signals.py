@@ -0,0 +1,22 @@
+from algoliasearch_django import get_registered_model
+from django.db.models.signals import post_delete, post_save
+
+from .models import PendingIndexChange
+
+
+def queue_saved_instance(sender, instance, update_fields=None, **kwargs):
+    """Queue a saved object for the next sync instead of writing to Algolia in the request."""
+    PendingIndexChange.objects.queue(sender, [instance.pk], fields=update_fields)
+
+
+def queue_deleted_instance(sender, instance, **kwargs):
+    PendingIndexChange.objects.queue(sender, [instance.pk], action='delete')
+
+
+def connect_signals():
+    """Track changes on every model registered with algoliasearch_django."""
+    for model in get_registered_model():
+        post_save.connect(queue_saved_instance, sender=model,
+                          dispatch_uid=f'sync_save_{model._meta.label_lower}')
+        post_delete.connect(queue_deleted_instance, sender=model,
+                            dispatch_uid=f'sync_delete_{model._meta.label_lower}')
@@ -0,0 +1,463 @@
+import asyncio
+import json
+import re
+import threading
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from algoliasearch.http.hosts import Host, HostsCollection
+from asgiref.sync import sync_to_async
+from algoliasearch.search.client import SearchClientSync
+from algoliasearch.search.config import SearchConfig
+from datetime import timedelta
+
+from django.test import AsyncClient, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from backend.push import get_hub
+from disasters.models import disaster_alerts
+from disasters.records import disaster_serializer
+from relief_shelter.models import Relief_Shelter
+from sync.models import ChangeLog, PendingIndexChange, SyncWatermark
+from sync.services.reindex import Reindexer
+from sync.services.sync_engine import SyncEngine
+
+
+class FakeAlgoliaHandler(BaseHTTPRequestHandler):
+    """Implements the handful of Algolia REST endpoints the sync tooling uses."""
+    routes = [
+        ('GET', r'/1/indexes/(?P<index>[^/]+)/settings', 'get_settings'),
+        ('PUT', r'/1/indexes/(?P<index>[^/]+)/settings', 'set_settings'),
+        ('POST', r'/1/indexes/(?P<index>[^/]+)/batch', 'batch'),
+        ('POST', r'/1/indexes/(?P<index>[^/]+)/operation', 'operation'),
+        ('GET', r'/1/indexes/(?P<index>[^/]+)/task/(?P<task>\d+)', 'get_task'),
+        ('DELETE', r'/1/indexes/(?P<index>[^/]+)', 'delete_index'),
+    ]
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_PUT(self):
+        self.dispatch('PUT')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def do_DELETE(self):
+        self.dispatch('DELETE')
+
+    def dispatch(self, method):
+        path = self.path.split('?')[0]
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'{}')
+        for route_method, pattern, name in self.routes:
+            match = re.fullmatch(pattern, path)
+            if route_method == method and match:
+                with self.server.lock:
+                    self.server.calls.append((name, match['index']))
+                    status, payload = getattr(self.server, name)(body, **match.groupdict())
+                break
+        else:
+            status, payload = 404, {'message': 'Not found', 'status': 404}
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class FakeAlgoliaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeAlgoliaHandler)
+        self.lock = threading.Lock()
+        self.indices = {}
+        self.calls = []
+        self.task_id = 0
+
+    def task(self, **extra):
+        self.task_id += 1
+        return 200, {'taskID': self.task_id, **extra}
+
+    def index(self, name):
+        return self.indices.setdefault(name, {'objects': {}, 'settings': {}})
+
+    def get_settings(self, body, index):
+        if index not in self.indices:
+            return 404, {'message': 'Index does not exist', 'status': 404}
+        return 200, self.indices[index]['settings']
+
+    def set_settings(self, body, index):
+        self.index(index)['settings'].update(body)
+        return self.task(updatedAt='2025-01-01T00:00:00Z')
+
+    def batch(self, body, index):
+        objects = self.index(index)['objects']
+        for request in body['requests']:
+            object_id = str(request['body']['objectID'])
+            if request['action'] == 'deleteObject':
+                objects.pop(object_id, None)
+            elif request['action'] == 'partialUpdateObject':
+                objects.setdefault(object_id, {'objectID': object_id}).update(request['body'])
+            else:
+                objects[object_id] = request['body']
+        return self.task(objectIDs=[str(r['body']['objectID']) for r in body['requests']])
+
+    def operation(self, body, index):
+        source = self.index(index)
+        if body['operation'] == 'move':
+            self.indices[body['destination']] = self.indices.pop(index)
+        else:
+            destination = self.index(body['destination'])
+            if 'settings' in body.get('scope', ['settings']):
+                destination['settings'] = dict(source['settings'])
+        return self.task(updatedAt='2025-01-01T00:00:00Z')
+
+    def delete_index(self, body, index):
+        self.indices.pop(index, None)
+        return self.task(deletedAt='2025-01-01T00:00:00Z')
+
+    def get_task(self, body, index, task):
+        return 200, {'status': 'published', 'pendingTask': False}
+
+
+class FakeAlgoliaTestCase(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = FakeAlgoliaServer()
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        config = SearchConfig('test-app', 'test-key')
+        config.hosts = HostsCollection([Host('127.0.0.1', scheme='http', port=cls.server.server_address[1])])
+        cls.algolia_client = SearchClientSync(config=config)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+
+class ReindexTests(FakeAlgoliaTestCase):
+    def setUp(self):
+        self.server.indices.clear()
+        self.server.calls.clear()
+        for i in range(7):
+            Relief_Shelter.objects.create(name=f'Shelter {i}', address=f'Street {i}',
+                                          latitude=31.5, longitude=74.3, available_spaces=i)
+
+    def test_streams_rows_into_tmp_index_and_moves_it_live(self):
+        stats = Reindexer(client=self.algolia_client, chunk_size=3, batch_size=2, workers=2).reindex(Relief_Shelter)
+
+        self.assertEqual(stats['records'], 7)
+        self.assertEqual(stats['batches'], 5)  # chunks of 3/3/1 rows, uploaded 2 at a time
+        self.assertNotIn('Relief_Shelter_tmp', self.server.indices)
+        live = self.server.indices['Relief_Shelter']
+        self.assertEqual(len(live['objects']), 7)
+        self.assertEqual(live['settings']['customRanking'], ['desc(available_spaces)', 'asc(total_spaces)'])
+        uploads = {index for name, index in self.server.calls if name == 'batch'}
+        self.assertEqual(uploads, {'Relief_Shelter_tmp'})
+
+    def test_reindex_attaches_sort_replicas(self):
+        Reindexer(client=self.algolia_client).reindex(Relief_Shelter)
+
+        live = self.server.indices['Relief_Shelter']
+        self.assertEqual(live['settings']['replicas'],
+                         ['Relief_Shelter_most_capacity', 'Relief_Shelter_most_available'])
+        replica = self.server.indices['Relief_Shelter_most_capacity']['settings']
+        self.assertEqual(replica['ranking'][:2], ['desc(total_spaces)', 'desc(available_spaces)'])
+        self.assertEqual(replica['searchableAttributes'], live['settings']['searchableAttributes'])
+        self.assertNotIn('customRanking', replica)
+
+    def test_reindex_drops_stale_objects_and_resets_sync_state(self):
+        self.server.index('Relief_Shelter')['objects']['999'] = {'objectID': '999'}
+
+        Reindexer(client=self.algolia_client).reindex(Relief_Shelter)
+
+        self.assertNotIn('999', self.server.indices['Relief_Shelter']['objects'])
+        self.assertFalse(PendingIndexChange.objects.filter(model_label='relief_shelter.relief_shelter').exists())
+        self.assertTrue(SyncWatermark.objects.filter(model_label='relief_shelter.relief_shelter').exists())
+
+    def test_changed_only_uploads_just_the_modified_records(self):
+        reindexer = Reindexer(client=self.algolia_client)
+        reindexer.reindex(Relief_Shelter)
+        shelter = Relief_Shelter.objects.order_by('pk').first()
+        shelter.available_spaces = 42
+        shelter.save()
+        Relief_Shelter.objects.order_by('pk').last().delete()
+        self.server.calls.clear()
+
+        stats = reindexer.reindex(Relief_Shelter, changed_only=True)
+
+        self.assertEqual((stats['uploaded'], stats['unchanged'], stats['deleted']), (1, 5, 1))
+        live = self.server.indices['Relief_Shelter']['objects']
+        self.assertEqual(live[str(shelter.pk)]['available_spaces'], 42)
+        self.assertEqual(len(live), 6)
+        self.assertNotIn('Relief_Shelter_tmp', {index for name, index in self.server.calls})
+
+
+class SyncEngineTests(FakeAlgoliaTestCase):
+    def setUp(self):
+        self.server.indices.clear()
+        self.server.calls.clear()
+        self.shelters = [Relief_Shelter.objects.create(name=f'Shelter {i}', address=f'Street {i}') for i in range(3)]
+        Reindexer(client=self.algolia_client).reindex(Relief_Shelter)
+        self.engine = SyncEngine(client=self.algolia_client)
+        self.live = self.server.indices['Relief_Shelter']['objects']
+
+    def test_changes_to_an_object_are_coalesced(self):
+        shelter = self.shelters[0]
+        shelter.save(update_fields=['available_spaces', 'updated_at'])
+        shelter.save(update_fields=['total_spaces', 'updated_at'])
+        change = PendingIndexChange.objects.get(object_pk=str(shelter.pk))
+        self.assertEqual((change.action, change.changed_fields), ('upsert', {'available_spaces', 'total_spaces', 'updated_at'}))
+
+        shelter.save()
+        self.assertEqual(PendingIndexChange.objects.get(object_pk=str(shelter.pk)).changed_fields, set())
+        pk = shelter.pk
+        shelter.delete()
+        self.assertEqual(PendingIndexChange.objects.get(object_pk=str(pk)).action, 'delete')
+
+    def test_saved_fields_are_sent_as_a_partial_update(self):
+        shelter = self.shelters[0]
+        shelter.available_spaces = 42
+        shelter.save(update_fields=['available_spaces', 'updated_at'])
+
+        stats = self.engine.flush(Relief_Shelter)
+
+        self.assertEqual((stats['partial'], stats['upserts'], stats['deletes']), (1, 0, 0))
+        self.assertEqual(self.live[str(shelter.pk)]['available_spaces'], 42)
+        self.assertEqual(self.live[str(shelter.pk)]['name'], 'Shelter 0')
+        self.assertFalse(PendingIndexChange.objects.exists())
+
+    def test_deleted_objects_are_removed(self):
+        pk = self.shelters[1].pk
+        self.shelters[1].delete()
+
+        stats = self.engine.flush(Relief_Shelter)
+
+        self.assertEqual((stats['deletes'], stats['upserts']), (1, 0))
+        self.assertNotIn(str(pk), self.live)
+        self.assertEqual(len(self.live), 2)
+        self.assertFalse(PendingIndexChange.objects.exists())
+
+
+class ChangeFeedTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.shelters = [Relief_Shelter.objects.create(name=f'Shelter {i}', address=f'Street {i}') for i in range(3)]
+
+    def changes(self, since=None, **params):
+        if since is not None:
+            params['since'] = since
+        return self.client.get('/api/shelters/changes/', params)
+
+    def test_returns_each_change_after_the_cursor_once(self):
+        cursor = self.changes().json()['cursor']
+        first, second, third = self.shelters
+        second_pk = second.pk
+        first.available_spaces = 5
+        first.save()
+        first.available_spaces = 6
+        first.save()
+        second.delete()
+
+        page = self.changes(cursor, fields='id,available_spaces').json()
+
+        self.assertEqual(page['changes'], [
+            {'action': 'upsert', 'id': first.pk, 'record': {'id': first.pk, 'available_spaces': 6}},
+            {'action': 'delete', 'id': second_pk},
+        ])
+        self.assertEqual(self.changes(page['cursor']).json()['changes'], [])
+
+    def test_compaction_keeps_a_snapshot_and_expires_old_cursors(self):
+        old_cursor = self.changes().json()['cursor']
+        self.shelters[0].save()
+        self.shelters[1].delete()
+        ChangeLog.objects.filter(action='delete').update(changed_at=timezone.now() - timedelta(days=60))
+        Relief_Shelter.objects.create(name='Shelter 3', address='Street 3')
+
+        ChangeLog.objects.compact(Relief_Shelter, deletes_before=timezone.now() - timedelta(days=30))
+
+        snapshot = self.changes(limit=2).json()
+        ids = [change['id'] for change in snapshot['changes']]
+        ids += [change['id'] for change in self.client.get(snapshot['next']).json()['changes']]
+        self.assertEqual(sorted(ids), sorted(Relief_Shelter.objects.values_list('pk', flat=True)))
+        self.assertEqual(self.changes(old_cursor).status_code, 410)
+
+
+@override_settings(PUSH={'POLL_INTERVAL': 0.01, 'HEARTBEAT': 0.05, 'QUEUE_SIZE': 10, 'MAX_FAILURES': 2})
+class AlertStreamTests(TestCase):
+    async def open_stream(self, **params):
+        response = await AsyncClient().get('/api/disasters/stream/', params)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+        self.assertEqual(await self.next_event(stream), 'retry: 3000\n\n')
+        return stream
+
+    async def next_event(self, stream):
+        """The next event of the stream, keep-alives skipped; None once it has ended."""
+        while True:
+            try:
+                event = (await asyncio.wait_for(anext(stream), 5)).decode()
+            except StopAsyncIteration:
+                return None
+            if not event.startswith(':'):
+                return event
+
+    def data(self, event):
+        return json.loads(event.split('data: ', 1)[1])
+
+    async def close_hub(self):
+        hub = get_hub(disaster_alerts, disaster_serializer)
+        hub.close()
+        if hub.task:
+            await hub.task
+
+    def create_alert(self, title, **fields):
+        return sync_to_async(disaster_alerts.objects.create)(title=title, location=title, **fields)
+
+    async def test_saved_alert_is_pushed(self):
+        stream = await self.open_stream(fields='id,title')
+        alert = await self.create_alert('Flood')
+
+        event = await self.next_event(stream)
+
+        self.assertIn('event: upsert\n', event)
+        self.assertEqual(self.data(event), {'action': 'upsert', 'id': alert.pk,
+                                            'record': {'id': alert.pk, 'title': 'Flood'}})
+        await self.close_hub()
+
+    async def test_only_matching_alerts_are_pushed(self):
+        stream = await self.open_stream(type='FL', near='31.5,74.3', radius_km='50')
+        await self.create_alert('Far flood', disaster_type='FL', latitude=40.0, longitude=74.3)
+        await self.create_alert('Earthquake', disaster_type='EQ', latitude=31.5, longitude=74.3)
+        near = await self.create_alert('Near flood', disaster_type='FL', latitude=31.6, longitude=74.3)
+
+        self.assertEqual(self.data(await self.next_event(stream))['id'], near.pk)
+        await self.close_hub()
+
+    async def test_reconnecting_client_gets_the_missed_changes(self):
+        first = await self.create_alert('First')
+        cursor = await sync_to_async(lambda: ChangeLog.objects.get(object_pk=str(first.pk)).id)()
+        second = await self.create_alert('Second')
+
+        stream = await self.open_stream(since=f'{cursor}.0')
+
+        self.assertEqual(self.data(await self.next_event(stream))['id'], second.pk)
+        await self.close_hub()
+
+    async def test_client_that_falls_behind_is_disconnected(self):
+        stream = await self.open_stream()
+        for i in range(20):
+            await self.create_alert(f'Alert {i}')
+
+        events = []
+        while (event := await self.next_event(stream)) is not None:
+            events.append(event)
+
+        # The queue's 10, then the stream ends
+        self.assertEqual(len(events), 10)
+        self.assertFalse(get_hub(disaster_alerts, disaster_serializer).subscriptions)
+        await self.close_hub()
+
+    async def test_failed_reads_are_retried_then_streams_end(self):
+        stream = await self.open_stream()
+        hub = get_hub(disaster_alerts, disaster_serializer)
+        poll = hub.poll
+        failures = iter([True, False])
+        with mock.patch.object(hub, 'poll', side_effect=lambda position: (
+                poll(position) if not next(failures, False) else 1 / 0)):
+            with self.assertLogs('backend.push', 'WARNING'):
+                alert = await self.create_alert('Flood')
+                self.assertEqual(self.data(await self.next_event(stream))['id'], alert.pk)
+
+        with mock.patch.object(hub, 'poll', side_effect=ConnectionError), self.assertLogs('backend.push', 'ERROR'):
+            self.assertIsNone(await self.next_event(stream))
+        self.assertIsNone(hub.task)
+
+
+class RecordAPITests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.day = timezone.now().replace(microsecond=0) - timedelta(days=1)
+        self.alerts = [
+            disaster_alerts.objects.create(title=f'Alert {i}', location='Here', created_at=self.day,
+                                           disaster_type='FL' if i % 2 else 'EQ',
+                                           latitude=31.5 if i < 3 else None, longitude=74.3 if i < 3 else None)
+            for i in range(7)
+        ]
+
+    def ids(self, response):
+        return [record['id'] for record in response.json()['results']]
+
+    def test_pages_follow_each_other_across_equal_sort_keys(self):
+        page = self.client.get('/api/disasters/', {'ordering': '-created_at', 'limit': 3, 'fields': 'id'})
+        ids = self.ids(page)
+        while page.json()['next']:
+            page = self.client.get(page.json()['next'])
+            ids += self.ids(page)
+
+        self.assertEqual(ids, sorted(alert.pk for alert in self.alerts))
+        self.assertEqual(page.json()['results'][0], {'id': self.alerts[-1].pk})
+
+        newer = disaster_alerts.objects.create(title='Newer', location='Here')
+        older = disaster_alerts.objects.create(title='Older', location='Here', created_at=self.day - timedelta(days=1))
+        ids = self.ids(self.client.get('/api/disasters/', {'ordering': '-created_at', 'limit': 9}))
+        self.assertEqual((ids[0], ids[-1]), (newer.pk, older.pk))
+
+    def test_invalid_parameters_are_rejected(self):
+        cursor = self.client.get('/api/disasters/', {'limit': 2}).json()['next'].split('cursor=')[1]
+        for params in ({'cursor': 'not-a-cursor'}, {'cursor': cursor, 'ordering': 'updated_at'},
+                       {'fields': 'id,no_such_field'}, {'ordering': 'title'}, {'limit': 0},
+                       {'created_since': 'yesterday'}, {'has_coordinates': 'maybe'}):
+            with self.subTest(params=params):
+                response = self.client.get('/api/disasters/', params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(next(iter(params)) if 'cursor' not in params else 'cursor', response.json())
+        self.assertEqual(self.client.get('/api/disasters/0/').status_code, 404)
+
+    def test_filters(self):
+        def ids(**params):
+            return set(self.ids(self.client.get('/api/disasters/', params)))
+
+        pks = [alert.pk for alert in self.alerts]
+        self.assertEqual(ids(type='FL'), {pks[1], pks[3], pks[5]})
+        self.assertEqual(ids(has_coordinates='false'), set(pks[3:]))
+        self.assertEqual(ids(type='EQ', has_coordinates='true'), {pks[0], pks[2]})
+        self.assertEqual(ids(created_since=(self.day + timedelta(hours=1)).isoformat()), set())
+        self.assertEqual(ids(created_until=self.day.date().isoformat()), set())
+
+        shelter = Relief_Shelter.objects.create(name='North', address='Street 1')
+        Relief_Shelter.objects.create(name='South', address='Street 2')
+        Relief_Shelter.objects.filter(name='South').update(updated_at=self.day)
+        page = self.client.get('/api/shelters/', {'updated_since': (self.day + timedelta(hours=1)).isoformat()})
+        self.assertEqual(self.ids(page), [shelter.pk])
+        self.assertEqual(self.ids(self.client.get('/api/shelters/', {'name': 'South'})),
+                         [Relief_Shelter.objects.get(name='South').pk])
+
+    def test_unchanged_pages_and_records_are_not_modified(self):
+        alert = self.alerts[0]
+        for url in ('/api/disasters/?type=EQ', f'/api/disasters/{alert.pk}/'):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                etag = response['ETag']
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+                alert.population_affected += 1
+                alert.save()
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+
+        record = self.client.get(f'/api/disasters/{alert.pk}/', {'fields': 'id,population_affected'})
+        self.assertEqual(record.json(), {'id': alert.pk, 'population_affected': 2})
+        self.assertIn('Last-Modified', record)
+        # Another projection is another representation
+        self.assertNotEqual(record['ETag'], self.client.get(f'/api/disasters/{alert.pk}/')['ETag'])